@@ -1,21 +1,127 @@
-from flask import Flask, request, render_template
-from src.config import TARGET_COLUMN, mongo_client ,database_name
+from flask import Flask, request, render_template, jsonify, g, Response
+from src.config import TARGET_COLUMN, REALTIME_FEATURES, mongo_client ,database_name, ONLINE_FEATURE_STORE_ENABLED, MODEL_RELOAD_INTERVAL, METRICS_DIR, SCORING_CACHE_SIZE, SCORING_CACHE_TTL, \
+    TERMINAL_RISK_REFRESH_INTERVAL, ONLINE_FEATURE_STORE_REFRESH_INTERVAL
 import pandas as pd
 import dill
-from src.utils import get_relevant_past_df, store_prediction_records_to_database , load_object
-from src.predictor import ModelResolver
-from src.feature_extractor import generate_features
+from src.utils import get_customer_terminal_history, create_history_indexes
+from src.predictor import ModelResolver, Predictor
+from src.logger import logging
+from src.feature_extractor import generate_features, get_history_lookback, independent_groups, required_columns
+from src.online_feature_store import OnlineFeatureStore
+from src.prediction_writer import PredictionRecordWriter
+from src.metrics import MetricsRegistry, ROW_COUNT_BUCKETS
+from src.scoring_cache import ScoringCache, transaction_fingerprint
+from src.terminal_risk import TerminalRiskTable
 import warnings
 import os
+import time
 warnings.filterwarnings('ignore')
 
 app = Flask(__name__)
 
 # -------------------------
-# Load trained ML model
+# Load trained ML model and watch for newer versions
 # -------------------------
-resolver=ModelResolver()
-model=load_object(file_path=resolver.get_latest_model_path())
+predictor=Predictor(model_resolver=ModelResolver(), poll_interval=MODEL_RELOAD_INTERVAL)
+predictor.load_latest()
+predictor.start_watcher()
+
+# -------------------------
+# Indexes backing the history lookups
+# -------------------------
+try:
+    create_history_indexes(database_name=database_name, collection_name="transactions")
+except Exception as e:
+    logging.warning(f"Could not create history indexes: {e}")
+
+# -------------------------
+# Warm online feature store (optional), kept current in the background
+# -------------------------
+feature_store=None
+if ONLINE_FEATURE_STORE_ENABLED:
+    feature_store=OnlineFeatureStore()
+    feature_store.warm_from_collection(database_name=database_name, collection_name="transactions")
+    feature_store.start_refresher(ONLINE_FEATURE_STORE_REFRESH_INTERVAL)
+
+# -------------------------
+# Materialized terminal risk table, refreshed in the background
+# -------------------------
+terminal_risk_table=None
+if feature_store is None:
+    try:
+        terminal_risk_table=TerminalRiskTable(mongo_client=mongo_client, database_name=database_name, collection_name="transactions")
+        terminal_risk_table.refresh()
+        terminal_risk_table.start_refresher(TERMINAL_RISK_REFRESH_INTERVAL)
+    except Exception as e:
+        logging.warning(f"Terminal risk table unavailable, computing TERMINAL_RISK from history: {e}")
+        terminal_risk_table=None
+
+# -------------------------
+# Per-stage latency and prediction writer metrics, aggregated across gunicorn workers through METRICS_DIR
+# -------------------------
+metrics=MetricsRegistry(directory=METRICS_DIR)
+
+# -------------------------
+# Write-behind buffer for prediction records
+# -------------------------
+prediction_writer=PredictionRecordWriter(
+    mongo_client=mongo_client,
+    database_name=database_name,
+    collection_name="latest_transactions",
+    metrics=metrics
+)
+
+# -------------------------
+# Recent scoring results, so retried TRANSACTION_IDs are neither re-scored nor re-written
+# -------------------------
+scoring_cache=ScoringCache(capacity=SCORING_CACHE_SIZE, ttl_seconds=SCORING_CACHE_TTL)
+
+def stage_timer(endpoint, stage):
+    return metrics.histogram(
+        "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+        endpoint=endpoint, stage=stage
+    ).time()
+
+def observe_history(endpoint, past_df, history_timings):
+    metrics.histogram(
+        "history_rows", buckets=ROW_COUNT_BUCKETS, help_text="History rows fetched per request",
+        endpoint=endpoint
+    ).observe(len(past_df))
+    for side in ("customer", "terminal"):
+        metrics.histogram(
+            "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+            endpoint=endpoint, stage=f"history_fetch_{side}"
+        ).observe(history_timings[f"{side}_seconds"])
+
+def record_cache_lookups(endpoint, hits, misses):
+    for result, count in (("hit", hits), ("miss", misses)):
+        if count:
+            metrics.counter(
+                "scoring_cache_lookups_total", help_text="Scoring cache lookups by result (hit rate = hit / all)",
+                endpoint=endpoint, result=result
+            ).inc(count)
+
+@app.before_request
+def start_request_timer():
+    g.request_start = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    endpoint = request.endpoint or "unknown"
+    metrics.counter(
+        "requests_total", help_text="Requests served by endpoint and status code",
+        endpoint=endpoint, status=response.status_code
+    ).inc()
+    if "request_start" in g:
+        metrics.histogram(
+            "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+            endpoint=endpoint, stage="request"
+        ).observe(time.perf_counter() - g.request_start)
+    return response
+
+@app.route('/metrics')
+def metrics_endpoint():
+    return Response(metrics.render(), mimetype="text/plain; version=0.0.4")
 
 # -------------------------
 # Home route
@@ -27,10 +133,23 @@ def home():
 # -------------------------
 # Prediction route
 # -------------------------
+def render_result(scored, model_version):
+    response = app.make_response(render_template(
+        'result.html',
+        final_features=scored["features"],
+        result=scored["result"],
+        model_version=model_version
+    ))
+    response.headers['X-Model-Version'] = str(model_version)
+    return response
+
 @app.route('/predict', methods=['GET', 'POST'])
 def predict():
     if request.method == 'POST':
         try:
+            # Pin the active model for the whole request
+            model_version, scorer = predictor.get_scorer()
+
             # Step 1: Get user input from form
             transaction_id = int(request.form['transaction_id'])
             customer_id = int(request.form['customer_id'])
@@ -38,20 +157,14 @@ def predict():
             amount = float(request.form['amount'])
             timestamp_str = pd.to_datetime(request.form['timestamp'])
 
-            # Step 2: Query past transactions by customer or terminal
-            query = {
-                "$or": [
-                    {"CUSTOMER_ID": customer_id},
-                    {"TERMINAL_ID": terminal_id}
-                ]
-            }
-            past_df = get_relevant_past_df(
-                query=query,
-                database_name=database_name,
-                collection_name="transactions"
-            )
+            # A retried transaction is answered from the scoring cache
+            fingerprint = transaction_fingerprint(customer_id, terminal_id, amount, timestamp_str)
+            cached = scoring_cache.get(transaction_id, model_version, fingerprint)
+            record_cache_lookups("predict", hits=int(cached is not None), misses=int(cached is None))
+            if cached is not None:
+                return render_result(cached, model_version)
 
-            # Step 3: Create DataFrame for current transaction
+            # Step 2: Create DataFrame for current transaction
             input_data = pd.DataFrame([{
                 'TRANSACTION_ID': transaction_id,
                 'CUSTOMER_ID': customer_id,
@@ -60,14 +173,36 @@ def predict():
                 'TX_DATETIME': timestamp_str
             }])
 
-            # Step 4: Generate features
-            features = generate_features(current_df=input_data, past_df=past_df, mode="prediction")
-            features_required = model.feature_names_in_
+            if feature_store is not None:
+                # Step 3-4: Read features from the online store, no history query needed
+                with stage_timer("predict", "feature_generation"):
+                    features = feature_store.get_features(input_data)
+            else:
+                # Step 3: Query past transactions by customer and terminal concurrently
+                with stage_timer("predict", "history_fetch"):
+                    past_df, history_timings = get_customer_terminal_history(
+                        customer_ids=customer_id,
+                        terminal_ids=terminal_id,
+                        database_name=database_name,
+                        collection_name="transactions",
+                        cutoff=timestamp_str,
+                        **get_history_lookback(timestamp_str, terminal_risk_table),
+                        columns=required_columns
+                    )
+                observe_history("predict", past_df, history_timings)
+
+                # Step 4: Generate features
+                with stage_timer("predict", "feature_generation"):
+                    features = generate_features(current_df=input_data, past_df=past_df, mode="prediction",
+                                                 terminal_risk_table=terminal_risk_table,
+                                                 features=scorer.feature_names_in_)
+            features_required = scorer.feature_names_in_
             final_features = features[features_required]
 
-            # Step 5: Predict fraud
-            prediction = model.predict(final_features)
-            result = 'Fraud' if prediction[0] == 1 else 'Safe'
+            # Step 5: Predict fraud on the native booster path
+            with stage_timer("predict", "model_predict"):
+                fraud_probability = float(scorer.score(final_features)[0])
+            result = 'Fraud' if fraud_probability > 0.5 else 'Safe'
 
             # Step 6: Store the prediction result in DB
             final_features[TARGET_COLUMN] = result
@@ -78,19 +213,17 @@ def predict():
                 input_data_dict = input_data.to_dict(orient='records')[0]
                 final_features_dict = final_features_dict | input_data_dict 
 
-            store_prediction_records_to_database(
-                mongo_client=mongo_client,
-                database_name=database_name,
-                collection_name="latest_transactions",
-                data=final_features_dict
-            )
+            with stage_timer("predict", "prediction_write"):
+                prediction_writer.write(final_features_dict)
 
-            # Step 7: Render result page
-            return render_template(
-                'result.html',
-                final_features=final_features.to_dict(orient='records')[0],
-                result=result
-            )
+            # Step 7: Remember the result for retries and render the result page
+            scored = {
+                "result": result,
+                "fraud_probability": fraud_probability,
+                "features": final_features.to_dict(orient='records')[0]
+            }
+            scoring_cache.put(transaction_id, model_version, scored, fingerprint)
+            return render_result(scored, model_version)
 
         except Exception as e:
             return f"<h2 style='color:red; text-align:center;'>Error: {str(e)}</h2>"
@@ -98,6 +231,142 @@ def predict():
     # If GET request, show form
     return render_template('predict.html')
 
+# -------------------------
+# Batch prediction route
+# -------------------------
+def score_batch(input_data, scorer):
+    """
+    Generate features for, score and queue the records of a batch of new transactions.
+
+    Returns one {"result", "fraud_probability", "features"} dict per row of `input_data`.
+    """
+    if feature_store is not None:
+        # Read features from the online store, no history query needed
+        with stage_timer("predict_batch", "feature_generation"):
+            features = feature_store.get_features(input_data)
+    else:
+        # One round trip per side for every customer and terminal in the batch
+        cutoff = input_data['TX_DATETIME'].min()
+        with stage_timer("predict_batch", "history_fetch"):
+            past_df, history_timings = get_customer_terminal_history(
+                customer_ids=input_data['CUSTOMER_ID'].unique().tolist(),
+                terminal_ids=input_data['TERMINAL_ID'].unique().tolist(),
+                database_name=database_name,
+                collection_name="transactions",
+                cutoff=cutoff,
+                **get_history_lookback(cutoff, terminal_risk_table),
+                columns=required_columns
+            )
+        observe_history("predict_batch", past_df, history_timings)
+
+        # Generate features a group of rows at a time, so rows of the same customer or terminal
+        # are scored on the stored history alone, as /predict and the feature store score them
+        with stage_timer("predict_batch", "feature_generation"):
+            features = pd.concat([
+                generate_features(current_df=rows.copy(), past_df=past_df, mode="prediction",
+                                  terminal_risk_table=terminal_risk_table,
+                                  features=scorer.feature_names_in_)
+                for _, rows in input_data.groupby(independent_groups(input_data), sort=True)
+            ])
+
+    # Single vectorized prediction, rows aligned to the request order
+    features = (
+        features.drop_duplicates('TRANSACTION_ID', keep='last')
+        .set_index('TRANSACTION_ID')
+        .loc[input_data['TRANSACTION_ID']]
+        .reset_index()
+    )
+    final_features = features[scorer.feature_names_in_]
+    with stage_timer("predict_batch", "model_predict"):
+        fraud_probability = scorer.score(final_features)
+    results = ['Fraud' if probability > 0.5 else 'Safe' for probability in fraud_probability]
+
+    # Queue all prediction records for the background writer
+    records = final_features.copy()
+    for column in REALTIME_FEATURES:
+        if column not in records.columns:
+            records[column] = input_data[column].values
+    records[TARGET_COLUMN] = results
+    with stage_timer("predict_batch", "prediction_write"):
+        prediction_writer.write_many(records.to_dict(orient='records'))
+
+    feature_records = final_features.assign(**{TARGET_COLUMN: results}).to_dict(orient='records')
+    return [
+        {"result": result, "fraud_probability": float(probability), "features": feature_record}
+        for result, probability, feature_record in zip(results, fraud_probability, feature_records)
+    ]
+
+@app.route('/predict/batch', methods=['POST'])
+def predict_batch():
+    """
+    Score many transactions in one call.
+
+    Expects a JSON body of the form {"transactions": [{"TRANSACTION_ID": ..., "CUSTOMER_ID": ...,
+    "TERMINAL_ID": ..., "TX_AMOUNT": ..., "TX_DATETIME": ...}, ...]} and returns one
+    prediction per transaction.
+    """
+    payload = request.get_json(silent=True) or {}
+    transactions = payload.get("transactions")
+    if not isinstance(transactions, list) or not transactions:
+        return jsonify({"error": "Body must be a JSON object with a non-empty 'transactions' list"}), 400
+
+    try:
+        # Pin the active model for the whole request
+        model_version, scorer = predictor.get_scorer()
+
+        # Step 1: Build the batch DataFrame with typed columns
+        input_data = pd.DataFrame(transactions)
+        missing_cols = set(REALTIME_FEATURES) - set(input_data.columns)
+        if missing_cols:
+            return jsonify({"error": f"Missing fields: {sorted(missing_cols)}"}), 400
+
+        input_data = input_data[REALTIME_FEATURES].astype({
+            'TRANSACTION_ID': 'int64',
+            'CUSTOMER_ID': 'int64',
+            'TERMINAL_ID': 'int64',
+            'TX_AMOUNT': 'float64'
+        })
+        input_data['TX_DATETIME'] = pd.to_datetime(input_data['TX_DATETIME'])
+        if input_data['TRANSACTION_ID'].duplicated().any():
+            return jsonify({"error": "Duplicate TRANSACTION_ID values in batch"}), 400
+
+        # Step 2: Answer retried transactions from the scoring cache
+        fingerprints = {
+            int(row.TRANSACTION_ID): transaction_fingerprint(row.CUSTOMER_ID, row.TERMINAL_ID, row.TX_AMOUNT, row.TX_DATETIME)
+            for row in input_data.itertuples(index=False)
+        }
+        scored = {}
+        for transaction_id, fingerprint in fingerprints.items():
+            cached = scoring_cache.get(transaction_id, model_version, fingerprint)
+            if cached is not None:
+                scored[transaction_id] = cached
+        record_cache_lookups("predict_batch", hits=len(scored), misses=len(fingerprints) - len(scored))
+
+        # Step 3: Score and write only the transactions not seen before
+        to_score = input_data[~input_data['TRANSACTION_ID'].isin(list(scored))].reset_index(drop=True)
+        if len(to_score):
+            for transaction_id, result in zip(to_score['TRANSACTION_ID'], score_batch(to_score, scorer)):
+                transaction_id = int(transaction_id)
+                scoring_cache.put(transaction_id, model_version, result, fingerprints[transaction_id])
+                scored[transaction_id] = result
+
+        response = jsonify({
+            "model_version": model_version,
+            "predictions": [
+                {
+                    "TRANSACTION_ID": int(transaction_id),
+                    "result": scored[int(transaction_id)]["result"],
+                    "fraud_probability": scored[int(transaction_id)]["fraud_probability"]
+                }
+                for transaction_id in input_data['TRANSACTION_ID']
+            ]
+        })
+        response.headers['X-Model-Version'] = str(model_version)
+        return response
+
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
 # -------------------------
 # Run app
 # -------------------------
@@ -0,0 +1,331 @@
+"""
+Async scoring service (FastAPI / ASGI), served next to the Flask app:
+
+    uvicorn asgi_app:app --host 0.0.0.0 --port 8502
+
+History reads go through `pymongo.AsyncMongoClient` and prediction records through the
+write-behind writer, so no request holds the event loop while waiting on MongoDB.
+Feature generation and scoring are CPU-bound and run in a bounded thread pool
+(ASGI_CPU_WORKERS threads, at most that many requests in it at once). One process can
+then keep many requests in flight, whereas a sync gunicorn worker serves one at a time.
+"""
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from datetime import datetime
+from typing import List
+
+import pandas as pd
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse
+from pydantic import BaseModel, Field
+from pymongo import AsyncMongoClient
+
+from src.config import TARGET_COLUMN, REALTIME_FEATURES, mongo_client, database_name, env, ONLINE_FEATURE_STORE_ENABLED, \
+    MODEL_RELOAD_INTERVAL, METRICS_DIR, SCORING_CACHE_SIZE, SCORING_CACHE_TTL, ASGI_CPU_WORKERS, TERMINAL_RISK_REFRESH_INTERVAL, \
+    ONLINE_FEATURE_STORE_REFRESH_INTERVAL
+from src.async_history import AsyncHistoryReader
+from src.feature_extractor import generate_features, get_history_lookback, independent_groups, required_columns
+from src.logger import logging
+from src.metrics import MetricsRegistry, ROW_COUNT_BUCKETS
+from src.online_feature_store import OnlineFeatureStore
+from src.prediction_writer import PredictionRecordWriter
+from src.predictor import ModelResolver, Predictor
+from src.scoring_cache import ScoringCache, transaction_fingerprint
+from src.terminal_risk import TerminalRiskTable
+from src.utils import create_history_indexes
+
+# -------------------------
+# Model, feature store, writer and cache (same setup as app.py)
+# -------------------------
+predictor = Predictor(model_resolver=ModelResolver(), poll_interval=MODEL_RELOAD_INTERVAL)
+predictor.load_latest()
+predictor.start_watcher()
+
+try:
+    create_history_indexes(database_name=database_name, collection_name="transactions")
+except Exception as e:
+    logging.warning(f"Could not create history indexes: {e}")
+
+feature_store = None
+if ONLINE_FEATURE_STORE_ENABLED:
+    feature_store = OnlineFeatureStore()
+    feature_store.warm_from_collection(database_name=database_name, collection_name="transactions")
+    feature_store.start_refresher(ONLINE_FEATURE_STORE_REFRESH_INTERVAL)
+
+terminal_risk_table = None
+if feature_store is None:
+    try:
+        terminal_risk_table = TerminalRiskTable(mongo_client=mongo_client, database_name=database_name,
+                                                collection_name="transactions")
+        terminal_risk_table.refresh()
+        terminal_risk_table.start_refresher(TERMINAL_RISK_REFRESH_INTERVAL)
+    except Exception as e:
+        logging.warning(f"Terminal risk table unavailable, computing TERMINAL_RISK from history: {e}")
+        terminal_risk_table = None
+
+metrics = MetricsRegistry(directory=METRICS_DIR)
+
+# enqueue_timeout=0: a full queue drops the record instead of blocking the event loop
+prediction_writer = PredictionRecordWriter(
+    mongo_client=mongo_client,
+    database_name=database_name,
+    collection_name="latest_transactions",
+    enqueue_timeout=0,
+    metrics=metrics
+)
+
+scoring_cache = ScoringCache(capacity=SCORING_CACHE_SIZE, ttl_seconds=SCORING_CACHE_TTL)
+
+# Bounded pool for feature generation and scoring; the semaphore keeps excess work
+# waiting on the event loop instead of piling up in the executor queue
+cpu_executor = ThreadPoolExecutor(max_workers=ASGI_CPU_WORKERS, thread_name_prefix="scoring")
+cpu_slots = asyncio.Semaphore(ASGI_CPU_WORKERS)
+
+# Created on startup unless already set (e.g. by the load-test harness)
+history_reader = None
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    global history_reader
+    owned_client = None
+    if history_reader is None:
+        owned_client = AsyncMongoClient(env.mongo_url)
+        history_reader = AsyncHistoryReader(owned_client, database_name, "transactions")
+    yield
+    prediction_writer.close()
+    cpu_executor.shutdown(wait=False)
+    if owned_client is not None:
+        await owned_client.close()
+
+
+app = FastAPI(title="Fraud scoring service", lifespan=lifespan)
+
+
+class Transaction(BaseModel):
+    TRANSACTION_ID: int
+    CUSTOMER_ID: int
+    TERMINAL_ID: int
+    TX_AMOUNT: float
+    TX_DATETIME: datetime
+
+
+class BatchRequest(BaseModel):
+    transactions: List[Transaction] = Field(min_length=1)
+
+
+# -------------------------
+# Metrics helpers
+# -------------------------
+def stage_timer(endpoint, stage):
+    return metrics.histogram(
+        "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+        endpoint=endpoint, stage=stage
+    ).time()
+
+
+def observe_history(endpoint, past_df, history_timings):
+    metrics.histogram(
+        "history_rows", buckets=ROW_COUNT_BUCKETS, help_text="History rows fetched per request",
+        endpoint=endpoint
+    ).observe(len(past_df))
+    for side in ("customer", "terminal"):
+        metrics.histogram(
+            "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+            endpoint=endpoint, stage=f"history_fetch_{side}"
+        ).observe(history_timings[f"{side}_seconds"])
+
+
+def record_cache_lookups(endpoint, hits, misses):
+    for result, count in (("hit", hits), ("miss", misses)):
+        if count:
+            metrics.counter(
+                "scoring_cache_lookups_total", help_text="Scoring cache lookups by result (hit rate = hit / all)",
+                endpoint=endpoint, result=result
+            ).inc(count)
+
+
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    response = await call_next(request)
+    endpoint = getattr(request.scope.get("endpoint"), "__name__", "unknown")
+    metrics.counter(
+        "requests_total", help_text="Requests served by endpoint and status code",
+        endpoint=endpoint, status=response.status_code
+    ).inc()
+    metrics.histogram(
+        "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+        endpoint=endpoint, stage="request"
+    ).observe(time.perf_counter() - start)
+    return response
+
+
+# -------------------------
+# Scoring
+# -------------------------
+def compute_scores(endpoint, input_data, past_df, scorer):
+    """
+    CPU-bound part of scoring, run in `cpu_executor`: features, model, records to write.
+
+    Returns (one {"result", "fraud_probability", "features"} dict per row, records to write).
+    """
+    with stage_timer(endpoint, "feature_generation"):
+        if feature_store is not None:
+            features = feature_store.get_features(input_data)
+        else:
+            # A group of rows at a time, so rows of the same customer or terminal are scored on
+            # the stored history alone, as the feature store scores them
+            features = pd.concat([
+                generate_features(current_df=rows.copy(), past_df=past_df, mode="prediction",
+                                  terminal_risk_table=terminal_risk_table,
+                                  features=scorer.feature_names_in_)
+                for _, rows in input_data.groupby(independent_groups(input_data), sort=True)
+            ])
+
+    # Rows aligned to the request order
+    features = (
+        features.drop_duplicates('TRANSACTION_ID', keep='last')
+        .set_index('TRANSACTION_ID')
+        .loc[input_data['TRANSACTION_ID']]
+        .reset_index()
+    )
+    final_features = features[scorer.feature_names_in_]
+    with stage_timer(endpoint, "model_predict"):
+        fraud_probability = scorer.score(final_features)
+    results = ['Fraud' if probability > 0.5 else 'Safe' for probability in fraud_probability]
+
+    records = final_features.copy()
+    for column in REALTIME_FEATURES:
+        if column not in records.columns:
+            records[column] = input_data[column].values
+    records[TARGET_COLUMN] = results
+
+    feature_records = final_features.assign(**{TARGET_COLUMN: results}).to_dict(orient='records')
+    scored = [
+        {"result": result, "fraud_probability": float(probability), "features": feature_record}
+        for result, probability, feature_record in zip(results, fraud_probability, feature_records)
+    ]
+    return scored, records.to_dict(orient='records')
+
+
+async def run_cpu(endpoint, fn, *args):
+    """Run `fn` in the bounded scoring pool, recording how long it waited for a slot."""
+    queued = time.perf_counter()
+    async with cpu_slots:
+        metrics.histogram(
+            "stage_latency_seconds", help_text="Latency of each scoring stage in seconds",
+            endpoint=endpoint, stage="cpu_queue"
+        ).observe(time.perf_counter() - queued)
+        return await asyncio.get_running_loop().run_in_executor(cpu_executor, fn, *args)
+
+
+async def score_transactions(endpoint, transactions):
+    """
+    Score validated transactions: cache lookup, async history read, features and model in
+    the scoring pool, then queue the new records. Returns (model_version, scored) with one
+    scored dict per transaction in request order.
+    """
+    # Pin the active model for the whole request
+    model_version, scorer = predictor.get_scorer()
+
+    input_data = pd.DataFrame([transaction.model_dump() for transaction in transactions])[REALTIME_FEATURES]
+    input_data['TX_DATETIME'] = pd.to_datetime(input_data['TX_DATETIME'])
+    if input_data['TRANSACTION_ID'].duplicated().any():
+        raise HTTPException(status_code=400, detail="Duplicate TRANSACTION_ID values in batch")
+
+    # Answer retried transactions from the scoring cache
+    fingerprints = {
+        int(row.TRANSACTION_ID): transaction_fingerprint(row.CUSTOMER_ID, row.TERMINAL_ID, row.TX_AMOUNT, row.TX_DATETIME)
+        for row in input_data.itertuples(index=False)
+    }
+    scored = {}
+    for transaction_id, fingerprint in fingerprints.items():
+        cached = scoring_cache.get(transaction_id, model_version, fingerprint)
+        if cached is not None:
+            scored[transaction_id] = cached
+    record_cache_lookups(endpoint, hits=len(scored), misses=len(fingerprints) - len(scored))
+
+    to_score = input_data[~input_data['TRANSACTION_ID'].isin(list(scored))].reset_index(drop=True)
+    if len(to_score):
+        past_df = None
+        if feature_store is None:
+            cutoff = to_score['TX_DATETIME'].min()
+            with stage_timer(endpoint, "history_fetch"):
+                past_df, history_timings = await history_reader.customer_terminal_history(
+                    customer_ids=to_score['CUSTOMER_ID'].unique().tolist(),
+                    terminal_ids=to_score['TERMINAL_ID'].unique().tolist(),
+                    cutoff=cutoff,
+                    **get_history_lookback(cutoff, terminal_risk_table),
+                    columns=required_columns
+                )
+            observe_history(endpoint, past_df, history_timings)
+
+        new_scores, records = await run_cpu(endpoint, compute_scores, endpoint, to_score, past_df, scorer)
+        with stage_timer(endpoint, "prediction_write"):
+            prediction_writer.write_many(records)
+
+        for transaction_id, result in zip(to_score['TRANSACTION_ID'], new_scores):
+            transaction_id = int(transaction_id)
+            scoring_cache.put(transaction_id, model_version, result, fingerprints[transaction_id])
+            scored[transaction_id] = result
+
+    return model_version, [scored[int(transaction_id)] for transaction_id in input_data['TRANSACTION_ID']]
+
+
+def prediction_response(transaction_id, scored):
+    return {"TRANSACTION_ID": int(transaction_id), "result": scored["result"],
+            "fraud_probability": scored["fraud_probability"]}
+
+
+# -------------------------
+# Routes
+# -------------------------
+@app.get("/")
+async def health():
+    return {"status": "ok", "model_version": predictor.version}
+
+
+@app.get("/metrics")
+async def metrics_endpoint():
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.post("/predict")
+async def predict(transaction: Transaction):
+    try:
+        model_version, (scored,) = await score_transactions("predict", [transaction])
+        return JSONResponse(
+            {"model_version": model_version, **prediction_response(transaction.TRANSACTION_ID, scored)},
+            headers={"X-Model-Version": str(model_version)}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
+
+
+@app.post("/predict/batch")
+async def predict_batch(batch: BatchRequest):
+    """
+    Score many transactions in one call; same request and response shape as the Flask
+    `/predict/batch` route.
+    """
+    try:
+        model_version, scored = await score_transactions("predict_batch", batch.transactions)
+        return JSONResponse(
+            {
+                "model_version": model_version,
+                "predictions": [
+                    prediction_response(transaction.TRANSACTION_ID, result)
+                    for transaction, result in zip(batch.transactions, scored)
+                ]
+            },
+            headers={"X-Model-Version": str(model_version)}
+        )
+    except HTTPException:
+        raise
+    except Exception as e:
+        return JSONResponse({"error": str(e)}, status_code=500)
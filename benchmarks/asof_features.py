@@ -0,0 +1,76 @@
+"""
+Time prediction-mode feature generation as of the history against the full computation.
+
+Usage:
+    python -m benchmarks.asof_features --history-days 60 --batch-sizes 1 10 100 1000
+
+The history is the `--history-days` before `--cutoff` from the daily pickle files, and
+every batch is the first transactions from `--cutoff` on, without labels. The fused
+engine only combines the history rows the batch's features read; the chained engine
+computes every historical row. Outputs are checked to match (float32 columns to one
+rounding step, 1e-6 relative) before each engine is timed (best of `--repeat`).
+"""
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.feature_extractor import generate_features
+from src.utils import read_from_files
+
+ENGINES = ("chained", "fused")
+
+
+def best_time(fn, repeat: int) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="dataset/data")
+    parser.add_argument("--cutoff", default="2018-06-01")
+    parser.add_argument("--history-days", type=int, default=60)
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[1, 10, 100, 1000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    cutoff = pd.Timestamp(args.cutoff)
+    begin = cutoff - pd.Timedelta(days=args.history_days)
+    df = read_from_files(args.data_dir, f"{begin:%Y-%m-%d}", f"{cutoff + pd.Timedelta(days=1):%Y-%m-%d}")
+    df["TX_DATETIME"] = pd.to_datetime(df["TX_DATETIME"])
+    past_df = df[df["TX_DATETIME"] < cutoff]
+    upcoming = df[df["TX_DATETIME"] >= cutoff].sort_values("TX_DATETIME").drop(columns="TX_FRAUD")
+    print(f"{len(past_df)} historical transactions from {begin:%Y-%m-%d} to {cutoff:%Y-%m-%d}")
+
+    print(f"{'batch':>8}" + "".join(f"{engine + ' s':>14}" for engine in ENGINES) + f"{'speedup':>10}")
+    for batch_size in args.batch_sizes:
+        current_df = upcoming.head(batch_size)
+        run = {
+            engine: (lambda engine=engine: generate_features(current_df.copy(), past_df=past_df,
+                                                            mode="prediction", engine=engine))
+            for engine in ENGINES
+        }
+
+        fused, chained = run["fused"]().reset_index(drop=True), run["chained"]().reset_index(drop=True)
+        assert list(fused.columns) == list(chained.columns), "column mismatch"
+        for column in fused.columns:
+            left, right = fused[column].to_numpy(), chained[column].to_numpy()
+            if left.dtype.kind == "f":
+                # Float64 sums that differ in the last bits can round to neighbouring float32s
+                np.testing.assert_allclose(left, right, rtol=1e-6, atol=0, err_msg=column)
+            else:
+                assert (left == right).all(), f"{column} differs"
+
+        timings = {engine: best_time(fn, args.repeat) for engine, fn in run.items()}
+        print(f"{batch_size:>8}" + "".join(f"{timings[engine]:>14.3f}" for engine in ENGINES)
+              + f"{timings['chained'] / timings['fused']:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
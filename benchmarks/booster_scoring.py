@@ -0,0 +1,73 @@
+"""
+Compare the sklearn `XGBClassifier` scoring path with the native Booster fast path.
+
+Usage:
+    python -m benchmarks.booster_scoring --begin-date 2018-04-01 --end-date 2018-04-07
+
+Features are generated from the daily pickle files and scored row by row (the /predict
+shape) and in batches (the /predict/batch shape) with both paths.
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.feature_extractor import generate_features
+from src.predictor import BoosterScorer, ModelResolver
+from src.utils import load_object, read_from_files
+
+
+def time_calls(fn, inputs, repeat):
+    """Median seconds per call of `fn` over `inputs`, repeated `repeat` times."""
+    timings = []
+    for _ in range(repeat):
+        for item in inputs:
+            start = time.perf_counter()
+            fn(item)
+            timings.append(time.perf_counter() - start)
+    return float(np.median(timings))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model-path", default=None, help="Model pickle (defaults to the latest saved model)")
+    parser.add_argument("--data-dir", default="dataset/data")
+    parser.add_argument("--begin-date", default="2018-04-01")
+    parser.add_argument("--end-date", default="2018-04-07")
+    parser.add_argument("--rows", type=int, default=200, help="Single-row calls per repeat")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=[100, 1000, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    model = load_object(args.model_path or ModelResolver().get_latest_model_path())
+    scorer = BoosterScorer(model)
+
+    df = read_from_files(args.data_dir, args.begin_date, args.end_date)
+    df[["CUSTOMER_ID", "TERMINAL_ID"]] = df[["CUSTOMER_ID", "TERMINAL_ID"]].astype(int)
+    features = generate_features(df).reset_index(drop=True)
+
+    # Both paths must agree before their speed is worth comparing
+    sample = features.head(max(args.batch_sizes))
+    np.testing.assert_allclose(scorer.score(sample), model.predict_proba(sample[model.feature_names_in_])[:, 1], atol=1e-6)
+
+    rows = [features.iloc[[i]] for i in range(min(args.rows, len(features)))]
+    sklearn_row = time_calls(lambda row: model.predict_proba(row[model.feature_names_in_]), rows, args.repeat)
+    booster_row = time_calls(scorer.score, rows, args.repeat)
+    arrays = [scorer.to_array(row) for row in rows]
+    array_row = time_calls(scorer.score, arrays, args.repeat)
+
+    print(f"{'path':<28}{'size':>8}{'median ms/call':>16}{'us/row':>12}")
+    print(f"{'sklearn predict_proba':<28}{1:>8}{sklearn_row * 1e3:>16.3f}{sklearn_row * 1e6:>12.1f}")
+    print(f"{'booster (DataFrame input)':<28}{1:>8}{booster_row * 1e3:>16.3f}{booster_row * 1e6:>12.1f}")
+    print(f"{'booster (float32 array)':<28}{1:>8}{array_row * 1e3:>16.3f}{array_row * 1e6:>12.1f}")
+
+    for batch_size in args.batch_sizes:
+        batch = [features.head(batch_size)]
+        sklearn_batch = time_calls(lambda b: model.predict_proba(b[model.feature_names_in_]), batch, args.repeat)
+        booster_batch = time_calls(scorer.score, batch, args.repeat)
+        print(f"{'sklearn predict_proba':<28}{batch_size:>8}{sklearn_batch * 1e3:>16.3f}{sklearn_batch / batch_size * 1e6:>12.2f}")
+        print(f"{'booster (DataFrame input)':<28}{batch_size:>8}{booster_batch * 1e3:>16.3f}{booster_batch / batch_size * 1e6:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,71 @@
+"""
+Date-range reads of the daily pickles: the serial concat/sort/replace reader against
+`read_daily_pickles` with a number of worker processes, and a read from its cache.
+
+Usage:
+    python -m benchmarks.daily_dataset --begin-date 2018-04-01 --end-date 2018-09-30 --workers 1 2 4
+
+Every read is checked to be identical to the serial reader's frame; times are the best of
+`--repeat` (including the process pool start-up). The cache is written to a temporary
+directory by an untimed read, so the cached row times the memory-mapped read alone.
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import pandas as pd
+
+from src.daily_dataset import daily_files, read_daily_pickles
+from src.schema import apply_schema
+
+
+def read_serially(files: list) -> pd.DataFrame:
+    """The reader `read_daily_pickles` replaced."""
+    df = pd.concat([apply_schema(pd.read_pickle(file_path)) for file_path in files])
+    df = df.sort_values("TRANSACTION_ID").reset_index(drop=True)
+    return df.replace([-1], 0)
+
+
+def best_of(repeat: int, read, expected: pd.DataFrame) -> float:
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        df = read()
+        timings.append(time.perf_counter() - start)
+        pd.testing.assert_frame_equal(df, expected, check_exact=True)
+    return min(timings)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="dataset/data")
+    parser.add_argument("--begin-date", default="2018-04-01")
+    parser.add_argument("--end-date", default="2018-09-30")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    files = daily_files(args.data_dir, args.begin_date, args.end_date)
+    size_mb = sum(os.path.getsize(file_path) for file_path in files) / 2 ** 20
+    start = time.perf_counter()
+    expected = read_serially(files)
+    serial = time.perf_counter() - start
+    print(f"{len(expected)} transactions in {len(files)} files ({size_mb:.0f} MB)")
+
+    print(f"{'reader':<12}{'best s':>10}{'speedup':>10}")
+    print(f"{'serial':<12}{serial:>10.2f}{1.0:>10.2f}")
+    for workers in args.workers:
+        best = best_of(args.repeat, lambda: read_daily_pickles(args.data_dir, args.begin_date, args.end_date,
+                                                               workers=workers, cache_dir=None), expected)
+        print(f"{workers:<12}{best:>10.2f}{serial / best:>10.2f}")
+
+    with tempfile.TemporaryDirectory() as cache_dir:
+        read_daily_pickles(args.data_dir, args.begin_date, args.end_date, workers=1, cache_dir=cache_dir)
+        best = best_of(args.repeat, lambda: read_daily_pickles(args.data_dir, args.begin_date, args.end_date,
+                                                               cache_dir=cache_dir), expected)
+        print(f"{'cached':<12}{best:>10.2f}{serial / best:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,307 @@
+"""
+In-memory stand-in for the subset of `pymongo.MongoClient` the scoring service uses.
+
+Supports `client[db][collection]` with `find` (equality, `$in`/`$nin`, range operators,
+`$or`/`$and`, projections, `sort`), `find_one` (with `sort`), `aggregate` (`$match` and `$group` with `$sum`/`$min`/`$max`),
+`insert_one`, `insert_many`, `count_documents` and `create_index`. The first field of every created index gets a hash lookup, so the
+(CUSTOMER_ID, TX_DATETIME) / (TERMINAL_ID, TX_DATETIME) history queries do not scan the
+whole collection and the stand-in stays cheap next to the code being measured.
+
+`AsyncInMemoryMongoClient` exposes the same data through the `pymongo.AsyncMongoClient`
+coroutine API used by the ASGI service.
+"""
+import asyncio
+import threading
+from collections import defaultdict
+from types import SimpleNamespace
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+DUPLICATE_KEY_ERROR = 11000
+
+_RANGE_OPERATORS = {
+    "$gt": lambda value, bound: value > bound,
+    "$gte": lambda value, bound: value >= bound,
+    "$lt": lambda value, bound: value < bound,
+    "$lte": lambda value, bound: value <= bound,
+}
+
+
+def _matches_condition(value, condition) -> bool:
+    if not (isinstance(condition, dict) and condition and all(key.startswith("$") for key in condition)):
+        return value == condition
+    for operator, operand in condition.items():
+        if operator == "$eq":
+            matched = value == operand
+        elif operator == "$ne":
+            matched = value != operand
+        elif operator == "$in":
+            matched = value in operand
+        elif operator == "$nin":
+            matched = value not in operand
+        elif operator in _RANGE_OPERATORS:
+            matched = value is not None and _RANGE_OPERATORS[operator](value, operand)
+        else:
+            raise NotImplementedError(f"Unsupported query operator: {operator}")
+        if not matched:
+            return False
+    return True
+
+
+def _matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, clause) for clause in condition):
+                return False
+        elif key == "$and":
+            if not all(_matches(document, clause) for clause in condition):
+                return False
+        elif not _matches_condition(document.get(key), condition):
+            return False
+    return True
+
+
+def _project(document: dict, projection) -> dict:
+    if not projection:
+        return dict(document)
+    included = {key for key, flag in projection.items() if flag and key != "_id"}
+    if included:
+        projected = {key: document[key] for key in included if key in document}
+        if projection.get("_id", 1) and "_id" in document:
+            projected["_id"] = document["_id"]
+        return projected
+    excluded = {key for key, flag in projection.items() if not flag}
+    return {key: value for key, value in document.items() if key not in excluded}
+
+
+def _field_value(document: dict, expression):
+    return document.get(expression[1:]) if isinstance(expression, str) and expression.startswith("$") else expression
+
+
+def _group(documents, spec: dict) -> list:
+    """`$group` stage with `$sum`, `$min` and `$max` accumulators."""
+    groups = {}
+    for document in documents:
+        key = _field_value(document, spec["_id"])
+        group = groups.get(key)
+        if group is None:
+            group = groups[key] = {"_id": key}
+        for field, accumulator in spec.items():
+            if field == "_id":
+                continue
+            (operator, expression), = accumulator.items()
+            value = _field_value(document, expression)
+            if operator == "$sum":
+                group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+            elif operator in ("$min", "$max"):
+                if value is not None:
+                    current = group.get(field)
+                    pick = min if operator == "$min" else max
+                    group[field] = value if current is None else pick(current, value)
+            else:
+                raise NotImplementedError(f"Unsupported accumulator: {operator}")
+    return list(groups.values())
+
+
+class InMemoryCollection:
+    def __init__(self, name: str, database_name: str = "test"):
+        self.name = name
+        self.full_name = f"{database_name}.{name}"
+        self._documents = []
+        self._ids = set()
+        self._indexes = {}
+        self._unique = set()
+        self._lock = threading.RLock()
+
+    def create_index(self, keys, **kwargs) -> str:
+        if isinstance(keys, str):
+            keys = [(keys, 1)]
+        field = keys[0][0]
+        with self._lock:
+            if field not in self._indexes:
+                index = defaultdict(list)
+                for position, document in enumerate(self._documents):
+                    index[document.get(field)].append(position)
+                self._indexes[field] = index
+            if kwargs.get("unique"):
+                duplicated = next((key for key, positions in self._indexes[field].items() if len(positions) > 1), None)
+                if duplicated is not None:
+                    raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} {field}: "
+                                            f"{duplicated}", DUPLICATE_KEY_ERROR)
+                self._unique.add(field)
+        return "_".join(f"{key}_{direction}" for key, direction in keys)
+
+    def insert_one(self, document: dict):
+        with self._lock:
+            self._insert(document)
+        return SimpleNamespace(inserted_id=document["_id"], acknowledged=True)
+
+    def insert_many(self, documents, ordered: bool = True):
+        inserted, write_errors = [], []
+        with self._lock:
+            for position, document in enumerate(documents):
+                try:
+                    self._insert(document)
+                    inserted.append(document["_id"])
+                except DuplicateKeyError as e:
+                    write_errors.append({"index": position, "code": DUPLICATE_KEY_ERROR, "errmsg": str(e)})
+                    if ordered:
+                        break
+        if write_errors:
+            raise BulkWriteError({"writeErrors": write_errors, "nInserted": len(inserted)})
+        return SimpleNamespace(inserted_ids=inserted, acknowledged=True)
+
+    def _insert(self, document: dict) -> None:
+        # Like pymongo, assign the _id on the caller's document
+        document.setdefault("_id", ObjectId())
+        if document["_id"] in self._ids:
+            raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} _id: {document['_id']}",
+                                    DUPLICATE_KEY_ERROR)
+        for field in self._unique:
+            if self._indexes[field].get(document.get(field)):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.name} {field}: "
+                                        f"{document.get(field)}", DUPLICATE_KEY_ERROR)
+        self._ids.add(document["_id"])
+        position = len(self._documents)
+        self._documents.append(dict(document))
+        for field, index in self._indexes.items():
+            index[document.get(field)].append(position)
+
+    def _candidates(self, query: dict):
+        """Positions that may match `query`, narrowed through an index when one applies."""
+        for field, condition in query.items():
+            index = self._indexes.get(field)
+            if index is None:
+                continue
+            if isinstance(condition, dict) and "$in" in condition:
+                keys = condition["$in"]
+            elif isinstance(condition, dict) and any(key.startswith("$") for key in condition):
+                continue
+            else:
+                keys = [condition]
+            return sorted({position for key in keys for position in index.get(key, ())})
+
+        clauses = query.get("$or")
+        if clauses:
+            positions = set()
+            for clause in clauses:
+                clause_positions = self._candidates(clause)
+                if clause_positions is None:
+                    return None
+                positions.update(clause_positions)
+            return sorted(positions)
+        return None
+
+    def find(self, filter=None, projection=None, sort=None, **kwargs):
+        query = filter or {}
+        with self._lock:
+            positions = self._candidates(query)
+            documents = self._documents if positions is None else [self._documents[i] for i in positions]
+            documents = [document for document in documents if _matches(document, query)]
+        for field, direction in reversed(sort or []):
+            documents.sort(key=lambda document: document.get(field), reverse=direction < 0)
+        return iter([_project(document, projection) for document in documents])
+
+    def find_one(self, filter=None, projection=None, sort=None, **kwargs):
+        documents = list(self.find(filter, None, sort))
+        return _project(documents[0], projection) if documents else None
+
+    def count_documents(self, filter=None, **kwargs) -> int:
+        return sum(1 for _ in self.find(filter or {}))
+
+    def aggregate(self, pipeline, **kwargs):
+        documents = None
+        for stage in pipeline:
+            (operator, spec), = stage.items()
+            if operator == "$match":
+                documents = list(self.find(spec)) if documents is None else [d for d in documents if _matches(d, spec)]
+            elif operator == "$group":
+                documents = _group(self.find({}) if documents is None else documents, spec)
+            else:
+                raise NotImplementedError(f"Unsupported aggregation stage: {operator}")
+        return iter(list(self.find({})) if documents is None else documents)
+
+
+class InMemoryDatabase:
+    def __init__(self, name: str):
+        self.name = name
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, collection_name: str) -> InMemoryCollection:
+        with self._lock:
+            if collection_name not in self._collections:
+                self._collections[collection_name] = InMemoryCollection(collection_name, self.name)
+            return self._collections[collection_name]
+
+    def list_collection_names(self) -> list:
+        return list(self._collections)
+
+
+class InMemoryMongoClient:
+    def __init__(self):
+        self._databases = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, database_name: str) -> InMemoryDatabase:
+        with self._lock:
+            if database_name not in self._databases:
+                self._databases[database_name] = InMemoryDatabase(database_name)
+            return self._databases[database_name]
+
+    def list_database_names(self) -> list:
+        return list(self._databases)
+
+    def close(self) -> None:
+        pass
+
+
+class _AsyncCursor:
+    def __init__(self, collection: InMemoryCollection, args, kwargs):
+        self._collection = collection
+        self._args = args
+        self._kwargs = kwargs
+
+    async def to_list(self, length=None) -> list:
+        # Served from a thread, as a real MongoDB round trip does not run on the event loop
+        documents = await asyncio.to_thread(lambda: list(self._collection.find(*self._args, **self._kwargs)))
+        return documents if length is None else documents[:length]
+
+
+class _AsyncCollection:
+    def __init__(self, collection: InMemoryCollection):
+        self._collection = collection
+
+    def find(self, *args, **kwargs) -> _AsyncCursor:
+        return _AsyncCursor(self._collection, args, kwargs)
+
+    async def insert_one(self, document: dict):
+        return await asyncio.to_thread(self._collection.insert_one, document)
+
+    async def insert_many(self, documents, ordered: bool = True):
+        return await asyncio.to_thread(self._collection.insert_many, documents, ordered)
+
+    async def count_documents(self, filter=None, **kwargs) -> int:
+        return await asyncio.to_thread(self._collection.count_documents, filter)
+
+
+class _AsyncDatabase:
+    def __init__(self, database: InMemoryDatabase):
+        self._database = database
+
+    def __getitem__(self, collection_name: str) -> _AsyncCollection:
+        return _AsyncCollection(self._database[collection_name])
+
+
+class AsyncInMemoryMongoClient:
+    """Async view over an `InMemoryMongoClient`, sharing its data."""
+
+    def __init__(self, client: InMemoryMongoClient):
+        self._client = client
+
+    def __getitem__(self, database_name: str) -> _AsyncDatabase:
+        return _AsyncDatabase(self._client[database_name])
+
+    async def close(self) -> None:
+        pass
@@ -0,0 +1,371 @@
+"""
+Load-test the scoring service against an in-memory MongoDB stand-in.
+
+Usage:
+    python -m benchmarks.load_test --history-begin 2018-04-01 --history-end 2018-04-14 \
+        --replay-begin 2018-04-15 --replay-end 2018-04-16 --rps 50 --concurrency 16 --duration 30
+
+The app is started in a separate process the way `start.sh app` does (gunicorn, preloaded
+so every worker shares the seeded stand-in), or with --app asgi as the async `asgi_app`
+service in a single uvicorn process, with `mongo_client` replaced by
+`benchmarks.in_memory_mongo.InMemoryMongoClient` seeded from the daily pickle files between
+--history-begin and --history-end. Transactions between --replay-begin and --replay-end are
+then replayed against /predict (or /predict/batch) in time order:
+
+- with --rps > 0 requests are sent open-loop on a fixed schedule and latency is measured
+  from the scheduled send time, so a saturated server shows up as queueing delay;
+- with --rps 0 every one of the --concurrency clients sends back to back (closed loop).
+
+Throughput, latency percentiles and error rates are printed, together with the per-stage
+server quantiles scraped from /metrics. --max-p99-ms, --max-error-rate and --min-throughput
+turn the run into a pass/fail gate (exit status 1 on a violation). Pass --url to load-test
+an already running service instead.
+
+Saved models are resolved from saved_models/ in the working directory, as in the app.
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+PERCENTILES = (50, 90, 95, 99)
+
+
+# -------------------------
+# Server process
+# -------------------------
+def seed_client(client, database_name, data_dir, begin_date, end_date):
+    """Insert the daily pickle transactions into `client` the way they are stored in MongoDB."""
+    from src.config import TX_DATETIME_FORMAT
+    from src.utils import read_from_files
+
+    df = read_from_files(data_dir, begin_date, end_date)
+    df = df.astype({"TRANSACTION_ID": "int64", "CUSTOMER_ID": "int64", "TERMINAL_ID": "int64",
+                    "TX_TIME_SECONDS": "int64", "TX_TIME_DAYS": "int64", "TX_FRAUD": "int64"})
+    df["TX_DATETIME"] = df["TX_DATETIME"].dt.strftime(TX_DATETIME_FORMAT)
+    client[database_name]["transactions"].insert_many(df.to_dict(orient="records"))
+    return len(df)
+
+
+def serve(args):
+    """Entry point of the server process: seed the stand-in, import the app and serve it."""
+    from benchmarks.in_memory_mongo import InMemoryMongoClient
+    import src.config
+
+    # Must happen before any module that does `from src.config import mongo_client` is imported
+    client = InMemoryMongoClient()
+    src.config.mongo_client = client
+    src.config.database_name = args.database_name
+
+    rows = seed_client(client, args.database_name, args.data_dir, args.history_begin, args.history_end)
+    print(f"Seeded {rows} transactions into the in-memory stand-in", flush=True)
+
+    if args.app == "asgi":
+        import uvicorn
+        import asgi_app
+        from benchmarks.in_memory_mongo import AsyncInMemoryMongoClient
+        from src.async_history import AsyncHistoryReader
+
+        asgi_app.history_reader = AsyncHistoryReader(AsyncInMemoryMongoClient(client), args.database_name, "transactions")
+        uvicorn.run(asgi_app.app, host=args.host, port=args.port, log_level="warning")
+        return
+
+    from app import app
+
+    if args.workers > 0:
+        from gunicorn.app.base import BaseApplication
+
+        class PreloadedApplication(BaseApplication):
+            def load_config(self):
+                self.cfg.set("bind", f"{args.host}:{args.port}")
+                self.cfg.set("workers", args.workers)
+                self.cfg.set("preload_app", True)
+                self.cfg.set("timeout", 120)
+
+            def load(self):
+                return app
+
+        PreloadedApplication().run()
+    else:
+        from werkzeug.serving import make_server
+        make_server(args.host, args.port, app, threaded=True).serve_forever()
+
+
+def wait_until_ready(url, process=None, timeout=600.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and not process.is_alive():
+            raise RuntimeError(f"Server process exited with code {process.exitcode}")
+        try:
+            with urllib.request.urlopen(f"{url}/", timeout=2) as response:
+                if response.status == 200:
+                    return
+        except (urllib.error.URLError, OSError):
+            time.sleep(0.5)
+    raise TimeoutError(f"Service at {url} not ready after {timeout}s")
+
+
+# -------------------------
+# Load generation
+# -------------------------
+def build_requests(df, endpoint, batch_size, app="flask"):
+    """(path, body, content_type) tuples replaying `df` in time order."""
+    records = df[["TRANSACTION_ID", "CUSTOMER_ID", "TERMINAL_ID", "TX_AMOUNT", "TX_DATETIME"]].copy()
+    records["TX_DATETIME"] = records["TX_DATETIME"].dt.strftime("%Y-%m-%d %H:%M:%S")
+    records = records.astype({"TRANSACTION_ID": "int64", "CUSTOMER_ID": "int64", "TERMINAL_ID": "int64"})
+    records = records.to_dict(orient="records")
+
+    if endpoint == "batch":
+        return [
+            ("/predict/batch", json.dumps({"transactions": records[i:i + batch_size]}).encode(), "application/json")
+            for i in range(0, len(records), batch_size)
+        ]
+    if app == "asgi":
+        return [("/predict", json.dumps(record).encode(), "application/json") for record in records]
+    return [
+        ("/predict", urllib.parse.urlencode({
+            "transaction_id": record["TRANSACTION_ID"],
+            "customer_id": record["CUSTOMER_ID"],
+            "terminal_id": record["TERMINAL_ID"],
+            "amount": record["TX_AMOUNT"],
+            "timestamp": record["TX_DATETIME"],
+        }).encode(), "application/x-www-form-urlencoded")
+        for record in records
+    ]
+
+
+def send(url, request, timeout):
+    """Send one request. Returns (seconds, error kind or None)."""
+    path, body, content_type = request
+    start = time.perf_counter()
+    try:
+        req = urllib.request.Request(url + path, data=body, headers={"Content-Type": content_type})
+        with urllib.request.urlopen(req, timeout=timeout) as response:
+            payload = response.read()
+        # The Flask /predict form renders failures as a 200 HTML page
+        error = "app_error" if content_type.endswith("urlencoded") and b"Error:" in payload else None
+    except urllib.error.HTTPError as e:
+        error = f"http_{e.code}"
+    except (urllib.error.URLError, OSError) as e:
+        error = type(getattr(e, "reason", e)).__name__
+    return time.perf_counter() - start, error
+
+
+class LoadResult:
+    def __init__(self):
+        self.latencies = []
+        self.service_times = []
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, latency, service_time, error):
+        with self._lock:
+            self.latencies.append(latency)
+            self.service_times.append(service_time)
+            if error:
+                self.errors[error] = self.errors.get(error, 0) + 1
+
+
+def run_open_loop(url, requests, rps, concurrency, duration, timeout):
+    """Send requests on a fixed schedule of `rps`, whether or not earlier ones have returned."""
+    result = LoadResult()
+
+    def task(request, scheduled):
+        service_time, error = send(url, request, timeout)
+        result.record(time.perf_counter() - scheduled, service_time, error)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        start = time.perf_counter()
+        for i in range(int(rps * duration)):
+            scheduled = start + i / rps
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            executor.submit(task, requests[i % len(requests)], scheduled)
+    return result, time.perf_counter() - start
+
+
+def run_closed_loop(url, requests, concurrency, duration, timeout):
+    """Each of `concurrency` clients sends its next request as soon as the previous one returns."""
+    result = LoadResult()
+    counter = iter(range(sys.maxsize))
+    counter_lock = threading.Lock()
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def client():
+        while time.perf_counter() < deadline:
+            with counter_lock:
+                i = next(counter)
+            service_time, error = send(url, requests[i % len(requests)], timeout)
+            result.record(service_time, service_time, error)
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return result, time.perf_counter() - start
+
+
+# -------------------------
+# Reporting
+# -------------------------
+def summarize(result, elapsed, rows_per_request):
+    completed = len(result.latencies)
+    errors = sum(result.errors.values())
+    latencies_ms = np.array(result.latencies) * 1e3
+    service_ms = np.array(result.service_times) * 1e3
+    summary = {
+        "requests": completed,
+        "elapsed_seconds": elapsed,
+        "throughput_rps": completed / elapsed if elapsed else 0.0,
+        "throughput_rows_per_second": completed * rows_per_request / elapsed if elapsed else 0.0,
+        "error_rate": errors / completed if completed else 0.0,
+        "errors": result.errors,
+    }
+    for name, values in (("latency_ms", latencies_ms), ("service_time_ms", service_ms)):
+        if completed:
+            summary[name] = {f"p{p}": float(np.percentile(values, p)) for p in PERCENTILES}
+            summary[name].update(mean=float(values.mean()), max=float(values.max()))
+    return summary
+
+
+def scrape_stage_quantiles(url):
+    """{(endpoint, stage): {quantile: seconds}} from the service's /metrics, if it exposes one."""
+    try:
+        with urllib.request.urlopen(f"{url}/metrics", timeout=10) as response:
+            text = response.read().decode()
+    except (urllib.error.URLError, OSError):
+        return {}
+    pattern = re.compile(
+        r'^fraud_stage_latency_seconds_quantile\{endpoint="([^"]+)",stage="([^"]+)",quantile="([^"]+)"\} (\S+)$'
+    )
+    stages = {}
+    for line in text.splitlines():
+        match = pattern.match(line)
+        if match:
+            endpoint, stage, quantile, value = match.groups()
+            stages.setdefault((endpoint, stage), {})[quantile] = float(value)
+    return stages
+
+
+def print_report(summary, stages):
+    print(f"\nrequests:   {summary['requests']} in {summary['elapsed_seconds']:.1f}s")
+    print(f"throughput: {summary['throughput_rps']:.1f} req/s ({summary['throughput_rows_per_second']:.1f} tx/s)")
+    print(f"errors:     {summary['error_rate']:.2%} {summary['errors'] or ''}")
+    for name in ("latency_ms", "service_time_ms"):
+        if name in summary:
+            values = "  ".join(f"{key}={value:.1f}" for key, value in summary[name].items())
+            print(f"{name + ':':<17}{values}")
+
+    if stages:
+        print(f"\n{'server stage':<42}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+        for (endpoint, stage), quantiles in sorted(stages.items()):
+            if endpoint == "metrics_endpoint":
+                continue
+            row = "".join(f"{quantiles.get(q, float('nan')) * 1e3:>10.1f}" for q in ("0.5", "0.95", "0.99"))
+            print(f"{endpoint + ' / ' + stage:<42}{row}")
+
+
+def check_gates(summary, args):
+    violations = []
+    if args.max_p99_ms is not None and summary.get("latency_ms", {}).get("p99", float("inf")) > args.max_p99_ms:
+        violations.append(f"p99 latency {summary['latency_ms']['p99']:.1f} ms > {args.max_p99_ms} ms")
+    if args.max_error_rate is not None and summary["error_rate"] > args.max_error_rate:
+        violations.append(f"error rate {summary['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.min_throughput is not None and summary["throughput_rps"] < args.min_throughput:
+        violations.append(f"throughput {summary['throughput_rps']:.1f} req/s < {args.min_throughput} req/s")
+    return violations
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="dataset/data")
+    parser.add_argument("--history-begin", default="2018-04-01", help="First day seeded into the stand-in")
+    parser.add_argument("--history-end", default="2018-04-14", help="Last day seeded into the stand-in")
+    parser.add_argument("--replay-begin", default="2018-04-15", help="First day of replayed transactions")
+    parser.add_argument("--replay-end", default="2018-04-15", help="Last day of replayed transactions")
+    parser.add_argument("--app", choices=["flask", "asgi"], default="flask", help="Service started by the harness")
+    parser.add_argument("--endpoint", choices=["predict", "batch"], default="predict")
+    parser.add_argument("--batch-size", type=int, default=100, help="Transactions per /predict/batch call")
+    parser.add_argument("--rps", type=float, default=20.0, help="Target requests per second (0 = closed loop)")
+    parser.add_argument("--concurrency", type=int, default=16, help="Maximum requests in flight")
+    parser.add_argument("--duration", type=float, default=30.0, help="Seconds of load")
+    parser.add_argument("--warmup", type=int, default=5, help="Requests sent before measuring")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--url", default=None, help="Load-test this running service instead of starting one")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8599)
+    parser.add_argument("--workers", type=int, default=4,
+                        help="Gunicorn workers for --app flask (0 = threaded werkzeug server)")
+    parser.add_argument("--database-name", default="fraud_load_test")
+    parser.add_argument("--max-p99-ms", type=float, default=None)
+    parser.add_argument("--max-error-rate", type=float, default=None)
+    parser.add_argument("--min-throughput", type=float, default=None, help="Minimum requests per second")
+    parser.add_argument("--output", default=None, help="Write the summary as JSON to this path")
+    args = parser.parse_args()
+
+    from src.utils import read_from_files
+    replay_df = read_from_files(args.data_dir, args.replay_begin, args.replay_end).sort_values("TX_DATETIME")
+    requests = build_requests(replay_df, args.endpoint, args.batch_size, args.app)
+    rows_per_request = args.batch_size if args.endpoint == "batch" else 1
+
+    server = None
+    url = args.url
+    if url is None:
+        url = f"http://{args.host}:{args.port}"
+        # Aggregate the /metrics of every worker; a spawned process starts without this one's threads
+        os.environ.setdefault("METRICS_DIR", tempfile.mkdtemp(prefix="fraud_load_test_metrics_"))
+        server = multiprocessing.get_context("spawn").Process(target=serve, args=(args,), daemon=True)
+        server.start()
+    url = url.rstrip("/")
+
+    try:
+        wait_until_ready(url, server)
+        for request in requests[:args.warmup]:
+            send(url, request, args.timeout)
+        requests = requests[args.warmup:] or requests
+
+        print(f"Replaying {len(requests)} requests against {url} "
+              f"({'closed loop' if args.rps <= 0 else f'{args.rps:g} req/s'}, concurrency {args.concurrency})")
+        if args.rps > 0:
+            result, elapsed = run_open_loop(url, requests, args.rps, args.concurrency, args.duration, args.timeout)
+        else:
+            result, elapsed = run_closed_loop(url, requests, args.concurrency, args.duration, args.timeout)
+
+        summary = summarize(result, elapsed, rows_per_request)
+        stages = scrape_stage_quantiles(url)
+        print_report(summary, stages)
+
+        if args.output:
+            summary["server_stages"] = {f"{endpoint}/{stage}": quantiles for (endpoint, stage), quantiles in stages.items()}
+            with open(args.output, "w") as file:
+                json.dump(summary, file, indent=2)
+
+        violations = check_gates(summary, args)
+        for violation in violations:
+            print(f"FAIL: {violation}")
+        return 1 if violations else 0
+
+    finally:
+        if server is not None:
+            server.terminate()
+            server.join(timeout=30)
+            if server.is_alive():
+                server.kill()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
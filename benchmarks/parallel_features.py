@@ -0,0 +1,50 @@
+"""
+Scaling of the sharded training feature generator with the number of worker processes.
+
+Usage:
+    python -m benchmarks.parallel_features --begin-date 2018-04-01 --end-date 2018-09-30 --workers 1 2 4 8
+
+Every run is checked to be identical to the single-process `generate_features` output
+before it is timed (best of `--repeat`, including the process pool start-up).
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from src.feature_extractor import generate_features
+from src.parallel_features import generate_features_parallel
+from src.utils import read_from_files
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--data-dir", default="dataset/data")
+    parser.add_argument("--begin-date", default="2018-04-01")
+    parser.add_argument("--end-date", default="2018-09-30")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--repeat", type=int, default=2)
+    args = parser.parse_args()
+
+    df = read_from_files(args.data_dir, args.begin_date, args.end_date)
+    print(f"{len(df)} transactions from {args.begin_date} to {args.end_date}")
+
+    start = time.perf_counter()
+    expected = generate_features(df)
+    single = time.perf_counter() - start
+
+    print(f"{'workers':<10}{'best s':>10}{'speedup':>10}")
+    print(f"{'single':<10}{single:>10.2f}{1.0:>10.2f}")
+    for workers in args.workers:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            result = generate_features_parallel(df, workers=workers)
+            timings.append(time.perf_counter() - start)
+            pd.testing.assert_frame_equal(result, expected, check_exact=True)
+        best = min(timings)
+        print(f"{workers:<10}{best:>10.2f}{single / best:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
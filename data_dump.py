@@ -1,24 +1,41 @@
 from src.logger import logging
 from src.exception import SrcException
 from src.config import mongo_client , database_name
-import pandas as pd
+from src.bulk_loader import BulkLoader
+import argparse
 import os, sys
 
-# Define file path and MongoDB details
-file_path = "dataset/main.csv"
+# Define source and MongoDB details
+source = "dataset/data"
 collection_name = "transactions"
 
-try:
-    # Read the dataset as a pandas DataFrame
-    df = pd.read_csv(file_path)
+parser = argparse.ArgumentParser(description="Load transactions into MongoDB, resuming an interrupted load.")
+parser.add_argument("--source", default=source,
+                    help="Directory of daily .pkl (or .csv) files, or a single .pkl/.csv file")
+parser.add_argument("--collection", default=collection_name)
+parser.add_argument("--workers", type=int, default=4, help="Chunks inserted concurrently")
+parser.add_argument("--chunk-rows", type=int, default=10_000, help="Documents per insert_many")
+parser.add_argument("--checkpoint", default=None,
+                    help="Progress file (default: .load_checkpoint.json next to the source files)")
+parser.add_argument("--no-unique-index", action="store_true",
+                    help="Load into a collection that already holds duplicate TRANSACTION_IDs (resent chunks then duplicate too)")
+parser.add_argument("--restart", action="store_true", help="Discard the checkpoint and load everything again")
 
-    # Convert the DataFrame to a list of dictionaries (records) for MongoDB insertion
-    df_dict = df.to_dict(orient="records")
+if __name__ == "__main__":
+    args = parser.parse_args()
+    try:
+        loader = BulkLoader(mongo_client[database_name][args.collection], args.source,
+                            checkpoint_path=args.checkpoint, workers=args.workers, chunk_rows=args.chunk_rows,
+                            unique_index=not args.no_unique_index)
+        if args.restart and os.path.exists(loader.checkpoint_path):
+            os.remove(loader.checkpoint_path)
 
-    # Insert the data into the specified MongoDB collection
-    mongo_client[database_name][collection_name].insert_many(df_dict)
+        report = loader.run()
 
-    print("Data successfully inserted into MongoDB Atlas database.")
+        print(f"Inserted {report['inserted']} documents ({report['duplicates']} already present) from "
+              f"{report['files_loaded']} files into {database_name}.{args.collection} in {report['seconds']}s; "
+              f"{report['files_skipped']} files were loaded by an earlier run, "
+              f"{report['files_changed']} changed since and were loaded again.")
 
-except Exception as e:
-    raise SrcException(e, sys)
+    except Exception as e:
+        raise SrcException(e, sys)
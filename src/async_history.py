@@ -0,0 +1,74 @@
+import asyncio
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.exception import SrcException
+from src.utils import build_history_query
+
+
+class AsyncHistoryReader:
+    """
+    Non-blocking counterpart of `get_customer_terminal_history` for the ASGI service.
+
+    `client` is a `pymongo.AsyncMongoClient` (or anything exposing the same
+    `client[db][collection].find(...).to_list()` coroutine API), so history reads
+    yield to the event loop instead of holding a worker while MongoDB answers.
+    """
+
+    def __init__(self, client, database_name: str, collection_name: str = "transactions"):
+        self.client = client
+        self.database_name = database_name
+        self.collection_name = collection_name
+
+    async def fetch(self, query: dict, cutoff=None, lookback_start=None, columns=None) -> pd.DataFrame:
+        """Async `get_relevant_past_df`: documents matching `query` inside the time window."""
+        try:
+            collection = self.client[self.database_name][self.collection_name]
+            query, projection = build_history_query(query, cutoff, lookback_start, columns)
+            documents = await collection.find(query, projection).to_list(None)
+            return pd.DataFrame(documents)
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    async def customer_terminal_history(self, customer_ids, terminal_ids, cutoff=None,
+                                        customer_lookback_start=None, terminal_lookback_start=None,
+                                        columns=None):
+        """
+        Fetch customer and terminal histories concurrently and merge them.
+
+        Returns:
+            tuple: (pd.DataFrame, dict) - same as `get_customer_terminal_history`.
+        """
+        try:
+            def id_filter(ids):
+                return {"$in": list(ids)} if isinstance(ids, (list, tuple, set, np.ndarray)) else ids
+
+            async def timed_query(field, ids, lookback_start):
+                start = time.perf_counter()
+                df = await self.fetch({field: id_filter(ids)}, cutoff, lookback_start, columns)
+                return df, time.perf_counter() - start
+
+            (customer_df, customer_seconds), (terminal_df, terminal_seconds) = await asyncio.gather(
+                timed_query("CUSTOMER_ID", customer_ids, customer_lookback_start),
+                timed_query("TERMINAL_ID", terminal_ids, terminal_lookback_start),
+            )
+            timings = {
+                "customer_seconds": customer_seconds,
+                "customer_rows": len(customer_df),
+                "terminal_seconds": terminal_seconds,
+                "terminal_rows": len(terminal_df),
+            }
+
+            # A customer's transaction at the requested terminal is returned by both queries
+            past_df = pd.concat([customer_df, terminal_df], ignore_index=True)
+            if "TRANSACTION_ID" in past_df.columns:
+                past_df = past_df.drop_duplicates("TRANSACTION_ID", ignore_index=True)
+
+            return past_df, timings
+
+        except Exception as e:
+            raise SrcException(e, sys)
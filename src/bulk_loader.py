@@ -0,0 +1,224 @@
+"""
+Resumable, parallel bulk load of transactions into MongoDB.
+
+The source is a directory of daily `.pkl` files (`dataset/data`) or `.csv` files, or a
+single file of either kind. Files are read one at a time (CSV in chunks) and cut into
+`chunk_rows` chunks, which a pool of threads sends with `insert_many(ordered=False)` over
+the client's connection pool; at most two chunks per thread are in flight, so memory is
+bounded by the chunks rather than the dataset. Documents keep TX_DATETIME as a
+`TX_DATETIME_FORMAT` string, the form the history queries compare against.
+
+Each document's `_id` is an ObjectId that pymongo generates on the client when the
+chunk is sent, not one assigned by the server. With more than one worker the chunks
+reach the server in whatever order the threads finish, so documents are not inserted in
+`_id` order; readers that follow the collection use the TX_DATETIME watermark of
+`src.collection_tail` rather than `_id`.
+
+Every completed chunk is recorded in a JSON checkpoint, and a file once all of its
+chunks are, keyed by the file's name, size and modification time. A rerun skips the
+completed files and chunks; a file that changed since it was recorded is loaded again,
+and a chunk that was in flight when the load stopped is sent again. The unique
+TRANSACTION_ID index created before the load turns their already inserted documents into
+ignored duplicate-key errors (a changed row of an existing TRANSACTION_ID is therefore
+not updated). A collection that already holds duplicate TRANSACTION_IDs cannot get that
+index: the load stops and reports them, unless it runs with `unique_index=False`, which
+gives up the idempotent resend. The history and TX_DATETIME range indexes are built once
+the documents are in, which is cheaper than maintaining them through every insert.
+"""
+import glob
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pandas as pd
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from src.collection_export import RANGE_KEY_INDEXES
+from src.config import TX_DATETIME_FORMAT
+from src.exception import SrcException
+from src.logger import logging
+from src.schema import RAW_COLUMNS
+from src.utils import HISTORY_INDEXES
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Raw columns stored as integers; the daily pickles hold several of them as object columns
+INTEGER_COLUMNS = ["TRANSACTION_ID", "CUSTOMER_ID", "TERMINAL_ID", "TX_TIME_SECONDS",
+                   "TX_TIME_DAYS", "TX_FRAUD", "TX_FRAUD_SCENARIO"]
+
+
+def source_files(source: str) -> list:
+    """The `.pkl` and `.csv` files of `source` (a directory or a single file), in name order."""
+    if os.path.isdir(source):
+        return sorted(glob.glob(os.path.join(source, "*.pkl")) + glob.glob(os.path.join(source, "*.csv")))
+    return [source]
+
+
+def file_key(file_path: str) -> str:
+    """Checkpoint key of `file_path`: its name, size and modification time, so an edited file gets a new key."""
+    stat = os.stat(file_path)
+    return f"{os.path.basename(file_path)}@{stat.st_size}@{stat.st_mtime_ns}"
+
+
+def iter_chunks(file_path: str, chunk_rows: int):
+    """Yield `(chunk index, DataFrame)` of `file_path`; a CSV is parsed `chunk_rows` at a time."""
+    if file_path.endswith(".csv"):
+        yield from enumerate(pd.read_csv(file_path, chunksize=chunk_rows))
+        return
+    df = pd.read_pickle(file_path)
+    for index, start in enumerate(range(0, len(df), chunk_rows)):
+        yield index, df.iloc[start:start + chunk_rows]
+
+
+def to_documents(chunk: pd.DataFrame) -> list:
+    """Raw transaction documents: native ints and floats, TX_DATETIME as a string."""
+    chunk = chunk[[column for column in RAW_COLUMNS if column in chunk.columns]].copy()
+    chunk["TX_DATETIME"] = pd.to_datetime(chunk["TX_DATETIME"]).dt.strftime(TX_DATETIME_FORMAT)
+    chunk = chunk.astype({column: "int64" for column in INTEGER_COLUMNS if column in chunk.columns})
+    chunk["TX_AMOUNT"] = chunk["TX_AMOUNT"].astype("float64")
+    return chunk.to_dict(orient="records")
+
+
+class BulkLoader:
+    """
+    Loads the files of `source` into `collection` with `workers` threads, checkpointing
+    progress to `checkpoint_path`.
+    """
+
+    def __init__(self, collection, source: str, checkpoint_path: str = None,
+                 workers: int = 4, chunk_rows: int = 10_000, unique_index: bool = True):
+        self.collection = collection
+        self.source = source
+        self.checkpoint_path = checkpoint_path or os.path.join(
+            source if os.path.isdir(source) else os.path.dirname(source) or ".", ".load_checkpoint.json"
+        )
+        self.workers = workers
+        self.chunk_rows = chunk_rows
+        self.unique_index = unique_index
+        self._lock = threading.Lock()
+
+    def load_checkpoint(self) -> dict:
+        """Completed files and chunks of the load into this collection, with its chunk size."""
+        checkpoint = {"target": self.collection.full_name, "chunk_rows": self.chunk_rows, "files": [], "chunks": []}
+        if not os.path.exists(self.checkpoint_path):
+            return checkpoint
+        with open(self.checkpoint_path) as checkpoint_file:
+            saved = json.load(checkpoint_file)
+        if (saved["target"], saved["chunk_rows"]) != (checkpoint["target"], checkpoint["chunk_rows"]):
+            raise ValueError(f"Checkpoint {self.checkpoint_path} is for {saved['target']} in chunks of "
+                             f"{saved['chunk_rows']} rows; resume with the same settings or restart the load")
+        return saved
+
+    def _save_checkpoint(self) -> None:
+        temporary_path = self.checkpoint_path + ".tmp"
+        with open(temporary_path, "w") as checkpoint_file:
+            json.dump(self._checkpoint, checkpoint_file)
+        os.replace(temporary_path, self.checkpoint_path)
+
+    def _insert_chunk(self, key: str, documents: list) -> tuple:
+        """Insert one chunk; returns (inserted, duplicates). Other write errors are raised."""
+        try:
+            inserted = len(self.collection.insert_many(documents, ordered=False).inserted_ids)
+            duplicates = 0
+        except BulkWriteError as e:
+            errors = e.details.get("writeErrors", [])
+            if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+                raise
+            inserted, duplicates = e.details.get("nInserted", len(documents) - len(errors)), len(errors)
+        with self._lock:
+            self._checkpoint["chunks"].append(key)
+            self._save_checkpoint()
+        return inserted, duplicates
+
+    def _complete_file(self, key: str) -> None:
+        # Entries of earlier versions of the file go too
+        file_name = key.split("@", 1)[0]
+        with self._lock:
+            self._checkpoint["files"] = [done for done in self._checkpoint["files"]
+                                         if done.split("@", 1)[0] != file_name] + [key]
+            self._checkpoint["chunks"] = [chunk for chunk in self._checkpoint["chunks"]
+                                          if chunk.split("@", 1)[0] != file_name]
+            self._save_checkpoint()
+
+    def duplicate_transaction_ids(self, limit: int = 10) -> list:
+        """Up to `limit` TRANSACTION_IDs the collection holds more than once, with their counts."""
+        duplicates = self.collection.aggregate([
+            {"$group": {"_id": "$TRANSACTION_ID", "count": {"$sum": 1}}},
+            {"$match": {"count": {"$gt": 1}}},
+        ], allowDiskUse=True)
+        return [(group["_id"], group["count"]) for _, group in zip(range(limit), duplicates)]
+
+    def create_unique_index(self) -> None:
+        """The unique TRANSACTION_ID index; raises ValueError naming duplicates already in the collection."""
+        try:
+            self.collection.create_index([("TRANSACTION_ID", ASCENDING)], unique=True)
+        except DuplicateKeyError:
+            duplicates = self.duplicate_transaction_ids()
+            raise ValueError(f"{self.collection.full_name} already holds duplicate TRANSACTION_IDs "
+                             f"(first (id, count) pairs: {duplicates}); remove them, or load with "
+                             f"unique_index=False and accept duplicates from resent chunks")
+
+    def create_indexes(self) -> list:
+        """History and TX_DATETIME range indexes, built after the documents are loaded."""
+        return [self.collection.create_index(keys) for keys in HISTORY_INDEXES + [RANGE_KEY_INDEXES["TX_DATETIME"]]]
+
+    def run(self) -> dict:
+        """
+        Load every file not yet in the checkpoint or changed since, then build the indexes.
+        Returns the documents inserted and skipped as duplicates, the files loaded, skipped
+        and reloaded because they changed, and the seconds taken.
+        """
+        try:
+            start = time.perf_counter()
+            self._checkpoint = self.load_checkpoint()
+            done_files, done_chunks = set(self._checkpoint["files"]), set(self._checkpoint["chunks"])
+
+            # Makes a resent chunk idempotent; must exist before any document goes in
+            if self.unique_index:
+                self.create_unique_index()
+            else:
+                logging.warning(f"Loading into {self.collection.full_name} without the unique TRANSACTION_ID "
+                                f"index: resent chunks and reloaded files insert duplicates")
+            loaded_names = {key.split("@", 1)[0] for key in done_files}
+
+            report = {"inserted": 0, "duplicates": 0, "files_loaded": 0, "files_skipped": 0, "files_changed": 0}
+            in_flight = threading.BoundedSemaphore(2 * self.workers)
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="bulk-load") as pool:
+                def submit(key, documents):
+                    in_flight.acquire()
+                    future = pool.submit(self._insert_chunk, key, documents)
+                    future.add_done_callback(lambda _: in_flight.release())
+                    return future
+
+                for file_path in source_files(self.source):
+                    file_name, key = os.path.basename(file_path), file_key(file_path)
+                    if key in done_files:
+                        report["files_skipped"] += 1
+                        continue
+                    if file_name in loaded_names:
+                        report["files_changed"] += 1
+                        logging.warning(f"{file_name} changed since it was loaded, loading it again")
+                    futures = [
+                        submit(f"{key}#{index}", to_documents(chunk))
+                        for index, chunk in iter_chunks(file_path, self.chunk_rows)
+                        if f"{key}#{index}" not in done_chunks
+                    ]
+                    for future in futures:
+                        inserted, duplicates = future.result()
+                        report["inserted"] += inserted
+                        report["duplicates"] += duplicates
+                    self._complete_file(key)
+                    report["files_loaded"] += 1
+                    logging.info(f"Loaded {file_name} into {self.collection.full_name}")
+
+            report["indexes"] = self.create_indexes()
+            report["seconds"] = round(time.perf_counter() - start, 1)
+            logging.info(f"Bulk load into {self.collection.full_name} finished: {report}")
+            return report
+
+        except Exception as e:
+            raise SrcException(e, sys)
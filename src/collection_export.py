@@ -0,0 +1,169 @@
+"""
+Streaming export of a MongoDB collection to Parquet.
+
+`pd.DataFrame(list(collection.find()))` holds every document as a Python dict, then the
+whole object-dtype frame, before anything is written. Here the cursor is read
+`batch_size` documents at a time with a projection of the wanted columns; each batch is
+turned into a frame with the `src.schema` dtypes, converted to an Arrow table and
+appended to the Parquet file as a row group, and only then is the next batch read. Memory
+is bounded by one batch whatever the size of the collection.
+
+`export_collection_ranges` reads with several cursors at once: the TRANSACTION_ID or
+TX_DATETIME key space between the collection's smallest and largest key is cut into
+equal ranges, and a thread pool streams each range over the client's connection pool
+into its own Parquet file of a dataset directory. There are more ranges than threads
+(4 per thread by default) so a dense range does not hold up the whole read, and the
+per-range rows and seconds are reported with their skew (max over mean).
+"""
+import os
+import shutil
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pymongo import ASCENDING, DESCENDING
+
+from src.config import INGESTION_BATCH_SIZE, INGESTION_WORKERS, TX_DATETIME_FORMAT
+from src.exception import SrcException
+from src.logger import logging
+from src.schema import COLUMN_DTYPES, RAW_COLUMNS
+from src.utils import iter_collection_batches
+
+
+def arrow_schema(columns: list = RAW_COLUMNS) -> pa.Schema:
+    """Arrow schema of `columns` with their `COLUMN_DTYPES`; integer columns are nullable in Arrow."""
+    return pa.schema([(column, pa.from_numpy_dtype(np.dtype(COLUMN_DTYPES[column]))) for column in columns])
+
+
+def export_collection_to_parquet(collection, file_path: str, query: dict = None,
+                                 columns: list = RAW_COLUMNS,
+                                 batch_size: int = INGESTION_BATCH_SIZE) -> int:
+    """
+    Stream the documents of `collection` matching `query` into the Parquet file
+    `file_path`, one row group per batch. The file is written next to `file_path` and
+    moved into place once complete. Returns the number of rows written.
+    """
+    temporary_path = f"{file_path}.tmp"
+    try:
+        os.makedirs(os.path.dirname(file_path) or ".", exist_ok=True)
+        start = time.perf_counter()
+        schema = arrow_schema(columns)
+        rows = 0
+        with pq.ParquetWriter(temporary_path, schema) as writer:
+            for batch in iter_collection_batches(collection, query, columns, batch_size):
+                writer.write_table(pa.Table.from_pandas(batch, schema=schema, preserve_index=False))
+                rows += len(batch)
+        os.replace(temporary_path, file_path)
+
+        logging.info(f"Exported {rows} documents to {file_path} in batches of {batch_size} "
+                     f"in {time.perf_counter() - start:.1f}s")
+        return rows
+
+    except Exception as e:
+        if os.path.exists(temporary_path):
+            os.remove(temporary_path)
+        raise SrcException(e, sys)
+
+
+# Keys the collection can be range-partitioned on, with the index that serves their range reads
+RANGE_KEY_INDEXES = {
+    "TRANSACTION_ID": [("TRANSACTION_ID", ASCENDING)],
+    "TX_DATETIME": [("TX_DATETIME", ASCENDING), ("TRANSACTION_ID", ASCENDING)],
+}
+
+
+def key_ranges(collection, key: str = "TRANSACTION_ID", ranges: int = 4, query: dict = None) -> list:
+    """
+    Split the `key` values of the documents matching `query` into up to `ranges`
+    contiguous `(lower, upper)` bounds (lower inclusive, upper exclusive) of equal width.
+    TX_DATETIME bounds are strings in `TX_DATETIME_FORMAT`, as stored.
+    """
+    first = collection.find_one(query or {}, {key: 1}, sort=[(key, ASCENDING)])
+    last = collection.find_one(query or {}, {key: 1}, sort=[(key, DESCENDING)])
+    if first is None:
+        return []
+
+    if key == "TX_DATETIME":
+        start, end = pd.Timestamp(first[key]), pd.Timestamp(last[key]) + pd.Timedelta(seconds=1)
+        edges = [edge.strftime(TX_DATETIME_FORMAT) for edge in pd.date_range(start, end, periods=ranges + 1)]
+        # The last edge must stay past the largest key after truncation to whole seconds
+        edges[-1] = end.strftime(TX_DATETIME_FORMAT)
+    else:
+        edges = [int(edge) for edge in np.linspace(int(first[key]), int(last[key]) + 1, ranges + 1)]
+    edges = list(dict.fromkeys(edges))
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def export_collection_ranges(collection, output_dir: str, key: str = "TRANSACTION_ID",
+                             workers: int = INGESTION_WORKERS, ranges: int = None,
+                             query: dict = None, columns: list = RAW_COLUMNS,
+                             batch_size: int = INGESTION_BATCH_SIZE) -> dict:
+    """
+    Export the documents of `collection` matching `query` into the Parquet dataset
+    directory `output_dir`, one `range-NNNN.parquet` file per `key` range, reading
+    `ranges` ranges (4 per worker by default) with `workers` threads. The directory is
+    written next to `output_dir` and moved into place once every range is complete.
+
+    Returns:
+        dict: Total rows and seconds, the per-range `ranges` (bounds, rows, seconds) and
+        their skew (max over mean) in rows and seconds.
+    """
+    if key not in RANGE_KEY_INDEXES:
+        raise ValueError(f"`key` must be one of {sorted(RANGE_KEY_INDEXES)}")
+
+    temporary_dir = f"{output_dir}.tmp"
+    try:
+        start = time.perf_counter()
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        os.makedirs(temporary_dir)
+        collection.create_index(RANGE_KEY_INDEXES[key])
+        bounds = key_ranges(collection, key, ranges or 4 * workers, query)
+
+        def read_range(position: int, lower, upper) -> dict:
+            range_start = time.perf_counter()
+            range_query = {key: {"$gte": lower, "$lt": upper}}
+            rows = export_collection_to_parquet(
+                collection, os.path.join(temporary_dir, f"range-{position:04d}.parquet"),
+                {"$and": [query, range_query]} if query else range_query, columns, batch_size
+            )
+            return {"range": position, "lower": lower, "upper": upper, "rows": rows,
+                    "seconds": round(time.perf_counter() - range_start, 3)}
+
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="export") as pool:
+            futures = [pool.submit(read_range, position, lower, upper)
+                       for position, (lower, upper) in enumerate(bounds)]
+            range_reports = [future.result() for future in futures]
+
+        if not range_reports:
+            # Nothing matched: an empty file keeps the dataset readable
+            pq.write_table(arrow_schema(columns).empty_table(), os.path.join(temporary_dir, "range-0000.parquet"))
+        if os.path.isdir(output_dir):
+            shutil.rmtree(output_dir)
+        elif os.path.exists(output_dir):
+            os.remove(output_dir)
+        os.replace(temporary_dir, output_dir)
+
+        def skew(values: list) -> float:
+            return round(max(values) / np.mean(values), 2) if values and np.mean(values) > 0 else 1.0
+
+        report = {
+            "key": key,
+            "workers": workers,
+            "rows": sum(entry["rows"] for entry in range_reports),
+            "seconds": round(time.perf_counter() - start, 3),
+            "rows_skew": skew([entry["rows"] for entry in range_reports]),
+            "seconds_skew": skew([entry["seconds"] for entry in range_reports]),
+            "ranges": range_reports,
+        }
+        logging.info(f"Exported {report['rows']} documents in {len(range_reports)} {key} ranges on {workers} "
+                     f"threads in {report['seconds']:.1f}s (skew: rows {report['rows_skew']}, "
+                     f"seconds {report['seconds_skew']})")
+        return report
+
+    except Exception as e:
+        shutil.rmtree(temporary_dir, ignore_errors=True)
+        raise SrcException(e, sys)
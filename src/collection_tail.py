@@ -0,0 +1,74 @@
+"""
+Incremental reads of the documents added to a transactions collection.
+
+`_id` is generated by each client (pymongo assigns it in `insert_many`), so documents
+written concurrently, e.g. by the threads of `BulkLoader`, are not inserted in `_id`
+order and an `_id` watermark can step over documents that arrive just after it is taken.
+`CollectionTail` keys on the data instead: its watermark is the largest TX_DATETIME read
+so far, every read restarts `overlap_seconds` before it in (TX_DATETIME, TRANSACTION_ID)
+order, and the TRANSACTION_IDs already returned from that overlap are skipped. A document
+is therefore returned exactly once as long as its TX_DATETIME is no more than the overlap
+behind the newest one read when it arrives; anything older (e.g. a backfill of past days)
+is only picked up by a full read after `reset()`.
+"""
+import sys
+
+import pandas as pd
+
+from src.collection_export import RANGE_KEY_INDEXES
+from src.config import INGESTION_BATCH_SIZE, REFRESH_OVERLAP_SECONDS, TX_DATETIME_FORMAT
+from src.exception import SrcException
+from src.schema import RAW_COLUMNS
+from src.utils import iter_collection_batches
+
+TAIL_SORT = RANGE_KEY_INDEXES["TX_DATETIME"]
+
+
+class CollectionTail:
+    """
+    Reader of the documents of `collection` not returned by an earlier `read`, as typed
+    batches of `columns`. Reads must not run concurrently; callers serialize them.
+    """
+
+    def __init__(self, collection, columns: list = RAW_COLUMNS,
+                 overlap_seconds: float = REFRESH_OVERLAP_SECONDS, batch_size: int = INGESTION_BATCH_SIZE):
+        self.collection = collection
+        self.columns = list(dict.fromkeys([*columns, "TRANSACTION_ID", "TX_DATETIME"]))
+        self.overlap = pd.Timedelta(seconds=overlap_seconds)
+        self.batch_size = batch_size
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget what was read, so the next `read` returns the whole collection."""
+        self.watermark = None
+        # TX_DATETIME of the TRANSACTION_IDs read within the overlap before the watermark
+        self._seen = pd.Series([], index=pd.Index([], dtype="int64"), dtype="datetime64[ns]")
+
+    def read(self):
+        """
+        Yield the unread documents as DataFrames in (TX_DATETIME, TRANSACTION_ID) order.
+        A batch counts as read once the caller asks for the next one, so a caller that
+        fails on a batch gets it again from the next `read`.
+        """
+        try:
+            self.collection.create_index(TAIL_SORT)
+            query = None
+            if self.watermark is not None:
+                query = {"TX_DATETIME": {"$gte": (self.watermark - self.overlap).strftime(TX_DATETIME_FORMAT)}}
+
+            for batch in iter_collection_batches(self.collection, query, self.columns, self.batch_size, TAIL_SORT):
+                batch = batch[~batch["TRANSACTION_ID"].isin(self._seen.index)]
+                if batch.empty:
+                    continue
+                yield batch
+                self._advance(batch)
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def _advance(self, batch: pd.DataFrame) -> None:
+        latest = batch["TX_DATETIME"].max()
+        self.watermark = latest if self.watermark is None else max(self.watermark, latest)
+        seen = pd.concat([self._seen, pd.Series(batch["TX_DATETIME"].to_numpy(),
+                                                index=batch["TRANSACTION_ID"].to_numpy())])
+        self._seen = seen[seen >= self.watermark - self.overlap]
@@ -4,7 +4,11 @@ import pandas as pd
 from src.logger import logging
 from src.exception import SrcException
 from src.entity import config_entity, artifact_entity
-from src import utils
+from src.config import mongo_client
+from src.collection_export import export_collection_ranges, export_collection_to_parquet
+from src.partitioned_store import PartitionedTransactionStore
+from src.schema import report_memory
+from src.utils import write_yaml_file
 from sklearn.model_selection import train_test_split
 
 class DataIngestion:
@@ -21,31 +25,46 @@ class DataIngestion:
     def initiate_data_ingestion(self) -> artifact_entity.DataIngestionArtifact:
         """
         Performs:
-        - Fetching data from MongoDB
-        - Storing as CSV in feature store path
-        - Returning artifact object with file path
+        - Streaming the collection from MongoDB in batches, either in full to the Parquet
+          feature store (over several key ranges at once with more than one worker) or,
+          with a transaction store configured, only the documents after its watermark
+          into its daily partitions
+        - Returning artifact object with the path the pipeline reads (the file, or the
+          store directory whose partitions together hold the whole history)
         """
         try:
-            logging.info("Step 1: Extracting data from MongoDB into DataFrame...")
-            df = utils.get_collection_as_dataframe(
-                database_name=self.data_ingestion_config.database_name,
-                collection_name=self.data_ingestion_config.collection_name
-            )
-
-            logging.info("Step 2: Creating Feature Store directory if not exists...")
-            feature_store_dir = os.path.dirname(self.data_ingestion_config.feature_store_file_path)
-            os.makedirs(feature_store_dir, exist_ok=True)
-
-            logging.info("Step 3: Saving raw data to Feature Store as CSV...")
-            df.to_csv(
-                path_or_buf=self.data_ingestion_config.feature_store_file_path,
-                index=False,
-                header=True
-            )
+            collection = mongo_client[self.data_ingestion_config.database_name][self.data_ingestion_config.collection_name]
+            if self.data_ingestion_config.transaction_store_dir:
+                logging.info("Step 1: Syncing new documents from MongoDB into the partitioned transaction store...")
+                store = PartitionedTransactionStore(self.data_ingestion_config.transaction_store_dir)
+                rows = store.sync(collection, batch_size=self.data_ingestion_config.batch_size)["rows"]
+                feature_store_path = self.data_ingestion_config.transaction_store_dir
+            elif self.data_ingestion_config.workers > 1:
+                logging.info("Step 1: Reading MongoDB key ranges in parallel into the Parquet feature store...")
+                # A directory of per-range files, read back as one dataset
+                read_report = export_collection_ranges(
+                    collection=collection,
+                    output_dir=self.data_ingestion_config.feature_store_file_path,
+                    key=self.data_ingestion_config.range_key,
+                    workers=self.data_ingestion_config.workers,
+                    batch_size=self.data_ingestion_config.batch_size
+                )
+                write_yaml_file(self.data_ingestion_config.read_report_file_path, read_report)
+                rows = read_report["rows"]
+                feature_store_path = self.data_ingestion_config.feature_store_file_path
+            else:
+                logging.info("Step 1: Streaming data from MongoDB into the Parquet feature store...")
+                rows = export_collection_to_parquet(
+                    collection=collection,
+                    file_path=self.data_ingestion_config.feature_store_file_path,
+                    batch_size=self.data_ingestion_config.batch_size
+                )
+                feature_store_path = self.data_ingestion_config.feature_store_file_path
+            report_memory("data_ingestion", rows=rows)
 
-            logging.info("Step 4: Preparing Data Ingestion Artifact...")
+            logging.info("Step 2: Preparing Data Ingestion Artifact...")
             data_ingestion_artifacts = artifact_entity.DataIngestionArtifact(
-                feature_store_file_path=self.data_ingestion_config.feature_store_file_path
+                feature_store_file_path=feature_store_path
             )
 
             logging.info(f"Data Ingestion Artifact Created: {data_ingestion_artifacts}")
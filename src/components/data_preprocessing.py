@@ -10,6 +10,7 @@ from sklearn.model_selection import train_test_split
 from sklearn.utils import resample
 from imblearn.over_sampling import SMOTE
 from src.config import TARGET_COLUMN
+from src.schema import MODEL_INPUT_DTYPE, read_csv, report_memory
 
 from src.entity import config_entity, artifact_entity
 
@@ -79,7 +80,7 @@ class DataPreprocessing:
         """
         try:
             logging.info("Step 1: Reading the latest feature-engineered dataset")
-            df = pd.read_csv(self.feature_engineering_artifact.feature_engineered_data_file_path)
+            df = read_csv(self.feature_engineering_artifact.feature_engineered_data_file_path)
 
             # Drop columns not needed
             columns_to_drop = self.data_preprocessing_config.columns_to_drop
@@ -88,10 +89,11 @@ class DataPreprocessing:
             train_df, test_df = self.downsample_split(df, TARGET_COLUMN)
 
             logging.info(f"Step 3: Splitting data and dropping unimportant features {columns_to_drop}")
-            X_train = train_df.drop(columns_to_drop, axis=1)
+            # float32 inputs: SMOTE keeps the dtype for the interpolated rows, which XGBoost reads as is
+            X_train = train_df.drop(columns_to_drop, axis=1).astype(MODEL_INPUT_DTYPE)
             y_train = train_df[TARGET_COLUMN]
 
-            X_test = test_df.drop(columns_to_drop, axis=1)
+            X_test = test_df.drop(columns_to_drop, axis=1).astype(MODEL_INPUT_DTYPE)
             y_test = test_df[TARGET_COLUMN]
 
             logging.info("Training set before SMOTE:")
@@ -101,6 +103,8 @@ class DataPreprocessing:
             smt = SMOTE(sampling_strategy=0.6, random_state=42)
             X_train_resampled, y_train_resampled = smt.fit_resample(X_train, y_train)
 
+            report_memory("data_preprocessing", X_train_resampled)
+
             logging.info("Training set after SMOTE:")
             logging.info(pd.Series(y_train_resampled).value_counts())
 
@@ -2,8 +2,10 @@ import os
 import sys
 import pandas as pd
 import numpy as np
+from pandas.api.types import is_datetime64_any_dtype, is_numeric_dtype
 from scipy.stats import ks_2samp, chi2_contingency
 from src.utils import write_yaml_file
+from src.schema import read_csv, read_table, report_memory
 from src.logger import logging
 from src.exception import SrcException
 from src.entity import config_entity, artifact_entity
@@ -65,8 +67,9 @@ class DataValidation:
                 base_data = base_df[column]
                 current_data = current_df[column]
 
-                # Detect if the column is datetime
-                if base_data.dtype == 'O' and pd.to_datetime(base_data, errors='coerce').notna().all():
+                # Detect if the column is datetime (parsed by the schema, or still strings)
+                if is_datetime64_any_dtype(base_data) or (
+                        base_data.dtype == 'O' and pd.to_datetime(base_data, errors='coerce').notna().all()):
                     # Convert string to datetime
                     base_data = pd.to_datetime(base_data, errors="coerce")
                     current_data = pd.to_datetime(current_data, errors="coerce")
@@ -100,7 +103,7 @@ class DataValidation:
                         }
                 
                 # For numeric columns
-                elif base_data.dtype in [np.float64, np.int64]:
+                elif is_numeric_dtype(base_data):
                     logging.info(f"Running KS test on numeric column: {column}")
                     stat = ks_2samp(base_data, current_data)
                     drift_report[column] = {
@@ -138,8 +141,9 @@ class DataValidation:
         """
         try:
             logging.info('Step 1: Loading base and current datasets.')
-            base_df = pd.read_csv(self.data_validation_config.base_file_path).dropna()
-            current_df = pd.read_csv(self.data_ingestion_artifact.feature_store_file_path).dropna()
+            base_df = read_csv(self.data_validation_config.base_file_path).dropna()
+            current_df = read_table(self.data_ingestion_artifact.feature_store_file_path).dropna()
+            report_memory("data_validation", current_df)
 
             logging.info('Step 2: Checking if required columns exist in the current dataset.')
             columns_valid = self.if_required_columns_exists(
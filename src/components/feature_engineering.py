@@ -7,7 +7,9 @@ import warnings
 from src.logger import logging
 from src.exception import SrcException
 from src.entity import config_entity, artifact_entity
-from src.feature_extractor import generate_features
+from src.incremental_features import DailyFeaturePartitions
+from src.parallel_features import generate_features_parallel
+from src.schema import read_table, report_memory
 
 warnings.filterwarnings("ignore")
 
@@ -53,7 +55,7 @@ class FeatureEngineering:
         """
         try:
             logging.info("Step 1: Reading dataset from feature store path")
-            df = pd.read_csv(self.data_ingestion_artifact.feature_store_file_path)
+            df = read_table(self.data_ingestion_artifact.feature_store_file_path)
 
             logging.info("Step 2: Dropping null and duplicate values")
             df.dropna(inplace=True)
@@ -61,11 +63,19 @@ class FeatureEngineering:
 
             logging.info("Step 3: Applying feature engineering on the DataFrame")
             logging.info(f"Generating new features using these columns: {self.feature_engineering_config.required_column_names}")
-            new_df = generate_features(
-                current_df=df,
-                past_df=None,  # For now, no past data provided
-                required_columns=self.feature_engineering_config.required_column_names
-            )
+            if self.feature_engineering_config.cache_dir:
+                logging.info(f"Reusing unchanged daily partitions from {self.feature_engineering_config.cache_dir}")
+                new_df = DailyFeaturePartitions(
+                    cache_dir=self.feature_engineering_config.cache_dir,
+                    required_columns=self.feature_engineering_config.required_column_names
+                ).build(df)
+            else:
+                new_df = generate_features_parallel(
+                    current_df=df,
+                    required_columns=self.feature_engineering_config.required_column_names,
+                    workers=self.feature_engineering_config.workers
+                )
+            report_memory("feature_engineering", new_df)
 
             logging.info("Step 4: Creating feature engineering directory if it doesn't exist")
             feature_engineering_dir = os.path.dirname(self.feature_engineering_config.feature_engineered_data_file_path)
@@ -9,6 +9,7 @@ from src.exception import SrcException
 from src.config import TARGET_COLUMN
 from src.predictor import ModelResolver
 from src.utils import load_object
+from src.schema import read_model_csv
 from src.entity import config_entity, artifact_entity
 
 # Suppress warnings for cleaner logs
@@ -33,7 +34,7 @@ class ModelEvaluation:
     def initiate_model_evaluation(self) -> artifact_entity.ModelEvaluationArtifact:
         try:
             logging.info("Step 1: Reading test dataset as DataFrame")
-            test_df = pd.read_csv(self.data_preprocessing_artifact.test_file_path)
+            test_df = read_model_csv(self.data_preprocessing_artifact.test_file_path)
 
             logging.info("Step 2: Splitting test data into features and target")
             X_test = test_df.drop(TARGET_COLUMN, axis=1)
@@ -16,6 +16,7 @@ from src.logger import logging
 from src.exception import SrcException
 from src.config import TARGET_COLUMN
 from src.utils import save_object
+from src.schema import read_model_csv, report_memory
 from src.entity import config_entity, artifact_entity
 
 warnings.filterwarnings("ignore")
@@ -131,8 +132,9 @@ class ModelTrainer:
         """
         try:
             logging.info("Step 1: Reading train/test CSVs")
-            train_df = pd.read_csv(self.data_preprocessing_artifact.train_file_path)
-            test_df = pd.read_csv(self.data_preprocessing_artifact.test_file_path)
+            train_df = read_model_csv(self.data_preprocessing_artifact.train_file_path)
+            test_df = read_model_csv(self.data_preprocessing_artifact.test_file_path)
+            report_memory("model_training", train_df)
 
             X_train = train_df.drop(TARGET_COLUMN, axis=1)
             y_train = train_df[TARGET_COLUMN]
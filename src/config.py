@@ -16,6 +16,24 @@ try:
     class EnvironmentVariables:
         mongo_url: str = os.getenv("MONGO_URL")
         database_name:str=os.getenv("DATABASE_NAME")
+        online_feature_store:str=os.getenv("ONLINE_FEATURE_STORE", "false")
+        online_feature_store_refresh_interval:str=os.getenv("ONLINE_FEATURE_STORE_REFRESH_INTERVAL", "60")
+        refresh_overlap_seconds:str=os.getenv("REFRESH_OVERLAP_SECONDS", "3600")
+        model_reload_interval:str=os.getenv("MODEL_RELOAD_INTERVAL", "60")
+        metrics_dir:str=os.getenv("METRICS_DIR")
+        scoring_cache_size:str=os.getenv("SCORING_CACHE_SIZE", "10000")
+        scoring_cache_ttl:str=os.getenv("SCORING_CACHE_TTL", "300")
+        asgi_cpu_workers:str=os.getenv("ASGI_CPU_WORKERS", str(os.cpu_count() or 4))
+        terminal_risk_refresh_interval:str=os.getenv("TERMINAL_RISK_REFRESH_INTERVAL", "300")
+        feature_workers:str=os.getenv("FEATURE_WORKERS", "1")
+        feature_cache_dir:str=os.getenv("FEATURE_CACHE_DIR")
+        terminal_risk_label_delay_days:str=os.getenv("TERMINAL_RISK_LABEL_DELAY_DAYS", "0")
+        ingestion_batch_size:str=os.getenv("INGESTION_BATCH_SIZE", "50000")
+        transaction_store_dir:str=os.getenv("TRANSACTION_STORE_DIR")
+        ingestion_workers:str=os.getenv("INGESTION_WORKERS", "1")
+        ingestion_range_key:str=os.getenv("INGESTION_RANGE_KEY", "TRANSACTION_ID")
+        dataset_read_workers:str=os.getenv("DATASET_READ_WORKERS", "1")
+        dataset_cache_dir:str=os.getenv("DATASET_CACHE_DIR")
 
     # Create an instance of the environment variables class
     env = EnvironmentVariables()
@@ -33,6 +51,61 @@ try:
     TARGET_COLUMN="TX_FRAUD"
     REALTIME_FEATURES=["CUSTOMER_ID" , "TERMINAL_ID" , "TX_AMOUNT" , "TX_DATETIME" , "TRANSACTION_ID"]
 
+    # TX_DATETIME is stored in MongoDB as a string in this format, so range filters compare lexicographically
+    TX_DATETIME_FORMAT="%Y-%m-%d %H:%M:%S"
+
+    # Serve features from the in-process online feature store instead of querying history per request
+    ONLINE_FEATURE_STORE_ENABLED=env.online_feature_store.lower() in ("1", "true", "yes")
+
+    # Seconds between folds of the collection's new transactions into the online feature store
+    ONLINE_FEATURE_STORE_REFRESH_INTERVAL=float(env.online_feature_store_refresh_interval)
+
+    # Incremental refreshes re-read this many seconds of TX_DATETIME before their watermark, so late inserts are not missed
+    REFRESH_OVERLAP_SECONDS=float(env.refresh_overlap_seconds)
+
+    # Seconds between checks of saved_models/ for a newer model to hot-reload
+    MODEL_RELOAD_INTERVAL=float(env.model_reload_interval)
+
+    # Shared directory for per-worker metric files; unset keeps metrics per process
+    METRICS_DIR=env.metrics_dir
+
+    # Recent scoring results kept per worker to answer retried TRANSACTION_IDs (0 disables)
+    SCORING_CACHE_SIZE=int(env.scoring_cache_size)
+    SCORING_CACHE_TTL=float(env.scoring_cache_ttl)
+
+    # Threads running feature generation and scoring for the async (ASGI) service
+    ASGI_CPU_WORKERS=int(env.asgi_cpu_workers)
+
+    # Seconds between incremental refreshes of the materialized terminal risk table
+    TERMINAL_RISK_REFRESH_INTERVAL=float(env.terminal_risk_refresh_interval)
+
+    # Processes generating training features in parallel shards; 1 (the default) runs in-process, which
+    # a daemonic task process (e.g. an Airflow task) needs since it cannot start a process pool
+    FEATURE_WORKERS=int(env.feature_workers)
+
+    # Directory of cached per-day training feature partitions, so a retrain on appended days computes only those; unset computes all days every run
+    FEATURE_CACHE_DIR=env.feature_cache_dir
+
+    # Days after a transaction before its fraud label counts towards TERMINAL_RISK, in training and serving
+    TERMINAL_RISK_LABEL_DELAY_DAYS=float(env.terminal_risk_label_delay_days)
+
+    # Documents fetched, typed and written per batch when exporting a collection
+    INGESTION_BATCH_SIZE=int(env.ingestion_batch_size)
+
+    # Date-partitioned local copy of the collection, synced from a watermark; unset exports the whole collection every run
+    TRANSACTION_STORE_DIR=env.transaction_store_dir
+
+    # Concurrent range reads of a full export (1 reads with a single cursor), split on this key
+    INGESTION_WORKERS=int(env.ingestion_workers)
+    INGESTION_RANGE_KEY=env.ingestion_range_key
+
+    # Processes reading the daily pickle files of a date range; 1 (the default) reads in-process, more start a
+    # spawn pool, which needs the caller's script to be import-safe (an `if __name__ == "__main__"` guard)
+    DATASET_READ_WORKERS=int(env.dataset_read_workers)
+
+    # Directory of consolidated, memory-mappable copies of the date ranges read; unset reads the pickles every time
+    DATASET_CACHE_DIR=env.dataset_cache_dir
+
 except Exception as e:
     # Raise a custom exception with detailed error info
     raise SrcException(e, sys)
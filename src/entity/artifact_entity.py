@@ -5,7 +5,8 @@ import sys
 @dataclass
 class DataIngestionArtifact:
     """
-    Stores the path of the file generated after data ingestion.
+    Stores the path of the file generated after data ingestion (or of the partitioned
+    transaction store directory).
     """
     feature_store_file_path: str
 
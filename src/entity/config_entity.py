@@ -3,7 +3,10 @@ import sys
 import logging
 from datetime import datetime
 from src.exception import SrcException 
-from src.config import database_name 
+from src.config import (
+    database_name, FEATURE_WORKERS, FEATURE_CACHE_DIR, INGESTION_BATCH_SIZE, TRANSACTION_STORE_DIR,
+    INGESTION_WORKERS, INGESTION_RANGE_KEY
+)
 
 class TrainingPipelineConfig:
     def __init__(self):
@@ -15,6 +18,9 @@ class TrainingPipelineConfig:
             
             # Path to store all artifacts
             self.artifact_directory = os.path.join(os.getcwd(), 'artifacts', datetime_file_name)
+
+            # Frame size and peak RSS after each stage
+            self.memory_report_file_path = os.path.join(self.artifact_directory, "memory_report.yml")
         
         except Exception as e:
             raise SrcException(e, sys)
@@ -33,9 +39,20 @@ class DataIngestionConfig:
 
         # File path to store the raw dataset
         self.feature_store_file_path = os.path.join(
-            self.data_ingestion_dir, "feature_store", "main.csv"
+            self.data_ingestion_dir, "feature_store", "main.parquet"
         )
 
+        # Documents read and written per batch
+        self.batch_size = INGESTION_BATCH_SIZE
+
+        # Partitioned store synced incrementally instead of a full export (None to disable)
+        self.transaction_store_dir = TRANSACTION_STORE_DIR
+
+        # Parallel range reads of a full export, and where their timings are reported
+        self.workers = INGESTION_WORKERS
+        self.range_key = INGESTION_RANGE_KEY
+        self.read_report_file_path = os.path.join(self.data_ingestion_dir, "read_report.yml")
+
 
 class DataValidationConfig:
     def __init__(self, training_pipeline_config: TrainingPipelineConfig):
@@ -80,6 +97,12 @@ class FeatureEngineeringConfig:
             'TX_AMOUNT', 'TX_DATETIME', 'TX_FRAUD'
         ]
 
+        # Processes computing the features in parallel customer/terminal shards
+        self.workers = FEATURE_WORKERS
+
+        # Per-day feature partitions reused across runs (None disables the cache)
+        self.cache_dir = FEATURE_CACHE_DIR
+
 
 class DataPreprocessingConfig:
     def __init__(self, training_pipeline_config: TrainingPipelineConfig):
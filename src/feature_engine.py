@@ -0,0 +1,489 @@
+"""
+Fused feature engine behind `generate_features`.
+
+The chained helpers in `src.feature_extractor` each copy the frame, and several re-parse
+TX_DATETIME, re-sort or run row-wise `.apply`. `compute_features` parses TX_DATETIME
+once, derives the row orders the chain would have produced as index arrays, computes
+every feature as a NumPy array over contiguous columns (the rolling windows with
+`src.rolling_kernels`), and builds the output frame with a single take.
+
+The output matches the chained pipeline column for column: same columns, dtypes (those of
+`src.schema`), row order and index. Integer and flag columns are bit-identical. The float
+aggregates (CUSTOMER_AVG_AMOUNT_7D, AVG_AMOUNT_CUSTOMER and the ratios built on them) are
+summed in a different order than pandas' compensated rolling/groupby sums, so they can
+differ in the last bits (relative error of a few 1e-16) and rarely round to neighbouring
+float32s. Features are returned in their compact dtype where nothing derived from them
+needs full precision, so the feature arrays of a large training set stay small.
+
+Every feature is registered with the prepared inputs it reads and the features it is
+derived from (IS_TX_5X_AVG from AVG_AMOUNT_CUSTOMER, WEEKEND_NIGHT from the weekend and
+night flags, ...). `plan_features` resolves a list of wanted columns, e.g. a model's
+`feature_names_in_`, to the minimal set of features to compute, and `prepare_inputs`
+then only builds the sort orders and tie-ranked times that set reads.
+"""
+import numpy as np
+import pandas as pd
+
+from src.rolling_kernels import cumcount, group_starts, last_n_max, last_n_mean, prior_mean, window_count
+from src.schema import COLUMN_DTYPES, apply_schema
+
+NS_PER_MS = 1_000_000
+NS_PER_SECOND = 1_000_000_000
+NS_PER_HOUR = 3600 * NS_PER_SECOND
+NS_PER_DAY = 24 * NS_PER_HOUR
+
+# Engineered columns in the order `generate_features` appends them
+feature_columns = [
+    "TX_HOUR", "TX_WEEK_DAY", "IS_NIGHT_TX", "TX_IS_WEEKEND", "IS_TX_AMOUNT_HIGH",
+    "TX_MONTH", "WEEKEND_NIGHT", "CUSTOMER_AVG_AMOUNT_7D", "CUSTOMER_MAX_AMOUNT_7D",
+    "AVG_AMOUNT_CUSTOMER", "IS_TX_5X_AVG", "CUSTOMER_TX_COUNT_7D", "TERMINAL_TX_COUNT_7D",
+    "CUSTOMER_TX_COUNT_MONTH", "TERMINAL_TX_COUNT_MONTH", "TX_OVER_CUSTOMER_AVG",
+    "TX_OVER_MAX_LAST_7D", "ROLLING_TX_COUNT_1D", "TERMINAL_RISK", "TIME_SINCE_LAST_TX"
+]
+
+# Prepared inputs every plan gets: the output order and the columns it is sorted by
+BASE_INPUTS = ("order", "ns", "customer")
+
+# Inputs passed through to the features as they are rather than sliced per row
+CONTEXT_INPUTS = ("past_df", "risk_table", "label_delay")
+
+# Same constants as the chained helpers
+HIGH_AMOUNT_THRESHOLD = 180
+AMOUNT_WINDOW = 7
+ROLLING_WINDOW_DAYS = 7
+NO_PREVIOUS_TX = 999999
+
+
+def _group_mean(codes: np.ndarray, values: np.ndarray) -> np.ndarray:
+    """Mean of `values` over each row's group, aligned to the rows."""
+    sums = np.bincount(codes, weights=values)
+    counts = np.bincount(codes)
+    # Codes without rows (e.g. other shards' groups) are never looked up
+    return (sums / np.maximum(counts, 1))[codes]
+
+
+def _group_size(codes: np.ndarray) -> np.ndarray:
+    return np.bincount(codes)[codes].astype(np.int32)
+
+
+def terminal_risk(terminal_ids: np.ndarray, ns: np.ndarray, fraud: np.ndarray = None,
+                  past_df: pd.DataFrame = None, risk_table=None, label_delay: int = 0) -> np.ndarray:
+    """
+    TERMINAL_RISK of transactions at terminals `terminal_ids` and int64 times `ns`: the
+    terminal's fraud rate over the labeled transactions before `ns - label_delay`, 0 for
+    terminals without any. Training and serving (both engines) compute it here.
+
+    The labels come, in this priority, from `risk_table` (the materialized rate over every
+    label loaded so far, which applies the same delay), the labeled `past_df` (prediction)
+    or `fraud`, the labels of the transactions themselves (training). Without labels it is 0.
+    """
+    if risk_table is not None:
+        if risk_table.label_delay != label_delay:
+            raise ValueError(f"risk_table counts labels after {pd.Timedelta(risk_table.label_delay)}, "
+                             f"the features after {pd.Timedelta(label_delay)}")
+        return risk_table.lookup(terminal_ids, ns)
+    if past_df is not None and not past_df.empty and "TX_FRAUD" in past_df.columns:
+        labeled_ids = past_df["TERMINAL_ID"].to_numpy()
+        labeled_ns = pd.to_datetime(past_df["TX_DATETIME"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+        labels = past_df["TX_FRAUD"].to_numpy(dtype=np.float64)
+    elif fraud is not None:
+        labeled_ids, labeled_ns, labels = terminal_ids, ns, fraud
+    else:
+        return np.zeros(len(terminal_ids), dtype=np.int64)
+    return prior_mean(labeled_ids, labeled_ns, labels, terminal_ids, ns - label_delay)
+
+
+def _months(ns: np.ndarray) -> np.ndarray:
+    """Calendar months since the epoch, so the same month of different years differs."""
+    return ns.view("datetime64[ns]").astype("datetime64[M]").view(np.int64)
+
+
+def _month(ns: np.ndarray) -> np.ndarray:
+    return (_months(ns) % 12 + 1).astype(np.int8)
+
+
+def _month_group_size(codes: np.ndarray, ns: np.ndarray) -> np.ndarray:
+    """Rows of the same customer or terminal (`codes`) in the same year and month."""
+    months = _months(ns)
+    if not len(months):
+        return np.zeros(0, dtype=np.int32)
+    months = months - months.min()
+    return _group_size(codes * (int(months.max()) + 1) + months)
+
+
+class Feature:
+    """
+    An engineered column computed by `compute(inputs, features)` from the prepared
+    `inputs` it names and the already computed features in `depends`.
+
+    `scope` is "row", "customer" or "terminal": customer and terminal features only read
+    the rows of their own customer or terminal, so they can be computed per shard, and
+    only depend on features of the same scope.
+
+    `history` lists the earlier rows of the customer or terminal a value reads, as
+    (scope, extent) specs for `trim_history`: ("all",), ("last", n), ("window", ns) or
+    ("month",).
+    """
+
+    def __init__(self, name: str, scope: str, inputs: tuple, depends: tuple, history: tuple, compute):
+        self.name = name
+        self.scope = scope
+        self.inputs = inputs
+        self.depends = depends
+        self.history = history
+        self.compute = compute
+
+    def __repr__(self) -> str:
+        return f"Feature({self.name!r}, scope={self.scope!r}, depends={self.depends!r})"
+
+
+# Registered features by name
+FEATURE_REGISTRY = {}
+
+
+def register(name: str, scope: str, inputs: tuple = (), depends: tuple = (), history: tuple = ()):
+    """Register the decorated function as the computation of feature `name`."""
+    def decorator(compute):
+        for dependency in depends:
+            if FEATURE_REGISTRY[dependency].scope != scope:
+                raise ValueError(f"{name} depends on {dependency} from another scope")
+        FEATURE_REGISTRY[name] = Feature(name, scope, tuple(inputs), tuple(depends), tuple(history), compute)
+        return compute
+    return decorator
+
+
+def plan_features(names=None) -> list:
+    """
+    Features needed to produce `names` (all features by default), dependencies first.
+    Names that are not registered features (raw columns such as TX_AMOUNT) are ignored.
+    """
+    wanted = feature_columns if names is None else [name for name in names if name in FEATURE_REGISTRY]
+    plan, planned = [], set()
+
+    def visit(name):
+        if name in planned:
+            return
+        planned.add(name)
+        feature = FEATURE_REGISTRY[name]
+        for dependency in feature.depends:
+            visit(dependency)
+        plan.append(feature)
+
+    for name in wanted:
+        visit(name)
+    return plan
+
+
+def plan_inputs(plan: list) -> set:
+    """Prepared inputs read by the features of `plan`."""
+    return set(BASE_INPUTS).union(*(feature.inputs for feature in plan))
+
+
+def prepare_inputs(df: pd.DataFrame, plan: list = None) -> dict:
+    """
+    Parse and order the input columns once: every array is in output order, i.e. sorted
+    by (CUSTOMER_ID, TX_DATETIME) the way the chained pipeline leaves the rows. Only the
+    inputs read by `plan` (all features by default) are built; the others are None.
+
+    The chain sorts by TX_DATETIME with a stable sort, so rows with the same timestamp
+    keep their input order; a customer's rows are then in output order for its amount
+    stats too. The millisecond tie ranks of both windows are resolved here, so the
+    customer and terminal features can later be computed on any subset of groups.
+    """
+    needed = plan_inputs(plan_features() if plan is None else plan)
+    times = pd.to_datetime(df["TX_DATETIME"]).to_numpy(dtype="datetime64[ns]")
+    customer = pd.factorize(df["CUSTOMER_ID"], sort=True)[0]
+
+    rolling_order = times.argsort(kind="stable")
+    rolling_ns = times.view(np.int64)[rolling_order]
+    order = rolling_order[np.lexsort((rolling_ns, customer[rolling_order]))]
+    output_position = np.empty(len(df), dtype=np.intp)
+    output_position[order] = np.arange(len(df))
+
+    ns = times.view(np.int64)[order]
+    inputs = dict.fromkeys(needed)
+    inputs.update(order=order, ns=ns, customer=customer[order])
+
+    if {"terminal", "terminal_ids"} & needed:
+        inputs["terminal_ids"] = df["TERMINAL_ID"].to_numpy()[order]
+        inputs["terminal"] = pd.factorize(inputs["terminal_ids"])[0]
+    if "amount" in needed:
+        inputs["amount"] = df["TX_AMOUNT"].to_numpy(dtype=np.float64)[order]
+    if "fraud" in needed and "TX_FRAUD" in df.columns:
+        inputs["fraud"] = df["TX_FRAUD"].to_numpy(dtype=np.float64)[order]
+
+    # TX_DATETIME made unique with a millisecond tie rank: the `groupby('TX_DATETIME').cumcount()`
+    # in the rolling order for the 7-day counts and in the output order for the 1-day count
+    if "unique_times_7d" in needed:
+        tie_rank = np.empty(len(df), dtype=np.int64)
+        tie_rank[output_position[rolling_order]] = cumcount(rolling_ns)
+        inputs["unique_times_7d"] = ns + tie_rank * NS_PER_MS
+    if "unique_times_1d" in needed:
+        inputs["unique_times_1d"] = ns + cumcount(ns) * NS_PER_MS
+    return inputs
+
+
+# Calendar fields and flags, which depend on the row alone
+
+@register("TX_HOUR", "row", inputs=("ns",))
+def _tx_hour(inputs, features):
+    return ((inputs["ns"] // NS_PER_HOUR) % 24).astype(np.int8)
+
+
+@register("TX_WEEK_DAY", "row", inputs=("ns",))
+def _tx_week_day(inputs, features):
+    return ((inputs["ns"] // NS_PER_DAY + 3) % 7).astype(np.int8)  # 1970-01-01 was a Thursday
+
+
+@register("IS_NIGHT_TX", "row", depends=("TX_HOUR",))
+def _is_night_tx(inputs, features):
+    return (features["TX_HOUR"] < 6).astype(np.int8)
+
+
+@register("TX_IS_WEEKEND", "row", depends=("TX_WEEK_DAY",))
+def _tx_is_weekend(inputs, features):
+    return (features["TX_WEEK_DAY"] >= 5).astype(np.int8)
+
+
+@register("IS_TX_AMOUNT_HIGH", "row", inputs=("amount",))
+def _is_tx_amount_high(inputs, features):
+    return (inputs["amount"] > HIGH_AMOUNT_THRESHOLD).astype(np.int8)
+
+
+@register("TX_MONTH", "row", inputs=("ns",))
+def _tx_month(inputs, features):
+    return _month(inputs["ns"])
+
+
+@register("WEEKEND_NIGHT", "row", depends=("TX_IS_WEEKEND", "IS_NIGHT_TX"))
+def _weekend_night(inputs, features):
+    return features["TX_IS_WEEKEND"] & features["IS_NIGHT_TX"]
+
+
+# Per-customer features; a customer's features only depend on its own rows
+
+@register("CUSTOMER_AVG_AMOUNT_7D", "customer", inputs=("customer", "amount"),
+          history=(("customer", "last", AMOUNT_WINDOW),))
+def _customer_avg_amount_7d(inputs, features):
+    return last_n_mean(inputs["customer"], inputs["amount"], AMOUNT_WINDOW).astype(np.float32)
+
+
+@register("CUSTOMER_MAX_AMOUNT_7D", "customer", inputs=("customer", "amount"),
+          history=(("customer", "last", AMOUNT_WINDOW),))
+def _customer_max_amount_7d(inputs, features):
+    return last_n_max(inputs["customer"], inputs["amount"], AMOUNT_WINDOW)
+
+
+@register("AVG_AMOUNT_CUSTOMER", "customer", inputs=("customer", "amount"),
+          history=(("customer", "all"),))
+def _avg_amount_customer(inputs, features):
+    return _group_mean(inputs["customer"], inputs["amount"])
+
+
+@register("IS_TX_5X_AVG", "customer", inputs=("amount",), depends=("AVG_AMOUNT_CUSTOMER",))
+def _is_tx_5x_avg(inputs, features):
+    return (inputs["amount"] > 5 * features["AVG_AMOUNT_CUSTOMER"]).astype(np.int8)
+
+
+@register("CUSTOMER_TX_COUNT_7D", "customer", inputs=("customer", "unique_times_7d"),
+          history=(("customer", "window", ROLLING_WINDOW_DAYS * NS_PER_DAY),))
+def _customer_tx_count_7d(inputs, features):
+    return window_count(
+        inputs["customer"], inputs["unique_times_7d"], ROLLING_WINDOW_DAYS * NS_PER_DAY
+    ).astype(np.int32)
+
+
+@register("CUSTOMER_TX_COUNT_MONTH", "customer", inputs=("customer", "ns"),
+          history=(("customer", "month"),))
+def _customer_tx_count_month(inputs, features):
+    return _month_group_size(inputs["customer"], inputs["ns"])
+
+
+@register("TX_OVER_CUSTOMER_AVG", "customer", inputs=("amount",), depends=("AVG_AMOUNT_CUSTOMER",))
+def _tx_over_customer_avg(inputs, features):
+    return (inputs["amount"] / (features["AVG_AMOUNT_CUSTOMER"] + 1e-5)).astype(np.float32)
+
+
+@register("TX_OVER_MAX_LAST_7D", "customer", inputs=("amount",), depends=("CUSTOMER_MAX_AMOUNT_7D",))
+def _tx_over_max_last_7d(inputs, features):
+    return (inputs["amount"] / (features["CUSTOMER_MAX_AMOUNT_7D"] + 1e-5)).astype(np.float32)
+
+
+@register("ROLLING_TX_COUNT_1D", "customer", inputs=("customer", "unique_times_1d"),
+          history=(("customer", "window", NS_PER_DAY),))
+def _rolling_tx_count_1d(inputs, features):
+    return window_count(inputs["customer"], inputs["unique_times_1d"], NS_PER_DAY).astype(np.int32)
+
+
+@register("TIME_SINCE_LAST_TX", "customer", inputs=("customer", "ns"),
+          history=(("customer", "last", 1),))
+def _time_since_last_tx(inputs, features):
+    # Seconds since the customer's previous transaction
+    ns = inputs["ns"]
+    time_since_last = np.empty(len(ns), dtype=np.float64)
+    time_since_last[1:] = (ns[1:] - ns[:-1]) / NS_PER_SECOND
+    time_since_last[group_starts(inputs["customer"])] = NO_PREVIOUS_TX
+    return time_since_last.astype(np.float32)
+
+
+# Per-terminal features; a terminal's features only depend on its own rows
+
+@register("TERMINAL_TX_COUNT_7D", "terminal", inputs=("terminal", "unique_times_7d"),
+          history=(("terminal", "window", ROLLING_WINDOW_DAYS * NS_PER_DAY),))
+def _terminal_tx_count_7d(inputs, features):
+    return window_count(
+        inputs["terminal"], inputs["unique_times_7d"], ROLLING_WINDOW_DAYS * NS_PER_DAY
+    ).astype(np.int32)
+
+
+@register("TERMINAL_TX_COUNT_MONTH", "terminal", inputs=("terminal", "ns"),
+          history=(("terminal", "month"),))
+def _terminal_tx_count_month(inputs, features):
+    return _month_group_size(inputs["terminal"], inputs["ns"])
+
+
+@register("TERMINAL_RISK", "terminal",
+          inputs=("terminal_ids", "terminal", "ns", "fraud", "past_df", "risk_table", "label_delay"),
+          history=(("terminal", "all"),))
+def _terminal_risk(inputs, features):
+    # Shard workers only get the terminal codes, which serve as well for the rows' own labels
+    terminal_ids = inputs["terminal"] if inputs["terminal_ids"] is None else inputs["terminal_ids"]
+    return terminal_risk(terminal_ids, inputs["ns"], inputs["fraud"], inputs["past_df"],
+                         inputs["risk_table"], inputs["label_delay"] or 0).astype(np.float32)
+
+
+def trim_history(past_df: pd.DataFrame, current_df: pd.DataFrame, plan: list) -> pd.DataFrame:
+    """
+    The rows of `past_df` the features of `plan` read for the current rows, in their order.
+
+    Computing the current rows' features on these rows plus `current_df` gives the values
+    of computing them on the whole of `past_df` plus `current_df`: each feature keeps the
+    rows its `history` names for the current customers and terminals (everything for the
+    averages, the last n rows, the rows from the window before the first current row or
+    of the same year and month), and every timestamp kept or on a window edge keeps all
+    of its rows, so the millisecond tie ranks (and the tie order the stable sorts keep)
+    are unchanged. Past rows with a current TRANSACTION_ID are returned by
+    `generate_features` too; their customers and terminals keep all their rows.
+    """
+    times = pd.to_datetime(past_df["TX_DATETIME"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    current_times = pd.to_datetime(current_df["TX_DATETIME"]).to_numpy(dtype="datetime64[ns]").view(np.int64)
+    targets = past_df["TRANSACTION_ID"].isin(current_df["TRANSACTION_ID"]).to_numpy()
+    target_times = np.concatenate([current_times, times[targets]])
+
+    keep = targets.copy()
+    edges = [target_times]
+    for scope, column in (("customer", "CUSTOMER_ID"), ("terminal", "TERMINAL_ID")):
+        extents = {spec[1:] for feature in plan for spec in feature.history if spec[0] == scope}
+        if not extents:
+            continue
+        ids = past_df[column].to_numpy()
+        keep |= np.isin(ids, ids[targets])
+        member = np.isin(ids, current_df[column].to_numpy())
+        for extent in extents:
+            if extent[0] == "all":
+                keep |= member
+            elif extent[0] == "window":
+                keep |= member & (times >= current_times.min() - extent[1])
+                edges.append(target_times - extent[1])
+            elif extent[0] == "month":
+                keep |= member & np.isin(_months(times), _months(current_times))
+            elif extent[0] == "last":
+                # The last n rows of every customer or terminal in time order, ties in row order
+                rows = np.flatnonzero(member)
+                rows = rows[np.argsort(times[rows], kind="stable")][::-1]
+                keep[rows[cumcount(pd.factorize(ids[rows])[0]) < extent[1]]] = True
+
+    keep |= np.isin(times, np.concatenate([times[keep], *edges]))
+    return past_df[keep]
+
+
+def _select(inputs: dict, names: set, rows: np.ndarray = None) -> dict:
+    """The prepared inputs `names` restricted to `rows` (ascending output positions)."""
+    selected = {}
+    for name in names:
+        values = inputs.get(name)
+        if rows is None or values is None or name in CONTEXT_INPUTS:
+            selected[name] = values
+        else:
+            selected[name] = values[rows]
+    return selected
+
+
+def evaluate(inputs: dict, plan: list, rows: np.ndarray = None) -> dict:
+    """
+    Compute the features of `plan` (in plan order) on `rows`: ascending output positions
+    covering whole customers for customer features and whole terminals for terminal
+    features; all rows by default.
+    """
+    selected = _select(inputs, plan_inputs(plan) | set(CONTEXT_INPUTS), rows)
+    features = {}
+    for feature in plan:
+        features[feature.name] = feature.compute(selected, features)
+    return features
+
+
+def _scoped(plan: list, scope: str) -> list:
+    return [feature for feature in (plan_features() if plan is None else plan) if feature.scope == scope]
+
+
+def row_features(inputs: dict, plan: list = None) -> dict:
+    """Calendar fields and flags of `plan` (all by default), which depend on the row alone."""
+    return evaluate(inputs, _scoped(plan, "row"))
+
+
+def customer_features(inputs: dict, rows: np.ndarray = None, plan: list = None) -> dict:
+    """
+    Per-customer features of `plan` (all by default) for `rows` (ascending output positions
+    covering whole customers; all rows by default).
+    """
+    return evaluate(inputs, _scoped(plan, "customer"), rows)
+
+
+def terminal_features(inputs: dict, rows: np.ndarray = None, plan: list = None) -> dict:
+    """
+    Per-terminal features of `plan` (all by default) for `rows` (ascending output positions
+    covering whole terminals; all rows by default).
+    """
+    return evaluate(inputs, _scoped(plan, "terminal"), rows)
+
+
+def assemble_output(df: pd.DataFrame, inputs: dict, features: dict, keep=None) -> pd.DataFrame:
+    """
+    `df` columns in output order followed by `features` in `feature_columns` order; the
+    index is the output position, as after the chain's last reset_index. Columns are cast
+    to `src.schema`'s dtypes.
+    """
+    order = inputs["order"]
+    rows = np.arange(len(df)) if keep is None else np.flatnonzero(np.asarray(keep, dtype=bool)[order])
+    output = df.take(order[rows])
+    output.index = pd.Index(rows)
+    output["TX_DATETIME"] = inputs["ns"][rows].view("datetime64[ns]")
+    for name in feature_columns:
+        if name in features:
+            # Cast column by column rather than after building a frame of float64/int64 columns
+            output[name] = features[name][rows].astype(COLUMN_DTYPES[name], copy=False)
+    return apply_schema(output)
+
+
+def compute_features(df: pd.DataFrame, past_df: pd.DataFrame = None, risk_table=None, keep=None,
+                     features=None, label_delay: int = 0) -> pd.DataFrame:
+    """
+    Engineered features of `df` in one pass; the columns, rows and index
+    `generate_features` produces with the chained helpers.
+
+    Parameters:
+        df (pd.DataFrame): Combined transactions (history and current rows in prediction mode).
+        past_df (pd.DataFrame): Labeled history for TERMINAL_RISK (in prediction).
+        risk_table (TerminalRiskTable): Materialized fraud rate for TERMINAL_RISK (in prediction).
+        keep (np.ndarray): Boolean mask aligned to `df`; only these rows are returned.
+        features (list): Columns wanted, e.g. a model's `feature_names_in_`; only these
+            features and the ones they depend on are computed. All by default.
+        label_delay (int): Nanoseconds before a label counts towards TERMINAL_RISK.
+
+    Returns:
+        pd.DataFrame: `df` columns plus the planned features, sorted by (CUSTOMER_ID, TX_DATETIME).
+    """
+    plan = plan_features(features)
+    inputs = prepare_inputs(df, plan)
+    inputs.update(past_df=past_df, risk_table=risk_table, label_delay=label_delay)
+    return assemble_output(df, inputs, evaluate(inputs, plan), keep=keep)
@@ -1,5 +1,8 @@
 from src.exception import SrcException
-from src.config import mongo_client ,TARGET_COLUMN , REALTIME_FEATURES
+from src.config import mongo_client ,TARGET_COLUMN , REALTIME_FEATURES, TERMINAL_RISK_LABEL_DELAY_DAYS
+from src.feature_engine import compute_features, feature_columns, plan_features, terminal_risk, trim_history, NS_PER_MS
+from src.rolling_kernels import cumcount, last_n_max, last_n_mean, window_count
+from src.schema import apply_schema
 from pymongo import DESCENDING 
 import pandas as pd
 import numpy as np
@@ -32,40 +35,43 @@ def create_is_tx_amount_high(df, threshold=180):
     df['IS_TX_AMOUNT_HIGH'] = df['TX_AMOUNT'].apply(lambda x: 1 if x > threshold else 0)
     return df
 
+def unique_tx_times(df):
+    """
+    TX_DATETIME as int64 nanoseconds, made unique for the rolling windows by adding one
+    millisecond per earlier row with the same timestamp (in the frame's row order).
+    """
+    times = df['TX_DATETIME'].to_numpy(dtype='datetime64[ns]').view(np.int64)
+    return times + cumcount(times) * NS_PER_MS
+
 def create_rolling_features(df, window_days=7):
     """Create rolling counts of transactions over last N days per customer and terminal."""
     df = df.copy()
     df['TX_DATETIME'] = pd.to_datetime(df['TX_DATETIME'])
-    df = df.sort_values('TX_DATETIME')
+    df = df.sort_values('TX_DATETIME', kind='stable')
 
     # Make TX_DATETIME unique for rolling window (handle duplicate timestamps)
-    df['TX_DATETIME_Unique'] = df.groupby('TX_DATETIME').cumcount()
-    df['TX_DATETIME_UNIQUE_IDX'] = df['TX_DATETIME'] + pd.to_timedelta(df['TX_DATETIME_Unique'], unit='ms')
-
-    df.set_index('TX_DATETIME_UNIQUE_IDX', inplace=True)
+    times = unique_tx_times(df)
+    window = pd.Timedelta(days=window_days).value
 
-    df['CUSTOMER_TX_COUNT_7D'] = df.groupby('CUSTOMER_ID')['TX_AMOUNT'].rolling(f'{window_days}D').count().reset_index(level=0, drop=True)
-    df['TERMINAL_TX_COUNT_7D'] = df.groupby('TERMINAL_ID')['TX_AMOUNT'].rolling(f'{window_days}D').count().reset_index(level=0, drop=True)
+    df['CUSTOMER_TX_COUNT_7D'] = window_count(pd.factorize(df['CUSTOMER_ID'])[0], times, window).astype(float)
+    df['TERMINAL_TX_COUNT_7D'] = window_count(pd.factorize(df['TERMINAL_ID'])[0], times, window).astype(float)
 
     df.reset_index(drop=True, inplace=True)
-    df.drop(columns=['TX_DATETIME_Unique'], inplace=True)
 
     return df
 
 def create_amount_stats(df, window=7):
-    """Create average and max amount per customer over last N days and overall average."""
+    """Create average and max amount per customer over last N transactions and overall average."""
     df = df.copy()
-    df = df.sort_values(by='TX_DATETIME')
+    df = df.sort_values(by='TX_DATETIME', kind='stable')
 
-    df['CUSTOMER_AVG_AMOUNT_7D'] = df.groupby('CUSTOMER_ID')['TX_AMOUNT'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).mean()
-    )
-
-    df['CUSTOMER_MAX_AMOUNT_7D'] = df.groupby('CUSTOMER_ID')['TX_AMOUNT'].transform(
-        lambda x: x.rolling(window=window, min_periods=1).max()
-    )
+    customers = pd.factorize(df['CUSTOMER_ID'])[0]
+    amounts = df['TX_AMOUNT'].to_numpy(dtype=float)
+    df['CUSTOMER_AVG_AMOUNT_7D'] = last_n_mean(customers, amounts, window)
+    df['CUSTOMER_MAX_AMOUNT_7D'] = last_n_max(customers, amounts, window)
 
-    df['AVG_AMOUNT_CUSTOMER'] = df.groupby('CUSTOMER_ID')['TX_AMOUNT'].transform('mean')
+    # Averaged in float64 (the float32 amounts would give a float32 mean); the schema rounds the output
+    df['AVG_AMOUNT_CUSTOMER'] = df['TX_AMOUNT'].astype(float).groupby(df['CUSTOMER_ID']).transform('mean')
 
     return df
 
@@ -82,14 +88,16 @@ def create_tx_month(df):
     return df
 
 def create_monthly_tx_counts(df):
-    """Add monthly transaction counts for each customer and terminal."""
+    """Add monthly transaction counts for each customer and terminal, per year and month."""
     df = df.copy()
 
     if 'TX_MONTH' not in df.columns:
         df = create_tx_month(df)
 
-    df['CUSTOMER_TX_COUNT_MONTH'] = df.groupby(['CUSTOMER_ID', 'TX_MONTH'])['TX_DATETIME'].transform('count')
-    df['TERMINAL_TX_COUNT_MONTH'] = df.groupby(['TERMINAL_ID', 'TX_MONTH'])['TX_DATETIME'].transform('count')
+    # TX_MONTH alone would count the same month of earlier years too
+    tx_year = pd.to_datetime(df['TX_DATETIME']).dt.year
+    df['CUSTOMER_TX_COUNT_MONTH'] = df.groupby(['CUSTOMER_ID', tx_year, 'TX_MONTH'])['TX_DATETIME'].transform('count')
+    df['TERMINAL_TX_COUNT_MONTH'] = df.groupby(['TERMINAL_ID', tx_year, 'TX_MONTH'])['TX_DATETIME'].transform('count')
 
     return df
 
@@ -109,53 +117,46 @@ def create_rolling_tx_count_1d(df):
     df = df.copy()
     df['TX_DATETIME'] = pd.to_datetime(df['TX_DATETIME'])  # ensure it's datetime
     df = df.sort_values(by=['CUSTOMER_ID', 'TX_DATETIME'])
-    df['TX_DATETIME_Unique'] = df.groupby('TX_DATETIME').cumcount()
-    df['TX_DATETIME_UNIQUE_IDX'] = df['TX_DATETIME'] + pd.to_timedelta(df['TX_DATETIME_Unique'], unit='ms')
-
 
-    df.set_index('TX_DATETIME_UNIQUE_IDX', inplace=True)
-
-    df['ROLLING_TX_COUNT_1D'] = (
-        df.groupby('CUSTOMER_ID')['TX_AMOUNT']
-        .rolling('1D')
-        .count()
-        .reset_index(level=0, drop=True)
-    )
+    df['ROLLING_TX_COUNT_1D'] = window_count(
+        pd.factorize(df['CUSTOMER_ID'])[0], unique_tx_times(df), pd.Timedelta(days=1).value
+    ).astype(float)
 
     df.reset_index(drop=True, inplace=True)
-    df.drop(columns=['TX_DATETIME_Unique'], inplace=True)
 
     return df
 
-def create_terminal_risk(df: pd.DataFrame, past_df: pd.DataFrame = None) -> pd.DataFrame:
+def create_terminal_risk(df: pd.DataFrame, past_df: pd.DataFrame = None, risk_table=None,
+                         label_delay_days: float = TERMINAL_RISK_LABEL_DELAY_DAYS) -> pd.DataFrame:
     """
-    Assigns a risk score to each TERMINAL_ID based on historical fraud rate.
+    Assigns a risk score to each transaction: its terminal's fraud rate over the labeled
+    transactions before it (point in time, see `src.feature_engine.terminal_risk`).
 
-    - In training mode: calculates from df itself.
-    - In prediction mode: calculates from past_df to avoid leakage.
+    - In training mode: calculates from the labels of df itself.
+    - In prediction mode: looks it up in `risk_table` when given, otherwise calculates
+      from past_df to avoid leakage.
 
     Parameters:
         df (pd.DataFrame): The current or combined dataframe to apply terminal risk.
         past_df (pd.DataFrame): Past transactions used for terminal fraud rate (in prediction).
+        risk_table (TerminalRiskTable): Materialized fraud rate over all labeled transactions, with the same delay (in prediction).
+        label_delay_days (float): Days after a transaction before its label counts.
 
     Returns:
         pd.DataFrame: DataFrame with TERMINAL_RISK column added.
     """
     df = df.copy()
 
-    if past_df is not None and not past_df.empty and "TX_FRAUD" in past_df.columns:
-        # Prediction mode: calculate risk from past_df only
-        terminal_fraud_rate = past_df.groupby("TERMINAL_ID")["TX_FRAUD"].mean()
-        df["TERMINAL_RISK"] = df["TERMINAL_ID"].map(terminal_fraud_rate).fillna(0)
-
-    elif "TX_FRAUD" in df.columns:
-        # Training mode: calculate risk from df itself
-        terminal_fraud_rate = df.groupby("TERMINAL_ID")["TX_FRAUD"].mean()
-        df["TERMINAL_RISK"] = df["TERMINAL_ID"].map(terminal_fraud_rate).fillna(0)
-
-    else:
-        # No fraud labels available
-        df["TERMINAL_RISK"] = 0
+    # Prediction mode: lookup in the precomputed table, otherwise from past_df only to avoid
+    # leakage; training mode: from the earlier labels of df itself
+    df["TERMINAL_RISK"] = terminal_risk(
+        df["TERMINAL_ID"].to_numpy(),
+        pd.to_datetime(df["TX_DATETIME"]).to_numpy(dtype="datetime64[ns]").view(np.int64),
+        df["TX_FRAUD"].to_numpy(dtype=float) if "TX_FRAUD" in df.columns else None,
+        past_df,
+        risk_table,
+        pd.Timedelta(days=label_delay_days).value
+    )
 
     return df
 
@@ -196,6 +197,50 @@ def add_weekday_features(df: pd.DataFrame) -> pd.DataFrame:
     df["TX_WEEK_DAY"] = df["TX_DATETIME"].dt.weekday
     return df
 
+def get_history_start(cutoff, window_days=7):
+    """
+    Earliest TX_DATETIME needed to rebuild the windowed features of transactions at `cutoff`:
+    the longest rolling window (`window_days`) or the start of the cutoff's month for the
+    monthly counts (which count per year and month), whichever is earlier.
+    """
+    cutoff = pd.Timestamp(cutoff)
+    month_start = cutoff.normalize().replace(day=1)
+    return min(cutoff - pd.Timedelta(days=window_days), month_start)
+
+def get_history_lookback(cutoff, terminal_risk_table=None, window_days=7):
+    """
+    Lookback of the customer and terminal history fetches for transactions at `cutoff`,
+    as keyword arguments of `get_customer_terminal_history`.
+
+    The customer history is unbounded: AVG_AMOUNT_CUSTOMER, the last-7-transaction amount
+    stats and TIME_SINCE_LAST_TX read every earlier transaction of the customer, as they
+    do in training. The terminal history only needs the windowed features'
+    `get_history_start` when `terminal_risk_table` serves TERMINAL_RISK; otherwise the
+    terminal's whole labeled history is fetched for it.
+    """
+    return {
+        "customer_lookback_start": None,
+        "terminal_lookback_start": get_history_start(cutoff, window_days) if terminal_risk_table is not None else None,
+    }
+
+def independent_groups(current_df: pd.DataFrame) -> np.ndarray:
+    """
+    Group number of each row of a batch such that no two rows of a group share a
+    CUSTOMER_ID or TERMINAL_ID.
+
+    `generate_features` treats the current rows as history of each other (with their
+    placeholder labels); scoring a batch one group at a time against the same `past_df`
+    gives every row the features of its own history only, as `/predict` and the online
+    feature store compute them.
+    """
+    next_customer_group, next_terminal_group = {}, {}
+    groups = np.empty(len(current_df), dtype=np.int64)
+    for position, (customer_id, terminal_id) in enumerate(zip(current_df["CUSTOMER_ID"], current_df["TERMINAL_ID"])):
+        group = max(next_customer_group.get(customer_id, 0), next_terminal_group.get(terminal_id, 0))
+        groups[position] = group
+        next_customer_group[customer_id] = next_terminal_group[terminal_id] = group + 1
+    return groups
+
 #####################
 # Feature Generator
 #####################
@@ -203,12 +248,37 @@ def add_weekday_features(df: pd.DataFrame) -> pd.DataFrame:
 def generate_features(current_df: pd.DataFrame, 
                       past_df: pd.DataFrame = None, 
                       required_columns= required_columns, 
-                      mode: str = "training") -> pd.DataFrame:
+                      mode: str = "training",
+                      terminal_risk_table=None,
+                      engine: str = "fused",
+                      features=None,
+                      label_delay_days: float = TERMINAL_RISK_LABEL_DELAY_DAYS) -> pd.DataFrame:
     """
     Generates features for fraud detection based on mode.
+
+    TERMINAL_RISK is each terminal's fraud rate as of the transaction, over the labels of
+    transactions at least `label_delay_days` older: from the rows themselves in training,
+    from the fetched past_df in prediction. There `terminal_risk_table` (a
+    `TerminalRiskTable` with the same label delay) can supply it instead, over every label
+    loaded so far.
+
+    `engine="fused"` computes the features in one pass with `src.feature_engine`;
+    `engine="chained"` runs the step-by-step helpers below, which produce the same output.
+    Both cast the input and output columns to the `src.schema` dtypes.
+
+    `features` (e.g. the model's `feature_names_in_`) limits the output to those engineered
+    columns; the fused engine then only computes them and the features they depend on.
+
+    In prediction mode the fused engine computes the current rows as of their history: only
+    the past rows their features read (`trim_history`) are combined with them, so the work
+    follows the windows and the current customers' and terminals' history rather than the
+    length of `past_df`. The values and row order are those of the full computation; the
+    index is the position among the rows computed.
     """
     if current_df is None or current_df.empty:
         raise ValueError("`current_df` must be a non-empty DataFrame")
+    if engine not in ("fused", "chained"):
+        raise ValueError("`engine` must be either 'fused' or 'chained'")
 
     try:
         if mode == "prediction":
@@ -230,7 +300,15 @@ def generate_features(current_df: pd.DataFrame,
                 past_df["TX_DATETIME"] = pd.to_datetime(past_df["TX_DATETIME"])
                 past_df = past_df[past_df["TX_DATETIME"] < cutoff_time]
 
-                combined_df = pd.concat([past_df, current_df]).sort_values("TX_DATETIME")
+                history = past_df
+                if engine == "fused" and not past_df.empty:
+                    # Only the history the current rows' features read: same values, less work
+                    history = trim_history(past_df, current_df, plan_features(features))
+                    # TERMINAL_RISK reads all of a current terminal's history, which `history` keeps;
+                    # any labeled history without the current terminals gives them 0 alike
+                    past_df = history if not history.empty else past_df.head(1)
+
+                combined_df = pd.concat([history, current_df]).sort_values("TX_DATETIME", kind="stable")
             else:
                 combined_df = current_df.copy()
 
@@ -246,6 +324,19 @@ def generate_features(current_df: pd.DataFrame,
         else:
             raise ValueError("`mode` must be either 'training' or 'prediction'")
 
+        # Same input dtypes in training and serving, e.g. float32 amounts
+        combined_df = apply_schema(combined_df)
+
+        if engine == "fused":
+            return compute_features(
+                combined_df,
+                past_df if mode == "prediction" else None,
+                terminal_risk_table if mode == "prediction" else None,
+                keep=combined_df["TRANSACTION_ID"].isin(current_df["TRANSACTION_ID"]).to_numpy(),
+                features=features,
+                label_delay=pd.Timedelta(days=label_delay_days).value
+            )
+
         # Base features
         combined_df = add_weekday_features(combined_df)
         combined_df = create_is_night_tx(combined_df)
@@ -262,7 +353,12 @@ def generate_features(current_df: pd.DataFrame,
             combined_df = create_monthly_tx_counts(combined_df)
             combined_df = create_ratio_features(combined_df)
             combined_df = create_rolling_tx_count_1d(combined_df)
-            combined_df = create_terminal_risk(combined_df, past_df if mode == "prediction" else None)
+            combined_df = create_terminal_risk(
+                combined_df,
+                past_df if mode == "prediction" else None,
+                terminal_risk_table if mode == "prediction" else None,
+                label_delay_days
+            )
             combined_df = create_time_since_last_tx(combined_df)
         except Exception as fe:
             raise fe
@@ -272,7 +368,11 @@ def generate_features(current_df: pd.DataFrame,
             combined_df["TRANSACTION_ID"].isin(current_df["TRANSACTION_ID"])
         ].copy()
 
-        return current_df
+        if features is not None:
+            planned = {feature.name for feature in plan_features(features)}
+            current_df = current_df.drop(columns=[name for name in feature_columns if name not in planned])
+
+        return apply_schema(current_df)
 
     except Exception as e:
         raise SrcException(e,sys)
\ No newline at end of file
@@ -0,0 +1,285 @@
+"""
+Incremental training features built from cached per-day partitions.
+
+The output is the training matrix of the uncached path (`generate_features` or
+`generate_features_parallel` in training mode over the whole frame), row for row. Most
+features of a transaction only read the rows up to it: the windows, the last amounts,
+TIME_SINCE_LAST_TX and the point-in-time TERMINAL_RISK. Those are cached per day. A
+partition is stored with a fingerprint chained over the raw rows of its day and of every
+day before it, so appending days leaves the earlier partitions valid and a weekly
+retrain computes only the new days; changing a day recomputes it and the days after it.
+
+The days without a valid partition are computed together in one pass, from the first of
+them to the end of the frame, over their rows and the earlier rows they read (`trim_history`
+over everything before that day), then split into partitions. A cold build is therefore
+one pass of the uncached path plus the partition writes, and an append computes only the
+new days and the windows before them.
+
+The remaining features are whole-frame group aggregates in training mode
+(`DATASET_AGGREGATES`: AVG_AMOUNT_CUSTOMER and what derives from it, the monthly counts),
+which also read the rows after a day. They are cheap group reductions, so each build
+computes them over the whole frame rather than caching them.
+"""
+import hashlib
+import json
+import os
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+from src.config import TARGET_COLUMN, TERMINAL_RISK_LABEL_DELAY_DAYS
+from src.exception import SrcException
+from src.feature_engine import plan_features, trim_history
+from src.feature_extractor import feature_columns, generate_features, required_columns
+from src.logger import logging
+from src.rolling_kernels import prior_totals
+from src.schema import COLUMN_DTYPES
+
+# Bump when the feature code changes so every cached partition is recomputed
+FEATURE_VERSION = 4
+
+# Training-mode features aggregated over the whole frame, recomputed on every build
+DATASET_AGGREGATES = ["AVG_AMOUNT_CUSTOMER", "IS_TX_5X_AVG", "TX_OVER_CUSTOMER_AVG",
+                      "CUSTOMER_TX_COUNT_MONTH", "TERMINAL_TX_COUNT_MONTH"]
+
+# Features that only read the rows up to the transaction, cached per day
+CACHED_FEATURES = [name for name in feature_columns if name not in DATASET_AGGREGATES]
+
+# Cached features computed by the engine on the day's trimmed history; TERMINAL_RISK reads
+# every earlier label of the day's terminals and is computed from label totals instead
+WINDOW_FEATURES = [name for name in CACHED_FEATURES if name != "TERMINAL_RISK"]
+
+MANIFEST_FILE = "manifest.json"
+
+
+class DailyFeaturePartitions:
+    """
+    Per-day feature partitions cached in `cache_dir` as `YYYY-MM-DD.pkl`, with a
+    `manifest.json` of the fingerprint each partition was built from.
+    """
+
+    def __init__(self, cache_dir: str, required_columns: list = required_columns,
+                 label_delay_days: float = TERMINAL_RISK_LABEL_DELAY_DAYS):
+        self.cache_dir = cache_dir
+        self.required_columns = required_columns
+        self.label_delay_days = label_delay_days
+        self.computed_days = []
+        self.reused_days = []
+
+    def _manifest_path(self) -> str:
+        return os.path.join(self.cache_dir, MANIFEST_FILE)
+
+    def _partition_path(self, day: pd.Timestamp) -> str:
+        return os.path.join(self.cache_dir, f"{day:%Y-%m-%d}.pkl")
+
+    def _load_manifest(self) -> dict:
+        if not os.path.exists(self._manifest_path()):
+            return {}
+        with open(self._manifest_path()) as manifest_file:
+            return json.load(manifest_file)
+
+    def _save_manifest(self, manifest: dict) -> None:
+        temporary_path = self._manifest_path() + ".tmp"
+        with open(temporary_path, "w") as manifest_file:
+            json.dump(manifest, manifest_file, indent=2, sort_keys=True)
+        os.replace(temporary_path, self._manifest_path())
+
+    @staticmethod
+    def _day_hashes(df: pd.DataFrame, day_bounds: dict) -> dict:
+        """Order-independent content hash of each day's raw rows."""
+        row_hashes = pd.util.hash_pandas_object(df, index=False).to_numpy()
+        return {
+            day: hashlib.sha256(np.sort(row_hashes[start:end]).tobytes()).hexdigest()
+            for day, (start, end) in day_bounds.items()
+        }
+
+    def _fingerprint(self, previous: str, day: pd.Timestamp, day_hash: str) -> str:
+        """
+        Hash of the feature code version, the partition's columns, the label delay, the
+        previous day's fingerprint and the day's raw rows.
+        """
+        settings = [FEATURE_VERSION, self.required_columns, CACHED_FEATURES, self.label_delay_days]
+        digest = hashlib.sha256(json.dumps(settings).encode())
+        digest.update(f"|{previous}|{day:%Y-%m-%d}:{day_hash}".encode())
+        return digest.hexdigest()
+
+    def _terminal_risk(self, df: pd.DataFrame, bounds: tuple) -> np.ndarray:
+        """
+        TERMINAL_RISK of the rows in `bounds` as `terminal_risk` computes it over the whole
+        frame: the per-terminal label totals of the rows before their first time minus the
+        delay, plus the later labels that precede each row by the delay.
+        """
+        start, end = bounds
+        delay = pd.Timedelta(days=self.label_delay_days).value
+        ns = df["TX_DATETIME"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        terminal_ids = df["TERMINAL_ID"].to_numpy()
+        labels = df[TARGET_COLUMN].to_numpy(dtype=np.float64)
+        split = np.searchsorted(ns, ns[start] - delay)
+
+        sums, counts = prior_totals(terminal_ids[split:end], ns[split:end], labels[split:end],
+                                    terminal_ids[start:end], ns[start:end] - delay)
+        earlier = pd.Series(labels[:split]).groupby(terminal_ids[:split]).agg(["sum", "count"])
+        earlier = earlier.reindex(terminal_ids[start:end], fill_value=0)
+        sums = sums + earlier["sum"].to_numpy()
+        counts = counts + earlier["count"].to_numpy()
+        return np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
+
+    @staticmethod
+    def _customer_rows(df: pd.DataFrame) -> tuple:
+        """(customer code of each row, packed (customer code, row) keys in order, their rows)."""
+        codes = pd.factorize(df["CUSTOMER_ID"])[0].astype(np.int64)
+        rows = np.argsort(codes, kind="stable")
+        return codes, codes[rows] * (len(df) + 1) + rows, rows
+
+    @staticmethod
+    def _history_rows(df: pd.DataFrame, bounds: tuple, customer_rows: tuple, plan: list):
+        """
+        Rows of the time-sorted `df` before `bounds` that `trim_history` can keep for the
+        features of `plan`: the longest window before them, their customers' last n rows
+        and every row at the time of one of those. None when the plan reads further.
+        """
+        start, end = bounds
+        specs = {spec for feature in plan for spec in feature.history}
+        if any(spec[1] not in ("window", "last") or spec[1] == "last" and spec[0] != "customer" for spec in specs):
+            return None
+        ns = df["TX_DATETIME"].to_numpy(dtype="datetime64[ns]").view(np.int64)
+        window = max((spec[2] for spec in specs if spec[1] == "window"), default=0)
+        selected = np.arange(np.searchsorted(ns, ns[start] - window), start)
+
+        last = max((spec[2] for spec in specs if spec[1] == "last"), default=0)
+        if last:
+            codes, keys, rows = customer_rows
+            current = np.unique(codes[start:end]) * (len(df) + 1)
+            group_start = np.searchsorted(keys, current)
+            before = np.searchsorted(keys, current + start)
+            nth = np.maximum(before - last, group_start)
+            last_rows = rows[np.concatenate([np.arange(lo, hi) for lo, hi in zip(nth, before)] + [np.empty(0, np.int64)])]
+            # Rows at the same time stay together, so the tie ranks are unchanged
+            tied = np.unique(ns[last_rows])
+            lo, hi = np.searchsorted(ns, tied, side="left"), np.searchsorted(ns, tied, side="right")
+            selected = np.union1d(selected, np.concatenate([np.arange(l, h) for l, h in zip(lo, hi)] + [selected[:0]]))
+        return selected
+
+    def _compute_rows(self, df: pd.DataFrame, bounds: tuple, customer_rows: tuple) -> pd.DataFrame:
+        """
+        Cached features of the rows in `bounds`, in their order, from them and the earlier
+        rows they read.
+        """
+        start, end = bounds
+        current_df = df.iloc[start:end]
+        plan = plan_features(WINDOW_FEATURES)
+        rows = self._history_rows(df, bounds, customer_rows, plan)
+        past_df = df.iloc[:start] if rows is None else df.iloc[rows]
+        history = trim_history(past_df, current_df, plan) if len(past_df) else past_df
+
+        features = generate_features(
+            current_df=pd.concat([history, current_df]),
+            required_columns=self.required_columns,
+            mode="training",
+            features=WINDOW_FEATURES,
+            label_delay_days=self.label_delay_days
+        )
+        # In the rows' (time) order, so every day is a contiguous slice
+        features = features.set_index("TRANSACTION_ID").reindex(current_df["TRANSACTION_ID"]).reset_index()
+        features["TERMINAL_RISK"] = self._terminal_risk(df, bounds).astype(COLUMN_DTYPES["TERMINAL_RISK"])
+        return features[["TRANSACTION_ID"] + CACHED_FEATURES]
+
+    def _write_partitions(self, computed: pd.DataFrame, day_bounds: dict, first_missing: pd.Timestamp,
+                          fingerprints: dict, manifest: dict) -> list:
+        """
+        Split `computed` (the cached features of the rows from `first_missing` on, in time
+        order) into day partitions, store them with their fingerprints and return them.
+        """
+        offset = day_bounds[first_missing][0]
+        partitions = []
+        for day, (start, end) in day_bounds.items():
+            if day < first_missing:
+                continue
+            key = f"{day:%Y-%m-%d}"
+            partition = computed.iloc[start - offset:end - offset].reset_index(drop=True)
+            partition.to_pickle(self._partition_path(day))
+            manifest[key] = fingerprints[day]
+            partitions.append(partition)
+            self.computed_days.append(key)
+        self._save_manifest(manifest)
+        return partitions
+
+    def build(self, df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Features of every day in `df` (raw transactions with `required_columns`, unique
+        TRANSACTION_IDs), reusing the cached partitions whose days and earlier days are
+        unchanged. Returns the rows, columns and index of the uncached training features.
+        """
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            start_time = time.perf_counter()
+
+            df = df[self.required_columns].copy()
+            df["TX_DATETIME"] = pd.to_datetime(df["TX_DATETIME"])
+            # Stable, so rows with the same time keep their input order as in the uncached path
+            df = df.sort_values("TX_DATETIME", kind="stable").reset_index(drop=True)
+
+            days = df["TX_DATETIME"].dt.normalize()
+            first_rows = np.flatnonzero(np.r_[True, days.to_numpy()[1:] != days.to_numpy()[:-1]])
+            day_bounds = {
+                days.iloc[start]: (start, end)
+                for start, end in zip(first_rows, np.r_[first_rows[1:], len(df)])
+            }
+            day_hashes = self._day_hashes(df, day_bounds)
+            customer_rows = self._customer_rows(df)
+
+            manifest = self._load_manifest()
+            fingerprints, fingerprint = {}, ""
+            for day in day_bounds:
+                fingerprint = fingerprints[day] = self._fingerprint(fingerprint, day, day_hashes[day])
+            missing = [day for day in day_bounds
+                       if manifest.get(f"{day:%Y-%m-%d}") != fingerprints[day] or not os.path.exists(self._partition_path(day))]
+
+            self.computed_days, self.reused_days = [], []
+            partitions = []
+            # Every day from the first missing one is computed in one pass; a missing day
+            # invalidates the fingerprints of all later days anyway
+            first_missing = missing[0] if missing else None
+            for day in day_bounds:
+                if first_missing is not None and day >= first_missing:
+                    break
+                partitions.append(pd.read_pickle(self._partition_path(day)))
+                self.reused_days.append(f"{day:%Y-%m-%d}")
+
+            if first_missing is not None and not partitions:
+                # Nothing to reuse: the uncached computation, whose cached columns are kept
+                features = generate_features(
+                    current_df=df,
+                    required_columns=self.required_columns,
+                    mode="training",
+                    label_delay_days=self.label_delay_days
+                )
+                positions = pd.Index(features["TRANSACTION_ID"]).get_indexer(df["TRANSACTION_ID"])
+                computed = features[["TRANSACTION_ID"] + CACHED_FEATURES].iloc[positions].reset_index(drop=True)
+                self._write_partitions(computed, day_bounds, first_missing, fingerprints, manifest)
+            else:
+                if first_missing is not None:
+                    computed = self._compute_rows(df, (day_bounds[first_missing][0], len(df)), customer_rows)
+                    partitions += self._write_partitions(computed, day_bounds, first_missing, fingerprints, manifest)
+
+                features = generate_features(
+                    current_df=df,
+                    required_columns=self.required_columns,
+                    mode="training",
+                    features=DATASET_AGGREGATES,
+                    label_delay_days=self.label_delay_days
+                )
+                cached = pd.concat(partitions, ignore_index=True)
+                # One indexer places the partitions' time-ordered rows in the output's order
+                positions = pd.Index(cached["TRANSACTION_ID"]).get_indexer(features["TRANSACTION_ID"])
+                for name in CACHED_FEATURES:
+                    features[name] = cached[name].to_numpy()[positions]
+
+            logging.info(f"Daily feature partitions: {len(self.computed_days)} computed, "
+                         f"{len(self.reused_days)} reused in {time.perf_counter() - start_time:.1f}s")
+            return features[self.required_columns + feature_columns]
+
+        except Exception as e:
+            raise SrcException(e, sys)
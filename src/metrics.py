@@ -0,0 +1,262 @@
+import glob
+import json
+import math
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from typing import Dict, Optional
+
+import numpy as np
+
+# Geometric latency buckets from 0.1 ms to ~60 s (25% apart) keep quantile error small
+LATENCY_BUCKETS = tuple(round(0.0001 * 1.25 ** i, 7) for i in range(61))
+# Row-count buckets: 0, 1, 2, 4, ... ~1M
+ROW_COUNT_BUCKETS = (0,) + tuple(2 ** i for i in range(21))
+
+QUANTILES = (0.5, 0.95, 0.99)
+
+_LABEL_VALUE = re.compile(r"^[A-Za-z0-9_.]+$")
+
+
+def _file_stem(name: str, labels: Dict[str, str]) -> str:
+    for value in labels.values():
+        if not _LABEL_VALUE.match(value):
+            raise ValueError(f"Metric label values must match {_LABEL_VALUE.pattern}: {value!r}")
+    return f"{name}__{','.join(f'{key}={value}' for key, value in sorted(labels.items()))}"
+
+
+def _parse_file_stem(stem: str):
+    name, label_part = stem.split("__", 1)
+    labels = dict(pair.split("=", 1) for pair in label_part.split(",") if pair)
+    return name, labels
+
+
+class _Series:
+    """
+    Float64 slots of one metric series for the current process.
+
+    With a metrics directory the slots live in a per-process memory-mapped file, so other
+    workers can aggregate them without any IPC on the hot path; otherwise in plain memory.
+    """
+
+    def __init__(self, name: str, labels: Dict[str, str], size: int, directory: Optional[str]):
+        self.name = name
+        self.labels = labels
+        self.size = size
+        self.directory = directory
+        self.lock = threading.Lock()
+        self._pid = None
+        self._values = None
+
+    @property
+    def values(self) -> np.ndarray:
+        # Re-open after fork so each worker writes to its own file
+        if self._pid != os.getpid():
+            self._pid = os.getpid()
+            if self.directory:
+                os.makedirs(self.directory, exist_ok=True)
+                path = os.path.join(self.directory, f"{_file_stem(self.name, self.labels)}__{self._pid}.bin")
+                self._values = np.memmap(path, dtype=np.float64, mode="w+", shape=(self.size,))
+            else:
+                self._values = np.zeros(self.size, dtype=np.float64)
+        return self._values
+
+
+class Counter:
+    def __init__(self, series: _Series):
+        self._series = series
+
+    def inc(self, amount: float = 1.0) -> None:
+        with self._series.lock:
+            self._series.values[0] += amount
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. Slots are the per-bucket counts (last one is +Inf) followed by the sum.
+    """
+
+    def __init__(self, series: _Series, buckets: tuple):
+        self._series = series
+        self.buckets = buckets
+
+    def observe(self, value: float) -> None:
+        index = bisect_left(self.buckets, value)
+        with self._series.lock:
+            values = self._series.values
+            values[index] += 1
+            values[-1] += value
+
+    def time(self) -> "_Timer":
+        """Context manager that observes the elapsed monotonic time in seconds."""
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("histogram", "start")
+
+    def __init__(self, histogram: Histogram):
+        self.histogram = histogram
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram.observe(time.perf_counter() - self.start)
+        return False
+
+
+def _format_value(value: float) -> str:
+    value = float(value)
+    if math.isnan(value):
+        return "NaN"
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def bucket_quantile(quantile: float, buckets: tuple, counts: np.ndarray) -> float:
+    """
+    Estimates a quantile from cumulative bucket counts by linear interpolation inside the
+    bucket, as Prometheus' histogram_quantile does.
+    """
+    total = counts.sum()
+    if total == 0:
+        return math.nan
+    rank = quantile * total
+    cumulative = np.cumsum(counts)
+    index = int(np.searchsorted(cumulative, rank))
+    if index >= len(buckets):
+        return float(buckets[-1])
+    lower = buckets[index - 1] if index > 0 else 0.0
+    below = cumulative[index - 1] if index > 0 else 0.0
+    in_bucket = counts[index]
+    return float(lower + (buckets[index] - lower) * ((rank - below) / in_bucket if in_bucket else 0.0))
+
+
+class MetricsRegistry:
+    """
+    In-process counters and histograms with Prometheus text exposition.
+
+    Set `directory` (METRICS_DIR) when serving with several gunicorn workers: every worker
+    then keeps its series in memory-mapped files there and `render` sums the files of all
+    workers, so any worker can answer /metrics for the whole service. The kind, buckets
+    and help of each metric are written next to them (`<name>.json`), so a worker also
+    renders the metrics only other workers have created.
+    """
+
+    def __init__(self, directory: Optional[str] = None, prefix: str = "fraud"):
+        self.directory = directory
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._series = {}
+        self._kinds = {}
+        self._help = {}
+
+    def _get(self, kind: str, name: str, labels: Dict[str, str], size: int, help_text: str, buckets=None):
+        key = (name, tuple(sorted(labels.items())))
+        metric = self._series.get(key)
+        if metric is None:
+            with self._lock:
+                metric = self._series.get(key)
+                if metric is None:
+                    series = _Series(f"{self.prefix}_{name}", labels, size, self.directory)
+                    metric = Counter(series) if kind == "counter" else Histogram(series, buckets)
+                    self._series[key] = metric
+                    if f"{self.prefix}_{name}" not in self._kinds:
+                        self._kinds[f"{self.prefix}_{name}"] = (kind, buckets)
+                        self._help[f"{self.prefix}_{name}"] = help_text
+                        self._write_metadata(f"{self.prefix}_{name}", kind, buckets, help_text)
+        return metric
+
+    def _write_metadata(self, name: str, kind: str, buckets, help_text: str) -> None:
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, f"{name}.json")
+        temporary_path = f"{path}.{os.getpid()}.tmp"
+        with open(temporary_path, "w") as metadata_file:
+            json.dump({"kind": kind, "buckets": buckets, "help": help_text}, metadata_file)
+        os.replace(temporary_path, path)
+
+    def _metadata(self) -> dict:
+        """(kind, buckets, help) of this process's metrics and of those other workers registered."""
+        metadata = {name: (kind, buckets, self._help[name]) for name, (kind, buckets) in self._kinds.items()}
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, "*.json")):
+                name = os.path.basename(path)[:-len(".json")]
+                if name in metadata:
+                    continue
+                try:
+                    with open(path) as metadata_file:
+                        saved = json.load(metadata_file)
+                except (OSError, ValueError):
+                    continue
+                buckets = tuple(saved["buckets"]) if saved["buckets"] is not None else None
+                metadata[name] = (saved["kind"], buckets, saved["help"])
+        return metadata
+
+    def counter(self, name: str, help_text: str = "", **labels) -> Counter:
+        return self._get("counter", name, {k: str(v) for k, v in labels.items()}, 1, help_text)
+
+    def histogram(self, name: str, buckets: tuple = LATENCY_BUCKETS, help_text: str = "", **labels) -> Histogram:
+        return self._get("histogram", name, {k: str(v) for k, v in labels.items()},
+                         len(buckets) + 2, help_text, buckets)
+
+    def _collect(self, metadata: dict) -> dict:
+        """Sum the series of the `metadata` metrics over all processes writing to the metrics directory."""
+        totals = {}
+        if self.directory:
+            for path in glob.glob(os.path.join(self.directory, "*.bin")):
+                stem = os.path.basename(path)[:-len(".bin")].rsplit("__", 1)[0]
+                name, labels = _parse_file_stem(stem)
+                if name not in metadata:
+                    continue
+                try:
+                    values = np.fromfile(path, dtype=np.float64)
+                except OSError:
+                    continue
+                key = (name, tuple(sorted(labels.items())))
+                totals[key] = totals[key] + values if key in totals and len(totals[key]) == len(values) else values
+        else:
+            for metric in list(self._series.values()):
+                series = metric._series
+                totals[(series.name, tuple(sorted(series.labels.items())))] = np.array(series.values)
+        return totals
+
+    def render(self) -> str:
+        """Prometheus text exposition format (version 0.0.4)."""
+        metadata = self._metadata()
+        totals = self._collect(metadata)
+        lines = []
+        for name in sorted(metadata):
+            kind, buckets, help_text = metadata[name]
+            series = sorted((labels, values) for (metric, labels), values in totals.items() if metric == name)
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+            for labels, values in series:
+                label_text = ",".join(f'{key}="{value}"' for key, value in labels)
+                if kind == "counter":
+                    lines.append(f"{name}{{{label_text}}} {_format_value(values[0])}")
+                    continue
+                counts = values[:-1]
+                cumulative = np.cumsum(counts)
+                sep = "," if label_text else ""
+                for bound, count in zip(buckets, cumulative):
+                    lines.append(f'{name}_bucket{{{label_text}{sep}le="{_format_value(bound)}"}} {_format_value(count)}')
+                lines.append(f'{name}_bucket{{{label_text}{sep}le="+Inf"}} {_format_value(cumulative[-1])}')
+                lines.append(f"{name}_sum{{{label_text}}} {_format_value(values[-1])}")
+                lines.append(f"{name}_count{{{label_text}}} {_format_value(cumulative[-1])}")
+
+            if kind == "histogram" and series:
+                # Precomputed quantiles for dashboards that do not run histogram_quantile
+                lines.append(f"# HELP {name}_quantile Estimated quantiles of {name}")
+                lines.append(f"# TYPE {name}_quantile gauge")
+                for labels, values in series:
+                    label_text = "".join(f'{key}="{value}",' for key, value in labels)
+                    for quantile in QUANTILES:
+                        estimate = bucket_quantile(quantile, buckets, values[:-1])
+                        lines.append(f'{name}_quantile{{{label_text}quantile="{quantile}"}} {_format_value(estimate)}')
+        return "\n".join(lines) + "\n"
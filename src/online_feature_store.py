@@ -0,0 +1,434 @@
+import bisect
+import sys
+import threading
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+from src.collection_tail import CollectionTail
+from src.config import mongo_client, TARGET_COLUMN, TERMINAL_RISK_LABEL_DELAY_DAYS
+from src.exception import SrcException
+from src.logger import logging
+from src.schema import apply_schema
+from src.utils import read_from_files
+from src.feature_extractor import (
+    required_columns,
+    feature_columns,
+    add_weekday_features,
+    create_is_night_tx,
+    create_is_weekend_tx,
+    create_is_tx_amount_high,
+    create_tx_month,
+    create_weekend_night_flag,
+)
+
+NANOSECONDS_PER_DAY = 86_400 * 10**9
+
+
+def month_key(ts):
+    """Key of the monthly counts: year and month, so the same month of another year is not counted."""
+    return ts.year * 12 + ts.month
+
+
+class _TimeWindow:
+    """
+    Sorted transaction timestamps (in ns) of a single entity, trimmed to the
+    longest rolling window so memory stays proportional to recent activity.
+    """
+    __slots__ = ("times", "head")
+
+    def __init__(self, times=None):
+        self.times = list(times) if times is not None else []
+        self.head = 0
+
+    def append(self, ts: int, horizon: int) -> None:
+        if self.times and ts < self.times[-1]:
+            bisect.insort(self.times, ts, lo=self.head)
+        else:
+            self.times.append(ts)
+        self._evict(horizon)
+
+    def extend(self, times, horizon: int) -> None:
+        """Append sorted timestamps; if they start before the newest one held, insert them one by one."""
+        if self.times and times[0] < self.times[-1]:
+            for ts in times:
+                self.append(ts, horizon)
+            return
+        self.times.extend(times)
+        self._evict(horizon)
+
+    def _evict(self, horizon: int) -> None:
+        # Evict everything that can no longer fall inside the longest window
+        newest = self.times[-1]
+        while self.head < len(self.times) and self.times[self.head] <= newest - horizon:
+            self.head += 1
+
+        # Compact occasionally so the evicted prefix does not grow forever
+        if self.head > 64 and self.head * 2 > len(self.times):
+            del self.times[:self.head]
+            self.head = 0
+
+    def count(self, start: int, end: int) -> int:
+        """Number of timestamps in the half-open interval (start, end]."""
+        lo = bisect.bisect_right(self.times, start, self.head)
+        hi = bisect.bisect_right(self.times, end, self.head)
+        return hi - lo
+
+
+class CustomerState:
+    """Incremental per-customer aggregates."""
+    __slots__ = ("window", "last_amounts", "amount_sum", "tx_count", "month_counts", "last_tx_time")
+
+    def __init__(self):
+        self.window = _TimeWindow()
+        # (TX_TIME, amount) of the last `amount_window` transactions, in time order
+        self.last_amounts = []
+        self.amount_sum = 0.0
+        self.tx_count = 0
+        self.month_counts = Counter()
+        self.last_tx_time = None
+
+
+class TerminalState:
+    """Incremental per-terminal aggregates."""
+    __slots__ = ("window", "fraud_sum", "labeled_count", "pending", "month_counts")
+
+    def __init__(self):
+        self.window = _TimeWindow()
+        # Labels past the delay of the terminal's newest transaction, which count for any later one
+        self.fraud_sum = 0.0
+        self.labeled_count = 0
+        # (TX_TIME, label) of the more recent labeled transactions, in time order
+        self.pending = []
+        self.month_counts = Counter()
+
+    def mature(self, limit: int) -> None:
+        """Move the pending labels of transactions before `limit` into the sums."""
+        matured = bisect.bisect_left(self.pending, (limit,))
+        for _, fraud in self.pending[:matured]:
+            self.fraud_sum += fraud
+            self.labeled_count += 1
+        del self.pending[:matured]
+
+    def risk(self, before: int) -> float:
+        """Fraud rate over the labels of the transactions before `before`."""
+        counted = bisect.bisect_left(self.pending, (before,))
+        labeled_count = self.labeled_count + counted
+        if not labeled_count:
+            return 0
+        return (self.fraud_sum + sum(fraud for _, fraud in self.pending[:counted])) / labeled_count
+
+
+class OnlineFeatureStore:
+    """
+    In-process feature store that keeps rolling state per CUSTOMER_ID and TERMINAL_ID,
+    so a transaction can be scored without querying its history from MongoDB.
+
+    Every historical transaction is folded into the state in O(1) (amortised), and
+    `get_features` returns the same columns and values as
+    `generate_features(current_df, past_df, mode="prediction")` would for a single
+    transaction whose `past_df` is the history seen by the store:
+
+    - CUSTOMER_TX_COUNT_7D / TERMINAL_TX_COUNT_7D / ROLLING_TX_COUNT_1D: transactions in (t - window, t]
+    - CUSTOMER_AVG_AMOUNT_7D / CUSTOMER_MAX_AMOUNT_7D: last `amount_window` customer transactions
+    - AVG_AMOUNT_CUSTOMER: mean of all customer transactions
+    - CUSTOMER_TX_COUNT_MONTH / TERMINAL_TX_COUNT_MONTH: transactions in the same year and month
+    - TERMINAL_RISK: mean TX_FRAUD of the terminal's labeled transactions at least `label_delay_days` older
+    - TIME_SINCE_LAST_TX: seconds since the customer's previous transaction
+
+    The store is warmed from the collection in typed batches (`warm_from_collection`) and
+    kept current by `refresh()`, which folds the documents added since through `update()`;
+    `start_refresher()` repeats it on a schedule. New documents are found by a
+    `CollectionTail`, so each is folded once, late arrivals included. History must precede
+    the transactions being scored. Transactions within a scored batch are scored
+    independently of each other.
+    """
+
+    def __init__(self, window_days: int = 7, amount_window: int = 7,
+                 label_delay_days: float = TERMINAL_RISK_LABEL_DELAY_DAYS):
+        self.window_days = window_days
+        self.amount_window = amount_window
+        self.label_delay = pd.Timedelta(days=label_delay_days).value
+        self.horizon = window_days * NANOSECONDS_PER_DAY
+        self.customers = {}
+        self.terminals = {}
+        self._lock = threading.RLock()
+        self._tail = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return sum(state.tx_count for state in self.customers.values())
+
+    def update(self, transaction: dict) -> None:
+        """
+        Fold one labeled historical transaction into the per-customer and per-terminal
+        state. It may be older than transactions already folded.
+        """
+        try:
+            ts = pd.Timestamp(transaction["TX_DATETIME"])
+            tx_time, tx_month = ts.value, month_key(ts)
+            amount = float(np.float32(transaction["TX_AMOUNT"]))  # the schema's float32 amount
+            fraud = transaction.get(TARGET_COLUMN)
+
+            with self._lock:
+                customer = self.customers.get(int(transaction["CUSTOMER_ID"]))
+                if customer is None:
+                    customer = CustomerState()
+                    self.customers[int(transaction["CUSTOMER_ID"])] = customer
+                customer.window.append(tx_time, self.horizon)
+                bisect.insort(customer.last_amounts, (tx_time, amount), key=lambda entry: entry[0])
+                del customer.last_amounts[:-self.amount_window]
+                customer.amount_sum += amount
+                customer.tx_count += 1
+                customer.month_counts[tx_month] += 1
+                if customer.last_tx_time is None or tx_time > customer.last_tx_time:
+                    customer.last_tx_time = tx_time
+
+                terminal = self.terminals.get(int(transaction["TERMINAL_ID"]))
+                if terminal is None:
+                    terminal = TerminalState()
+                    self.terminals[int(transaction["TERMINAL_ID"])] = terminal
+                terminal.window.append(tx_time, self.horizon)
+                terminal.month_counts[tx_month] += 1
+                if fraud is not None and not pd.isna(fraud):
+                    bisect.insort(terminal.pending, (tx_time, float(fraud)))
+                terminal.mature(terminal.window.times[-1] - self.label_delay)
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def _fold(self, df: pd.DataFrame, customers: dict, terminals: dict) -> None:
+        """
+        Fold a DataFrame of historical transactions into `customers` and `terminals`. Its
+        rows must be at or after every transaction those states already hold.
+        """
+        df = df[[col for col in required_columns if col in df.columns]].copy()
+        df = apply_schema(df)
+        # float32 amounts as in the pipeline, summed in float64 as the feature engine does
+        df["TX_AMOUNT"] = df["TX_AMOUNT"].astype(np.float64)
+        df = df.sort_values("TX_DATETIME", kind="stable")
+        df["TX_TIME"] = df["TX_DATETIME"].values.astype("datetime64[ns]").astype(np.int64)
+        df["MONTH_KEY"] = month_key(df["TX_DATETIME"].dt)
+
+        customer_groups = df.groupby("CUSTOMER_ID", sort=False)
+        customer_stats = customer_groups.agg(
+            amount_sum=("TX_AMOUNT", "sum"),
+            tx_count=("TX_AMOUNT", "size"),
+            last_tx_time=("TX_TIME", "max"),
+        )
+        last_rows = customer_groups.tail(self.amount_window).groupby("CUSTOMER_ID", sort=False)
+        last_times, last_amounts = last_rows["TX_TIME"].agg(list), last_rows["TX_AMOUNT"].agg(list)
+        for customer_id, row in customer_stats.iterrows():
+            state = customers.get(customer_id)
+            if state is None:
+                state = customers[customer_id] = CustomerState()
+            state.amount_sum += float(row["amount_sum"])
+            state.tx_count += int(row["tx_count"])
+            last_tx_time = int(row["last_tx_time"])
+            state.last_tx_time = last_tx_time if state.last_tx_time is None else max(state.last_tx_time, last_tx_time)
+            state.last_amounts.extend(zip(last_times[customer_id], last_amounts[customer_id]))
+            del state.last_amounts[:-self.amount_window]
+        self._fill_windows(df, "CUSTOMER_ID", customers)
+
+        for terminal_id in df["TERMINAL_ID"].unique():
+            if terminal_id not in terminals:
+                terminals[terminal_id] = TerminalState()
+        self._fill_windows(df, "TERMINAL_ID", terminals)
+        if TARGET_COLUMN in df.columns:
+            # Labels past the delay of the terminal's newest transaction are summed, the rest kept pending
+            limits = df.groupby("TERMINAL_ID", sort=False)["TX_TIME"].transform("max").to_numpy() - self.label_delay
+            labeled = df[TARGET_COLUMN].notna().to_numpy()
+            matured = labeled & (df["TX_TIME"].to_numpy() < limits)
+            sums = df[matured].groupby("TERMINAL_ID", sort=False)[TARGET_COLUMN].agg(["sum", "count"])
+            for terminal_id, row in sums.iterrows():
+                terminals[terminal_id].fraud_sum += float(row["sum"])
+                terminals[terminal_id].labeled_count += int(row["count"])
+            for terminal_id, group in df[labeled & ~matured].groupby("TERMINAL_ID", sort=False):
+                terminals[terminal_id].pending.extend(zip(group["TX_TIME"].tolist(),
+                                                          group[TARGET_COLUMN].astype(float).tolist()))
+            for terminal_id in df["TERMINAL_ID"].unique():
+                terminals[terminal_id].mature(terminals[terminal_id].window.times[-1] - self.label_delay)
+
+    def warm_from_dataframe(self, df: pd.DataFrame) -> None:
+        """
+        Replace the store state with the aggregates of a historical transactions DataFrame.
+        """
+        try:
+            customers, terminals = {}, {}
+            self._fold(df, customers, terminals)
+            with self._lock:
+                self.customers = customers
+                self.terminals = terminals
+
+            logging.info(f"Online feature store warmed with {len(df)} transactions: "
+                         f"{len(customers)} customers, {len(terminals)} terminals")
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def _fill_windows(self, df: pd.DataFrame, key: str, states: dict) -> None:
+        """Append the rows' times to the rolling windows and monthly counts of their entity states."""
+        for entity_id, times in df.groupby(key, sort=False)["TX_TIME"].agg(list).items():
+            states[entity_id].window.extend(times, self.horizon)
+        for (entity_id, month), count in df.groupby([key, "MONTH_KEY"], sort=False).size().items():
+            states[entity_id].month_counts[month] += int(count)
+
+    def warm_from_collection(self, database_name: str, collection_name: str = "transactions") -> None:
+        """
+        Warm the store from a MongoDB collection of labeled historical transactions,
+        streamed in typed batches of the required columns, and keep its position for
+        `refresh()`.
+        """
+        try:
+            with self._refresh_lock:
+                self._tail = CollectionTail(mongo_client[database_name][collection_name], required_columns)
+                customers, terminals = {}, {}
+                rows = 0
+                # The tail reads in TX_DATETIME order, so every batch follows the ones folded before it
+                for batch in self._tail.read():
+                    self._fold(batch, customers, terminals)
+                    rows += len(batch)
+                with self._lock:
+                    self.customers = customers
+                    self.terminals = terminals
+
+            logging.info(f"Online feature store warmed with {rows} transactions of {database_name}.{collection_name}: "
+                         f"{len(customers)} customers, {len(terminals)} terminals")
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def refresh(self) -> int:
+        """
+        Fold the transactions added to the collection since the warm or the previous
+        refresh through `update()`. Returns how many were folded.
+        """
+        try:
+            if self._tail is None:
+                raise RuntimeError("`refresh` needs a store warmed by `warm_from_collection`")
+            with self._refresh_lock:
+                added = 0
+                for batch in self._tail.read():
+                    for transaction in batch.to_dict(orient="records"):
+                        self.update(transaction)
+                    added += len(batch)
+            if added:
+                logging.info(f"Online feature store refreshed: {added} transactions added")
+            return added
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Online feature store refresh failed: {e}")
+
+    def start_refresher(self, interval: float = 60.0) -> None:
+        """Refresh the store every `interval` seconds in a daemon thread."""
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="feature-store", daemon=True)
+        self._thread.start()
+
+    def stop_refresher(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+
+    def warm_from_files(self, dir_input: str, begin_date: str, end_date: str) -> None:
+        """
+        Warm the store from the daily pickle files (e.g. `dataset/data/*.pkl`).
+        """
+        try:
+            self.warm_from_dataframe(read_from_files(dir_input, begin_date, end_date))
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def get_features(self, current_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Compute the full feature row of each transaction in `current_df` from the stored state.
+        """
+        if current_df is None or current_df.empty:
+            raise ValueError("`current_df` must be a non-empty DataFrame")
+
+        try:
+            df = current_df.copy()
+            if TARGET_COLUMN not in df.columns:
+                df[TARGET_COLUMN] = 0  # place holder for current prediction
+            df = apply_schema(df)
+
+            # Row-local features reuse the batch pipeline helpers
+            df = add_weekday_features(df)
+            df = create_is_night_tx(df)
+            df = create_is_weekend_tx(df)
+            df = create_is_tx_amount_high(df)
+            df = create_tx_month(df)
+            df = create_weekend_night_flag(df)
+
+            one_day = NANOSECONDS_PER_DAY
+            rows = []
+            with self._lock:
+                for customer_id, terminal_id, amount, ts in zip(
+                    df["CUSTOMER_ID"], df["TERMINAL_ID"], df["TX_AMOUNT"], df["TX_DATETIME"]
+                ):
+                    # Only history strictly before the transaction is visible, as with the cutoff filter
+                    tx_time, tx_month, before = ts.value, month_key(ts), ts.value - 1
+                    customer = self.customers.get(int(customer_id))
+                    terminal = self.terminals.get(int(terminal_id))
+
+                    if customer is not None:
+                        last_amounts = [entry[1] for entry in customer.last_amounts][1 - self.amount_window:] \
+                            if self.amount_window > 1 else []
+                        last_amounts.append(amount)
+                        avg_amount = (customer.amount_sum + amount) / (customer.tx_count + 1)
+                        customer_count_7d = customer.window.count(tx_time - self.horizon, before) + 1
+                        customer_count_1d = customer.window.count(tx_time - one_day, before) + 1
+                        customer_count_month = customer.month_counts[tx_month] + 1
+                        time_since_last = (tx_time - customer.last_tx_time) / 1e9
+                    else:
+                        last_amounts = [amount]
+                        avg_amount = amount
+                        customer_count_7d = customer_count_1d = customer_count_month = 1
+                        time_since_last = 999999
+
+                    if terminal is not None:
+                        terminal_count_7d = terminal.window.count(tx_time - self.horizon, before) + 1
+                        terminal_count_month = terminal.month_counts[tx_month] + 1
+                        terminal_risk = terminal.risk(tx_time - self.label_delay)
+                    else:
+                        terminal_count_7d = terminal_count_month = 1
+                        terminal_risk = 0
+
+                    rows.append((
+                        sum(last_amounts) / len(last_amounts), max(last_amounts), avg_amount,
+                        customer_count_7d, terminal_count_7d, customer_count_month, terminal_count_month,
+                        customer_count_1d, terminal_risk, time_since_last,
+                    ))
+
+            state_features = pd.DataFrame(rows, index=df.index, columns=[
+                "CUSTOMER_AVG_AMOUNT_7D", "CUSTOMER_MAX_AMOUNT_7D", "AVG_AMOUNT_CUSTOMER",
+                "CUSTOMER_TX_COUNT_7D", "TERMINAL_TX_COUNT_7D", "CUSTOMER_TX_COUNT_MONTH",
+                "TERMINAL_TX_COUNT_MONTH", "ROLLING_TX_COUNT_1D", "TERMINAL_RISK", "TIME_SINCE_LAST_TX",
+            ])
+            df = df.join(state_features)
+
+            # Derived features, same expressions as the batch pipeline
+            df["IS_TX_5X_AVG"] = (df["TX_AMOUNT"] > (5 * df["AVG_AMOUNT_CUSTOMER"])).astype(int)
+            df["TX_OVER_CUSTOMER_AVG"] = df["TX_AMOUNT"] / (df["AVG_AMOUNT_CUSTOMER"] + 1e-5)
+            df["TX_OVER_MAX_LAST_7D"] = df["TX_AMOUNT"] / (df["CUSTOMER_MAX_AMOUNT_7D"] + 1e-5)
+            for col in ["CUSTOMER_TX_COUNT_7D", "TERMINAL_TX_COUNT_7D", "ROLLING_TX_COUNT_1D",
+                        "TERMINAL_RISK", "TIME_SINCE_LAST_TX"]:
+                df[col] = df[col].astype(float)
+
+            return apply_schema(df)[required_columns + feature_columns]
+
+        except Exception as e:
+            raise SrcException(e, sys)
@@ -0,0 +1,154 @@
+"""
+Local copy of the transactions collection, synced incrementally into daily partitions.
+
+The store is a directory of `YYYY-MM-DD/part-NNNNNN.parquet` files, one directory per
+TX_DATETIME day, and a `_watermark.json` with the largest (TX_DATETIME, TRANSACTION_ID)
+fetched so far. `sync` only queries the documents after the watermark, streams them in
+typed batches (`iter_collection_batches`) and appends each day's rows to a new part file
+in that day's directory, so a weekly run transfers the week's documents instead of the
+whole collection. The whole directory reads as one Parquet dataset (`read`, or
+`pd.read_parquet(store_dir)`), the union of every partition.
+
+Part files are written under a hidden temporary name and renamed once the batch stream
+is complete, and the watermark is saved last: after a failed sync the next one fetches
+the same documents again into the same part numbers, replacing anything renamed before
+the failure. Documents inserted later with a
+TX_DATETIME at or before the watermark are not picked up; transactions are expected to
+arrive in time order, as the collection is loaded.
+"""
+import glob
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from src.collection_export import RANGE_KEY_INDEXES, arrow_schema
+from src.config import INGESTION_BATCH_SIZE, TX_DATETIME_FORMAT
+from src.exception import SrcException
+from src.logger import logging
+from src.schema import RAW_COLUMNS, apply_schema, parquet_schema
+from src.utils import iter_collection_batches
+
+WATERMARK_FILE = "_watermark.json"
+
+
+class PartitionedTransactionStore:
+    """
+    Date-partitioned Parquet copy of a transactions collection in `store_dir`, kept up
+    to date by `sync`.
+    """
+
+    def __init__(self, store_dir: str, columns: list = RAW_COLUMNS):
+        self.store_dir = store_dir
+        self.columns = columns
+
+    def _watermark_path(self) -> str:
+        return os.path.join(self.store_dir, WATERMARK_FILE)
+
+    def load_watermark(self) -> dict:
+        """The last synced `{"TX_DATETIME", "TRANSACTION_ID", "syncs"}`, or None for an empty store."""
+        if not os.path.exists(self._watermark_path()):
+            return None
+        with open(self._watermark_path()) as watermark_file:
+            return json.load(watermark_file)
+
+    def _save_watermark(self, watermark: dict) -> None:
+        temporary_path = self._watermark_path() + ".tmp"
+        with open(temporary_path, "w") as watermark_file:
+            json.dump(watermark, watermark_file, indent=2)
+        os.replace(temporary_path, self._watermark_path())
+
+    @staticmethod
+    def watermark_query(watermark: dict) -> dict:
+        """Documents strictly after the watermark, in (TX_DATETIME, TRANSACTION_ID) order."""
+        if watermark is None:
+            return {}
+        return {"$or": [
+            {"TX_DATETIME": {"$gt": watermark["TX_DATETIME"]}},
+            {"TX_DATETIME": watermark["TX_DATETIME"], "TRANSACTION_ID": {"$gt": watermark["TRANSACTION_ID"]}},
+        ]}
+
+    def partitions(self, begin_date=None, end_date=None) -> list:
+        """Part files of the days from `begin_date` to `end_date` (inclusive), in day order."""
+        files = []
+        for day_dir in sorted(glob.glob(os.path.join(self.store_dir, "????-??-??"))):
+            day = os.path.basename(day_dir)
+            if (begin_date is None or day >= f"{pd.Timestamp(begin_date):%Y-%m-%d}") and \
+                    (end_date is None or day <= f"{pd.Timestamp(end_date):%Y-%m-%d}"):
+                files.extend(sorted(glob.glob(os.path.join(day_dir, "part-*.parquet"))))
+        return files
+
+    def read(self, begin_date=None, end_date=None, columns: list = None) -> pd.DataFrame:
+        """The union of the partitions from `begin_date` to `end_date` with the schema's dtypes."""
+        try:
+            files = self.partitions(begin_date, end_date)
+            if not files:
+                return apply_schema(pd.DataFrame(columns=columns or self.columns))
+            return apply_schema(pq.read_table(files, columns=columns, schema=parquet_schema(files)).to_pandas())
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def sync(self, collection, batch_size: int = INGESTION_BATCH_SIZE) -> dict:
+        """
+        Append the documents of `collection` after the watermark to the daily partitions
+        and advance the watermark. Returns the rows fetched, the days written and the new
+        watermark.
+        """
+        writers = {}
+        try:
+            os.makedirs(self.store_dir, exist_ok=True)
+            start = time.perf_counter()
+            # Leftovers of a failed sync, whose documents are fetched again
+            for leftover in glob.glob(os.path.join(self.store_dir, "????-??-??", ".part-*.tmp")):
+                os.remove(leftover)
+
+            # The incremental query is a range read on this index
+            collection.create_index(RANGE_KEY_INDEXES["TX_DATETIME"])
+
+            watermark = self.load_watermark()
+            part = (watermark or {}).get("syncs", 0) + 1
+            schema = arrow_schema(self.columns)
+            rows, latest = 0, None
+            for batch in iter_collection_batches(collection, self.watermark_query(watermark),
+                                                 self.columns, batch_size):
+                days = batch["TX_DATETIME"].dt.strftime("%Y-%m-%d")
+                for day, day_rows in batch.groupby(days, sort=False):
+                    if day not in writers:
+                        day_dir = os.path.join(self.store_dir, day)
+                        os.makedirs(day_dir, exist_ok=True)
+                        writers[day] = pq.ParquetWriter(os.path.join(day_dir, f".part-{part:06d}.tmp"), schema)
+                    writers[day].write_table(pa.Table.from_pandas(day_rows, schema=schema, preserve_index=False))
+
+                last = batch.sort_values(["TX_DATETIME", "TRANSACTION_ID"]).iloc[-1]
+                key = (last["TX_DATETIME"], int(last["TRANSACTION_ID"]))
+                latest = key if latest is None or key > latest else latest
+                rows += len(batch)
+
+            days = sorted(writers)
+            for day in days:
+                writers.pop(day).close()
+                day_dir = os.path.join(self.store_dir, day)
+                os.replace(os.path.join(day_dir, f".part-{part:06d}.tmp"),
+                           os.path.join(day_dir, f"part-{part:06d}.parquet"))
+
+            if latest is not None:
+                watermark = {
+                    "TX_DATETIME": latest[0].strftime(TX_DATETIME_FORMAT),
+                    "TRANSACTION_ID": latest[1],
+                    "syncs": part,
+                }
+                self._save_watermark(watermark)
+
+            logging.info(f"Synced {rows} documents into {len(days)} daily partitions of {self.store_dir} "
+                         f"in {time.perf_counter() - start:.1f}s; watermark {watermark}")
+            return {"rows": rows, "days": days, "watermark": watermark}
+
+        except Exception as e:
+            for writer in writers.values():
+                writer.close()
+            raise SrcException(e, sys)
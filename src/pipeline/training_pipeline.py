@@ -1,6 +1,8 @@
 from src.logger import logging
 from src.exception import SrcException
 from src.entity import config_entity
+from src.schema import memory_report
+from src.utils import write_yaml_file
 from src.components import (
     data_ingestion,
     data_validation,
@@ -16,6 +18,7 @@ import sys
 
 def run_training_pipeline():
     
+    training_pipeline_config = None
     try:
         # Initialize the overall training pipeline configuration
         training_pipeline_config = config_entity.TrainingPipelineConfig()
@@ -108,3 +111,8 @@ def run_training_pipeline():
     
     except Exception as e:
         raise SrcException(e, sys)
+
+    finally:
+        # Also written when a stage fails, with the stages that completed
+        if training_pipeline_config is not None:
+            write_yaml_file(training_pipeline_config.memory_report_file_path, {"stages": memory_report()})
@@ -0,0 +1,180 @@
+import atexit
+import queue
+import sys
+import threading
+import time
+
+from pymongo.errors import BulkWriteError, PyMongoError
+
+from src.exception import SrcException
+from src.logger import logging
+
+DUPLICATE_KEY_ERROR = 11000
+
+
+class PredictionRecordWriter:
+    """
+    Write-behind buffer for prediction records.
+
+    Records are queued in memory and a background thread flushes them with
+    `insert_many(ordered=False)` once `batch_size` records are buffered or
+    `flush_interval` seconds have passed, keeping the Mongo round trip off the
+    request path.
+
+    - The queue is bounded by `max_queue_size`; when it is full, `write` blocks for at most
+      `enqueue_timeout` seconds (backpressure) and then drops the record.
+    - Failed batches are retried up to `max_retries` times with a linear backoff;
+      duplicate-key errors are not retried.
+    - Remaining records are flushed on `close()`, which is also registered with `atexit`
+      so a graceful worker shutdown drains the buffer.
+    - With a `metrics` registry every counter is also exported as
+      `prediction_records_total{outcome=...}`: records dropped on a full queue count as
+      "dropped", records given up after the retries as "failed".
+    """
+
+    def __init__(self,
+                 mongo_client,
+                 database_name: str,
+                 collection_name: str = "latest_transactions",
+                 batch_size: int = 500,
+                 flush_interval: float = 1.0,
+                 max_queue_size: int = 10_000,
+                 enqueue_timeout: float = 0.05,
+                 max_retries: int = 3,
+                 retry_backoff: float = 0.5,
+                 metrics=None):
+        self.mongo_client = mongo_client
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.enqueue_timeout = enqueue_timeout
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.metrics = metrics
+
+        self._queue = queue.Queue(maxsize=max_queue_size)
+        self._stop = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()
+        self._counters = {"enqueued": 0, "written": 0, "retried": 0, "dropped": 0, "failed": 0}
+
+    def start(self) -> None:
+        """Start the background flush thread if it is not running yet."""
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prediction-writer", daemon=True)
+            self._thread.start()
+            atexit.register(self.close)
+
+    def write(self, record: dict) -> bool:
+        """
+        Queue one prediction record. Returns False if the record was dropped.
+        """
+        if self._thread is None:
+            self.start()
+        try:
+            self._queue.put(record, timeout=self.enqueue_timeout)
+            self._increment("enqueued")
+            return True
+        except queue.Full:
+            self._increment("dropped")
+            logging.warning("Prediction writer queue is full, dropping record")
+            return False
+
+    def write_many(self, records: list) -> int:
+        """
+        Queue several prediction records. Returns how many were accepted.
+        """
+        return sum(self.write(record) for record in records)
+
+    def stats(self) -> dict:
+        """Snapshot of the writer counters and current queue depth."""
+        with self._lock:
+            counters = dict(self._counters)
+        counters["queued"] = self._queue.qsize()
+        return counters
+
+    def close(self, timeout: float = 10.0) -> None:
+        """
+        Stop the background thread after flushing everything still queued.
+        """
+        thread = self._thread
+        if thread is None:
+            return
+        self._stop.set()
+        thread.join(timeout=timeout)
+        if thread.is_alive():
+            logging.warning(f"Prediction writer did not finish flushing within {timeout}s")
+        self._thread = None
+        logging.info(f"Prediction writer closed: {self.stats()}")
+
+    def _increment(self, counter: str, amount: int = 1) -> None:
+        with self._lock:
+            self._counters[counter] += amount
+        if self.metrics is not None and amount:
+            self.metrics.counter("prediction_records_total", help_text="Prediction records by write outcome",
+                                 outcome=counter).inc(amount)
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch:
+                self._flush(batch)
+            elif self._stop.is_set():
+                return
+
+    def _next_batch(self) -> list:
+        """Collect up to `batch_size` records, waiting at most `flush_interval` seconds."""
+        batch = []
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            if self._stop.is_set():
+                # Draining on shutdown: take whatever is left without waiting
+                try:
+                    batch.append(self._queue.get_nowait())
+                    continue
+                except queue.Empty:
+                    break
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=min(remaining, 0.1)))
+            except queue.Empty:
+                continue
+        return batch
+
+    def _flush(self, batch: list) -> None:
+        collection = self.mongo_client[self.database_name][self.collection_name]
+        pending = batch
+        for attempt in range(self.max_retries + 1):
+            try:
+                collection.insert_many(pending, ordered=False)
+                self._increment("written", len(pending))
+                return
+
+            except BulkWriteError as e:
+                # Duplicate keys mean the record already landed in an earlier attempt
+                write_errors = e.details.get("writeErrors", [])
+                retryable = [err["index"] for err in write_errors if err.get("code") != DUPLICATE_KEY_ERROR]
+                self._increment("written", len(pending) - len(retryable))
+                pending = [pending[index] for index in retryable]
+                if not pending:
+                    return
+
+            except PyMongoError as e:
+                logging.warning(f"Prediction writer flush failed (attempt {attempt + 1}): {e}")
+
+            except Exception as e:
+                logging.error(f"Prediction writer flush failed: {SrcException(e, sys)}")
+                break
+
+            if attempt < self.max_retries:
+                self._increment("retried", len(pending))
+                time.sleep(self.retry_backoff * (attempt + 1))
+
+        self._increment("failed", len(pending))
+        logging.error(f"Prediction writer dropped {len(pending)} records after {self.max_retries} retries")
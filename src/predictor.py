@@ -1,5 +1,12 @@
 import os
-from typing import Optional
+import threading
+from typing import Any, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.logger import logging
+from src.utils import load_object
 
 MODEL_FILE_NAME = "model.pkl"
 
@@ -54,10 +61,180 @@ class ModelResolver:
         save_dir = self.get_latest_save_dir_path()
         return os.path.join(save_dir, self.model_dir_name, MODEL_FILE_NAME)
 
+class BoosterScorer:
+    """
+    Fast inference path for a fitted `XGBClassifier`.
+
+    The underlying Booster and the model's feature order are extracted once; scoring then
+    runs `Booster.inplace_predict` directly on contiguous float32 NumPy arrays, skipping the
+    sklearn wrapper's DataFrame validation and DMatrix construction on every call.
+    """
+
+    def __init__(self, model: Any, nthread: Optional[int] = None):
+        if getattr(model, "objective", None) != "binary:logistic":
+            raise ValueError(f"BoosterScorer supports binary:logistic models only, got {getattr(model, 'objective', None)}")
+
+        self.model = model
+        self.booster = model.get_booster()
+        if nthread is not None:
+            # Small requests are dominated by thread start-up, one thread per worker is often faster
+            self.booster.set_param({"nthread": nthread})
+        self.feature_names_in_ = np.asarray(model.feature_names_in_)
+        self._feature_list = self.feature_names_in_.tolist()
+
+        # Same trees the wrapper would use (honours early stopping)
+        try:
+            self._iteration_range = (0, model.best_iteration + 1)
+        except AttributeError:
+            self._iteration_range = (0, 0)
+
+    def to_array(self, features: pd.DataFrame) -> np.ndarray:
+        """
+        Returns the model features of `features` as a C-contiguous float32 array in training order.
+        """
+        array = np.empty((len(features), len(self._feature_list)), dtype=np.float32)
+        try:
+            for position, name in enumerate(self._feature_list):
+                array[:, position] = features[name].to_numpy(dtype=np.float32, copy=False)
+        except KeyError as e:
+            raise ValueError(f"Missing model feature: {e}")
+        return array
+
+    def row_to_array(self, row: dict) -> np.ndarray:
+        """Returns a single feature record as a (1, n_features) float32 array."""
+        return np.fromiter(
+            (row[name] for name in self._feature_list), dtype=np.float32, count=len(self._feature_list)
+        ).reshape(1, -1)
+
+    def score(self, X) -> np.ndarray:
+        """
+        Fraud probability for each row. `X` is a DataFrame with the model features or a
+        float32 array already in `feature_names_in_` order.
+        """
+        if isinstance(X, pd.DataFrame):
+            X = self.to_array(X)
+        return self.booster.inplace_predict(np.ascontiguousarray(X, dtype=np.float32),
+                                            iteration_range=self._iteration_range)
+
+    def predict_proba(self, X) -> np.ndarray:
+        """Class probabilities with the same (n, 2) layout as `XGBClassifier.predict_proba`."""
+        probability = self.score(X)
+        return np.column_stack([1 - probability, probability])
+
+    def predict(self, X) -> np.ndarray:
+        """Class labels with the same 0.5 threshold as `XGBClassifier.predict`."""
+        return (self.score(X) > 0.5).astype(int)
+
+
 class Predictor:
     """
     A wrapper class for handling predictions using the latest available model.
+
+    The active model can be hot-reloaded: a background watcher loads newer versions from the
+    registry off the request path, validates them with a warm-up prediction and swaps them in
+    atomically, so in-flight requests finish on the model they started with.
     """
 
-    def __init__(self, model_resolver: ModelResolver):
+    def __init__(self, model_resolver: ModelResolver, poll_interval: float = 60.0):
         self.model_resolver = model_resolver
+        self.poll_interval = poll_interval
+        # (version, model, scorer) is swapped as one tuple so readers never see a mixed state
+        self._active = (None, None, None)
+        # (path, mtime, size) of the last model file that failed to load or validate
+        self._rejected = None
+        self._reload_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._watcher = None
+
+    def get_model(self) -> Tuple[Optional[int], Any]:
+        """
+        Returns the active (version, model) pair. Callers should fetch it once per request
+        so a concurrent swap never changes the model halfway through.
+        """
+        version, model, _ = self._active
+        return version, model
+
+    def get_scorer(self) -> Tuple[Optional[int], "BoosterScorer"]:
+        """
+        Returns the active (version, BoosterScorer) pair for the native inference path.
+        """
+        version, _, scorer = self._active
+        return version, scorer
+
+    @property
+    def version(self) -> Optional[int]:
+        return self._active[0]
+
+    def _latest_version(self) -> Optional[int]:
+        latest_dir = self.model_resolver.get_latest_dir_path()
+        return None if latest_dir is None else int(os.path.basename(latest_dir))
+
+    @staticmethod
+    def _warm_up(model: Any, scorer: BoosterScorer) -> None:
+        """
+        Run one prediction on a zero-filled row to validate the model and trigger lazy initialisation.
+        """
+        sample = pd.DataFrame(np.zeros((1, len(model.feature_names_in_))), columns=model.feature_names_in_)
+        probabilities = model.predict_proba(sample)
+        if probabilities.shape != (1, 2) or not np.isfinite(probabilities).all():
+            raise ValueError(f"Warm-up prediction returned unexpected output: {probabilities}")
+        if not np.allclose(scorer.predict_proba(sample), probabilities, atol=1e-6):
+            raise ValueError("Booster fast path disagrees with the model on the warm-up prediction")
+
+    def load_latest(self) -> bool:
+        """
+        Loads the latest model version if it is newer than the active one, validates it with a
+        warm-up prediction and swaps it in. Returns True if a new model was activated.
+
+        A model file that fails to load or validate is remembered and skipped until it is
+        rewritten (its modification time or size changes) or a newer version appears.
+        """
+        with self._reload_lock:
+            latest_version = self._latest_version()
+            if latest_version is None:
+                raise FileNotFoundError("No existing model found in the registry.")
+            if self._active[0] is not None and latest_version <= self._active[0]:
+                return False
+
+            model_path = self.model_resolver.get_latest_model_path()
+            stat = os.stat(model_path)
+            model_file = (model_path, stat.st_mtime_ns, stat.st_size)
+            if model_file == self._rejected:
+                return False
+
+            try:
+                model = load_object(file_path=model_path)
+                scorer = BoosterScorer(model)
+                self._warm_up(model, scorer)
+            except Exception as e:
+                self._rejected = model_file
+                raise ValueError(f"Rejected model version {latest_version} ({model_path}) until it changes: {e}")
+
+            previous_version = self._active[0]
+            self._active = (latest_version, model, scorer)
+            logging.info(f"Activated model version {latest_version} (previous: {previous_version})")
+            return True
+
+    def _watch(self) -> None:
+        while not self._stop.wait(self.poll_interval):
+            try:
+                self.load_latest()
+            except Exception as e:
+                # A rejected model is skipped by later polls, so this is logged once per version
+                logging.warning(f"Model reload failed, keeping version {self.version}: {e}")
+
+    def start_watcher(self) -> None:
+        """
+        Starts a background thread that polls the registry and hot-swaps newer models.
+        """
+        if self._watcher is not None and self._watcher.is_alive():
+            return
+        self._stop.clear()
+        self._watcher = threading.Thread(target=self._watch, name="model-watcher", daemon=True)
+        self._watcher.start()
+
+    def stop_watcher(self) -> None:
+        self._stop.set()
+        if self._watcher is not None:
+            self._watcher.join(timeout=self.poll_interval)
+            self._watcher = None
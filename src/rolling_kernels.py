@@ -0,0 +1,208 @@
+"""
+Per-group rolling-window kernels over contiguous NumPy arrays.
+
+Every kernel takes integer group codes (e.g. from `pd.factorize`) and, for time windows,
+int64 times of any unit. Rows can come in any order; results are aligned to the input rows.
+
+Time windows are (time - window, time] and end at the row itself, like pandas'
+`groupby().rolling('7D')`: of several rows of a group with the same time, a row sees only
+the ones before it in row order. Rows are sorted once by (group, time), and each window
+start is a single `searchsorted` over packed (group, time rank) keys. Sums and means come
+from prefix sums restarted at every group, maxes from a sparse table over the sorted
+values.
+
+Count windows (`last_n_*`) cover a row and the n - 1 rows of its group before it in row
+order, like `groupby().rolling(n, min_periods=1)`.
+
+`prior_totals` and `prior_mean` are an expanding sum and count, or mean, looked up as of
+any query times, from one cumulative sum over the rows.
+"""
+import numpy as np
+
+
+def group_starts(codes: np.ndarray) -> np.ndarray:
+    """Boolean mask of the first row of every run of equal values in `codes`."""
+    starts = np.ones(len(codes), dtype=bool)
+    starts[1:] = codes[1:] != codes[:-1]
+    return starts
+
+
+def positions_in_group(codes: np.ndarray) -> np.ndarray:
+    """0-based position of every row within its run of equal `codes` (rows sorted by group)."""
+    index = np.arange(len(codes))
+    return index - np.maximum.accumulate(np.where(group_starts(codes), index, 0))
+
+
+def stable_argsort(codes: np.ndarray) -> np.ndarray:
+    """
+    Stable argsort; codes that fit in 16 bits are narrowed first, where NumPy's stable sort
+    is a linear-time radix sort.
+    """
+    if len(codes) and codes.dtype.kind in "iu" and 0 <= codes.min() and codes.max() < 1 << 16:
+        codes = codes.astype(np.uint16)
+    return np.argsort(codes, kind="stable")
+
+
+def cumcount(codes: np.ndarray) -> np.ndarray:
+    """`groupby(codes).cumcount()`: how many earlier rows share each row's value."""
+    order = stable_argsort(codes)
+    counts = np.empty(len(codes), dtype=np.int64)
+    counts[order] = positions_in_group(codes[order])
+    return counts
+
+
+def window_bounds(groups: np.ndarray, times: np.ndarray, window: int):
+    """
+    Rows sorted by (group, time) and the [start, end) range of each row's window in that
+    sorted order.
+
+    Times are replaced by their rank among the distinct times, so (group, time) packs into
+    one int64 key without overflow, and the window starts are one `searchsorted` of sorted
+    needles over the sorted keys.
+
+    Returns:
+        tuple: (order, start, end); `order` maps sorted positions to rows.
+    """
+    distinct, time_rank = np.unique(times, return_inverse=True)
+    lower_rank = np.searchsorted(distinct, distinct - window, side="right")[time_rank]
+    base = groups.astype(np.int64) * (len(distinct) + 1)
+    keys = base + time_rank
+    order = np.argsort(keys, kind="stable")
+    start = np.searchsorted(keys[order], (base + lower_rank)[order])
+    end = np.arange(1, len(keys) + 1)
+    return order, start, end
+
+
+def last_n_bounds(groups: np.ndarray, n: int):
+    """Rows sorted by group (stable) and the [start, end) range of each row's last-n window."""
+    order = stable_argsort(groups)
+    end = np.arange(1, len(groups) + 1)
+    start = end - 1 - np.minimum(positions_in_group(groups[order]), n - 1)
+    return order, start, end
+
+
+def _scatter(order: np.ndarray, sorted_values: np.ndarray) -> np.ndarray:
+    values = np.empty_like(sorted_values)
+    values[order] = sorted_values
+    return values
+
+
+def _window_sums(sorted_groups: np.ndarray, sorted_values: np.ndarray, start: np.ndarray, end: np.ndarray):
+    """
+    sum(values[start:end]) of every range from prefix sums. The running sum is brought
+    back near 0 at every group, so the rounding error of a window sum is relative to its
+    own group's total rather than to everything summed before it.
+    """
+    values = sorted_values.astype(np.float64)
+    firsts = group_starts(sorted_groups)
+    if len(values):
+        first_positions = np.flatnonzero(firsts)
+        values[first_positions[1:]] -= np.add.reduceat(values, first_positions)[:-1]
+    prefix = np.concatenate([[0.0], np.cumsum(values)])
+    # A window starting at its group's first row starts from 0, not from the previous group's total
+    lower = np.where(firsts[np.minimum(start, len(values) - 1)], 0.0, prefix[start])
+    return prefix[end] - lower
+
+
+def _range_max(values: np.ndarray, start: np.ndarray, end: np.ndarray) -> np.ndarray:
+    """max(values[start:end]) of every non-empty range, from a sparse table of power-of-two spans."""
+    level = np.log2(np.maximum(end - start, 1)).astype(np.int64)
+    result = values[start]
+    table = values
+    for k in range(1, int(level.max(initial=0)) + 1):
+        half = 1 << (k - 1)
+        table = np.maximum(table[:-half], table[half:])
+        rows = np.flatnonzero(level == k)
+        result[rows] = np.maximum(table[start[rows]], table[end[rows] - (1 << k)])
+    return result
+
+
+def window_count(groups: np.ndarray, times: np.ndarray, window: int) -> np.ndarray:
+    """Rows of the group in each row's time window."""
+    order, start, end = window_bounds(groups, times, window)
+    return _scatter(order, end - start)
+
+
+def window_sum(groups: np.ndarray, times: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """Sum of `values` over each row's time window."""
+    order, start, end = window_bounds(groups, times, window)
+    return _scatter(order, _window_sums(groups[order], values[order], start, end))
+
+
+def window_mean(groups: np.ndarray, times: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """Mean of `values` over each row's time window."""
+    order, start, end = window_bounds(groups, times, window)
+    return _scatter(order, _window_sums(groups[order], values[order], start, end) / (end - start))
+
+
+def window_max(groups: np.ndarray, times: np.ndarray, values: np.ndarray, window: int) -> np.ndarray:
+    """Max of `values` over each row's time window."""
+    order, start, end = window_bounds(groups, times, window)
+    return _scatter(order, _range_max(values[order], start, end))
+
+
+def _last_n_sums(groups: np.ndarray, values: np.ndarray, n: int):
+    """
+    Sorted order, window sizes and sums of the last-n windows. The sums add the n shifted
+    copies of the sorted values (n passes, meant for short windows), which rounds like a
+    direct sum of each window.
+    """
+    order, start, end = last_n_bounds(groups, n)
+    x = values[order].astype(np.float64)
+    size = end - start
+    total = x.copy()
+    for lag in range(1, n):
+        total[lag:] += np.where(size[lag:] > lag, x[:-lag], 0.0)
+    return order, size, total
+
+
+def last_n_sum(groups: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """Sum of each row's value and the previous n - 1 values of its group."""
+    order, _, total = _last_n_sums(groups, values, n)
+    return _scatter(order, total)
+
+
+def last_n_mean(groups: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """Mean of each row's value and the previous n - 1 values of its group."""
+    order, size, total = _last_n_sums(groups, values, n)
+    return _scatter(order, total / size)
+
+
+def last_n_max(groups: np.ndarray, values: np.ndarray, n: int) -> np.ndarray:
+    """Max of each row's value and the previous n - 1 values of its group."""
+    order, start, end = last_n_bounds(groups, n)
+    return _scatter(order, _range_max(values[order], start, end))
+
+
+def prior_totals(groups: np.ndarray, times: np.ndarray, values: np.ndarray,
+                 query_groups: np.ndarray, query_times: np.ndarray) -> tuple:
+    """
+    Sum of `values` and count of the rows of each query's group strictly before its time.
+
+    The rows are sorted once by (group, time) and their values summed cumulatively; each
+    query is then a `searchsorted` into the packed (group, time rank) keys, so the totals
+    of any number of queries cost one pass. The running sum is not restarted per group, so
+    it is exact for integer values such as labels.
+    """
+    ids, codes = np.unique(np.concatenate([groups, query_groups]), return_inverse=True)
+    distinct, ranks = np.unique(np.concatenate([times, query_times]), return_inverse=True)
+    keys = codes.astype(np.int64) * (len(distinct) + 1) + ranks
+    row_keys, query_keys = keys[:len(groups)], keys[len(groups):]
+
+    order = np.argsort(row_keys, kind="stable")
+    sorted_keys = row_keys[order]
+    prefix = np.concatenate([[0.0], np.cumsum(values[order], dtype=np.float64)])
+
+    end = np.searchsorted(sorted_keys, query_keys, side="left")
+    start = np.searchsorted(sorted_keys, codes[len(groups):].astype(np.int64) * (len(distinct) + 1), side="left")
+    return prefix[end] - prefix[start], end - start
+
+
+def prior_mean(groups: np.ndarray, times: np.ndarray, values: np.ndarray,
+               query_groups: np.ndarray, query_times: np.ndarray) -> np.ndarray:
+    """
+    Mean of `values` over the rows of each query's group strictly before its time (0 where
+    there are none), e.g. a terminal's fraud rate as of each transaction; see `prior_totals`.
+    """
+    sums, counts = prior_totals(groups, times, values, query_groups, query_times)
+    return np.where(counts > 0, sums / np.maximum(counts, 1), 0.0)
@@ -0,0 +1,216 @@
+"""
+Compact column dtypes shared by every pipeline stage.
+
+Ingestion, the CSV artifacts, `generate_features` (training and serving) and the online
+feature store all cast their frames with `apply_schema`, so the same column has the same
+dtype everywhere: int64 ids, float32 amounts and ratios, int8 flags and calendar fields,
+datetime64 timestamps. XGBoost works on float32 anyway, so the float32 features lose
+nothing the model would see. Narrowing integer casts are range-checked: a value that does
+not fit raises instead of silently wrapping around.
+
+`report_memory` logs the size of a stage's frame and the process's peak RSS, and keeps
+them for the training pipeline's `memory_report.yml`.
+"""
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+
+from src.config import TARGET_COLUMN
+from src.exception import SrcException
+from src.logger import logging
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+# Fields of a transaction document
+RAW_COLUMNS = [
+    "TRANSACTION_ID", "TX_DATETIME", "CUSTOMER_ID", "TERMINAL_ID", "TX_AMOUNT",
+    "TX_TIME_SECONDS", "TX_TIME_DAYS", "TX_FRAUD", "TX_FRAUD_SCENARIO",
+]
+
+COLUMN_DTYPES = {
+    # Raw transactions; ids are unbounded keys matched across stages, so they keep 64 bits
+    "TRANSACTION_ID": "int64",
+    "CUSTOMER_ID": "int64",
+    "TERMINAL_ID": "int64",
+    "TX_AMOUNT": "float32",
+    "TX_DATETIME": "datetime64[ns]",
+    "TX_TIME_SECONDS": "int32",
+    "TX_TIME_DAYS": "int16",
+    "TX_FRAUD": "int8",
+    "TX_FRAUD_SCENARIO": "int8",
+    # Engineered features
+    "TX_HOUR": "int8",
+    "TX_WEEK_DAY": "int8",
+    "IS_NIGHT_TX": "int8",
+    "TX_IS_WEEKEND": "int8",
+    "IS_TX_AMOUNT_HIGH": "int8",
+    "TX_MONTH": "int8",
+    "WEEKEND_NIGHT": "int8",
+    "CUSTOMER_AVG_AMOUNT_7D": "float32",
+    "CUSTOMER_MAX_AMOUNT_7D": "float32",
+    "AVG_AMOUNT_CUSTOMER": "float32",
+    "IS_TX_5X_AVG": "int8",
+    "CUSTOMER_TX_COUNT_7D": "int32",
+    "TERMINAL_TX_COUNT_7D": "int32",
+    "CUSTOMER_TX_COUNT_MONTH": "int32",
+    "TERMINAL_TX_COUNT_MONTH": "int32",
+    "TX_OVER_CUSTOMER_AVG": "float32",
+    "TX_OVER_MAX_LAST_7D": "float32",
+    "ROLLING_TX_COUNT_1D": "int32",
+    "TERMINAL_RISK": "float32",
+    # Whole seconds, exact in float32 up to 2**24
+    "TIME_SINCE_LAST_TX": "float32",
+}
+
+# Rows parsed at a time by the CSV readers
+CSV_CHUNK_ROWS = 200_000
+
+# Model inputs after SMOTE, whose synthetic rows interpolate the flags and counts
+MODEL_INPUT_DTYPE = np.float32
+
+# Recorded by `report_memory`, in call order
+_memory_report = []
+
+
+def _check_range(column: str, values: pd.Series, dtype: str) -> None:
+    """Raise if `values` do not fit the integer `dtype`, which `astype` would silently wrap."""
+    if values.empty:
+        return
+    if values.dtype == object:
+        values = pd.to_numeric(values)
+    limits = np.iinfo(dtype)
+    low, high = values.min(), values.max()
+    if low < limits.min or high > limits.max:
+        raise ValueError(f"{column} holds values in [{low}, {high}], outside the {dtype} "
+                         f"range [{limits.min}, {limits.max}]")
+
+
+def apply_schema(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Cast the columns of `df` listed in `COLUMN_DTYPES` (in place) and return it. Integer
+    columns that still hold missing values become floats until they are dropped: float64
+    for the int64 ids, which it holds exactly up to 2**53 (float32 only to 2**24, where
+    distinct ids would collide), float32 for the narrower columns. Values outside an
+    integer column's range raise a ValueError.
+    """
+    try:
+        for column, dtype in COLUMN_DTYPES.items():
+            if column not in df.columns or df[column].dtype == dtype:
+                continue
+            if dtype.startswith("datetime"):
+                df[column] = pd.to_datetime(df[column])
+            elif dtype.startswith("int") and df[column].isna().any():
+                df[column] = df[column].astype(np.float64 if dtype == "int64" else np.float32)
+            elif dtype.startswith("int"):
+                _check_range(column, df[column], dtype)
+                df[column] = df[column].astype(dtype)
+            else:
+                df[column] = df[column].astype(dtype)
+        return df
+
+    except Exception as e:
+        raise SrcException(e, sys)
+
+
+def read_csv(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    `pd.read_csv` with the schema's dtypes. The file is parsed `chunk_rows` at a time and
+    each chunk is cast before the next one is read, so the parser's buffers and the
+    int64/float64/object columns it produces never exist for the whole file at once.
+    Integer columns are parsed as int64 and cast by `apply_schema`, since the parser wraps
+    values that overflow a narrower dtype.
+    """
+    try:
+        columns = pd.read_csv(file_path, nrows=0).columns
+        dtypes = {column: COLUMN_DTYPES[column] for column in columns
+                  if COLUMN_DTYPES.get(column, "").startswith("float")}
+        dates = [column for column in columns if COLUMN_DTYPES.get(column, "").startswith("datetime")]
+        chunks = [apply_schema(chunk) for chunk in
+                  pd.read_csv(file_path, dtype=dtypes, parse_dates=dates, chunksize=chunk_rows)]
+        return pd.concat(chunks, ignore_index=True) if chunks else pd.read_csv(file_path)
+
+    except Exception as e:
+        raise SrcException(e, sys)
+
+
+def parquet_schema(source) -> pa.Schema:
+    """
+    Arrow schema to read the Parquet dataset `source` (a directory or a list of files)
+    with: that of its first file, with integer id columns widened to int64 so parts
+    written with narrower ids still read alongside newer ones.
+    """
+    schema = ds.dataset(source, format="parquet").schema
+    return pa.schema([
+        field.with_type(pa.int64())
+        if pa.types.is_integer(field.type) and COLUMN_DTYPES.get(field.name) == "int64" else field
+        for field in schema
+    ])
+
+
+def read_table(file_path: str) -> pd.DataFrame:
+    """
+    A Parquet (`.parquet` file, or a directory of them such as a partitioned transaction
+    store) or CSV artifact with the schema's dtypes.
+    """
+    try:
+        if os.path.isdir(file_path):
+            return apply_schema(pd.read_parquet(file_path, schema=parquet_schema(file_path)))
+        if file_path.endswith(".parquet"):
+            return apply_schema(pd.read_parquet(file_path))
+        return read_csv(file_path)
+
+    except Exception as e:
+        raise SrcException(e, sys)
+
+
+def read_model_csv(file_path: str, chunk_rows: int = CSV_CHUNK_ROWS) -> pd.DataFrame:
+    """
+    Train/test matrix written by data preprocessing, read in chunks: every input column
+    as `MODEL_INPUT_DTYPE`, the target with its schema dtype.
+    """
+    try:
+        columns = pd.read_csv(file_path, nrows=0).columns
+        dtypes = {column: MODEL_INPUT_DTYPE for column in columns}
+        dtypes[TARGET_COLUMN] = COLUMN_DTYPES.get(TARGET_COLUMN, "int8")
+        return pd.concat(pd.read_csv(file_path, dtype=dtypes, chunksize=chunk_rows), ignore_index=True)
+
+    except Exception as e:
+        raise SrcException(e, sys)
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far, in MB (None where unavailable)."""
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+
+
+def report_memory(stage: str, df: pd.DataFrame = None, rows: int = None) -> dict:
+    """
+    Log and record the size of `df` at the end of `stage` and the peak RSS so far. Stages
+    that stream their rows instead of holding a frame pass the row count alone.
+    """
+    entry = {
+        "stage": stage,
+        "rows": int(len(df) if df is not None else rows),
+        "frame_mb": round(float(df.memory_usage(deep=True).sum()) / 2 ** 20, 1) if df is not None else None,
+        "peak_rss_mb": peak_rss_mb(),
+    }
+    _memory_report.append(entry)
+    logging.info(f"Memory after {stage}: {entry['rows']} rows, frame {entry['frame_mb']} MB, "
+                 f"peak RSS {entry['peak_rss_mb']} MB")
+    return entry
+
+
+def memory_report() -> list:
+    """Entries recorded by `report_memory` so far."""
+    return list(_memory_report)
@@ -0,0 +1,80 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Hashable, Optional
+
+import pandas as pd
+
+
+def transaction_fingerprint(customer_id, terminal_id, amount, tx_datetime) -> tuple:
+    """Payload a retried transaction must repeat for its cached result to be reused."""
+    return (int(customer_id), int(terminal_id), float(amount), pd.Timestamp(tx_datetime))
+
+
+class ScoringCache:
+    """
+    Bounded LRU cache of recent scoring results keyed by (TRANSACTION_ID, model version).
+
+    Payment switches retry, so the same transaction is often scored several times within
+    seconds. A cached result is only returned when the retried request carries the same
+    payload (`fingerprint`) and is younger than `ttl_seconds`; otherwise it is a miss and
+    the transaction is scored again. Keying on the model version means a hot-reloaded
+    model never serves results of the previous one.
+
+    - `capacity` bounds the number of entries; the least recently used entry is evicted.
+      A capacity of 0 disables the cache.
+    - The cache is per process: with several gunicorn workers a retry that lands on
+      another worker is a miss.
+    """
+
+    def __init__(self, capacity: int = 10_000, ttl_seconds: float = 300.0):
+        self.capacity = capacity
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._counters = {"hits": 0, "misses": 0, "evictions": 0, "expired": 0}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, transaction_id: int, model_version: Optional[int], fingerprint: Hashable = None) -> Optional[Any]:
+        """
+        Cached result for the transaction, or None on a miss.
+        """
+        if self.capacity <= 0:
+            return None
+        key = (transaction_id, model_version)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                expires_at, cached_fingerprint, value = entry
+                if expires_at <= now:
+                    del self._entries[key]
+                    self._counters["expired"] += 1
+                elif cached_fingerprint == fingerprint:
+                    self._entries.move_to_end(key)
+                    self._counters["hits"] += 1
+                    return value
+            self._counters["misses"] += 1
+            return None
+
+    def put(self, transaction_id: int, model_version: Optional[int], value: Any, fingerprint: Hashable = None) -> None:
+        if self.capacity <= 0:
+            return
+        key = (transaction_id, model_version)
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl_seconds, fingerprint, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._counters["evictions"] += 1
+
+    def stats(self) -> dict:
+        """Snapshot of the cache counters, size and hit rate."""
+        with self._lock:
+            stats = dict(self._counters)
+            stats["size"] = len(self._entries)
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        return stats
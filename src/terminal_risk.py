@@ -0,0 +1,210 @@
+import sys
+import threading
+from typing import Optional
+
+import numpy as np
+import pandas as pd
+
+from src.collection_tail import CollectionTail
+from src.config import TERMINAL_RISK_LABEL_DELAY_DAYS
+from src.exception import SrcException
+from src.logger import logging
+from src.rolling_kernels import prior_totals
+
+# Fields of the collection the table is aggregated from
+TABLE_COLUMNS = ["TERMINAL_ID", "TX_FRAUD", "TX_DATETIME"]
+
+
+class TerminalRiskTable:
+    """
+    Materialized TERMINAL_RISK: the fraud rate of every terminal over the labeled
+    `transactions` collection, so scoring looks the risk up instead of aggregating the
+    terminal's fetched history on every request.
+
+    The table is held as sorted parallel NumPy arrays (terminal id, transaction count,
+    fraud count, last TX_DATETIME) and looked up with `searchsorted`. `refresh()` reads
+    only the documents added since the previous refresh through a `CollectionTail`
+    (a TX_DATETIME watermark with an overlap window, not `_id`, which clients generate
+    out of insertion order), aggregates each batch per terminal, and swaps the arrays in
+    atomically so lookups never take a lock. `refresh(full=True)` rebuilds the table from
+    the whole collection, e.g. after a backfill older than the overlap.
+    `start_refresher()` repeats the incremental refresh on a schedule.
+
+    A label counts towards a transaction only once it is `label_delay_days` old, as in
+    `generate_features`. The arrays hold the labels at least that much older than the
+    newest transaction loaded, which count for every transaction scored after it; the
+    more recent ones are kept as pending rows and counted per transaction by `lookup`.
+    """
+
+    def __init__(self, mongo_client, database_name: str, collection_name: str = "transactions",
+                 label_delay_days: float = TERMINAL_RISK_LABEL_DELAY_DAYS):
+        self.mongo_client = mongo_client
+        self.database_name = database_name
+        self.collection_name = collection_name
+        self.label_delay = pd.Timedelta(days=label_delay_days).value
+        self.refreshed_at: Optional[pd.Timestamp] = None
+
+        # (table arrays, pending labels), swapped together
+        self._state = self._empty()
+        self._tail = None
+        self._refresh_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __len__(self) -> int:
+        return len(self._state[0][0])
+
+    def refresh(self, full: bool = False) -> int:
+        """
+        Aggregate the transactions added since the last refresh (all of them on the
+        first call or with `full=True`) into the table. Returns how many were added.
+        """
+        try:
+            with self._refresh_lock:
+                if full or self._tail is None:
+                    collection = self.mongo_client[self.database_name][self.collection_name]
+                    tail = CollectionTail(collection, TABLE_COLUMNS)
+                    # A rebuild is swapped in whole, so lookups never see a partial table
+                    state, added = self._empty(), 0
+                    for batch in tail.read():
+                        state = self._fold(state, batch)
+                        added += len(batch)
+                    self._state, self._tail = state, tail
+                else:
+                    added = 0
+                    # Each batch counts as read once the next is requested, so it is swapped in before that
+                    for batch in self._tail.read():
+                        self._state = self._fold(self._state, batch)
+                        added += len(batch)
+                self.refreshed_at = pd.Timestamp.now()
+
+                logging.info(f"Terminal risk table refreshed: {added} transactions added, {len(self)} terminals")
+                return added
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    def update_from_dataframe(self, df: pd.DataFrame) -> None:
+        """Fold the labeled transactions of a DataFrame into the table (e.g. from the daily files)."""
+        try:
+            with self._refresh_lock:
+                self._state = self._fold(self._state, df)
+                self.refreshed_at = pd.Timestamp.now()
+
+        except Exception as e:
+            raise SrcException(e, sys)
+
+    @staticmethod
+    def _empty() -> tuple:
+        empty = np.empty(0, dtype=np.int64)
+        pending = pd.DataFrame({"TERMINAL_ID": empty, "TX_FRAUD": empty,
+                                "TX_DATETIME": pd.to_datetime(empty)})
+        return (empty, empty, empty, empty), pending
+
+    def _fold(self, state: tuple, df: pd.DataFrame) -> tuple:
+        """New (arrays, pending) with the labeled transactions of `df` added; callers swap it in."""
+        arrays, pending = state
+        df = df[TABLE_COLUMNS].assign(TX_DATETIME=pd.to_datetime(df["TX_DATETIME"]))
+        pending = pd.concat([pending, df], ignore_index=True)
+        matured = (pending["TX_DATETIME"] < pending["TX_DATETIME"].max() - pd.Timedelta(self.label_delay)).to_numpy()
+        if matured.any():
+            arrays = self._merge(arrays, *self._aggregate(pending[matured]))
+        pending = pending[~matured].reset_index(drop=True)
+        return arrays, pending
+
+    @staticmethod
+    def _aggregate(df: pd.DataFrame) -> tuple:
+        """Per-terminal (ids, counts, frauds, last TX_DATETIME as int64 ns) of labeled transactions."""
+        grouped = df.groupby("TERMINAL_ID").agg(
+            count=("TX_FRAUD", "size"),
+            frauds=("TX_FRAUD", "sum"),
+            last_tx=("TX_DATETIME", "max"),
+        )
+        return (
+            grouped.index.to_numpy(dtype=np.int64),
+            grouped["count"].to_numpy(dtype=np.int64),
+            grouped["frauds"].to_numpy(dtype=np.int64),
+            pd.to_datetime(grouped["last_tx"]).to_numpy(dtype="datetime64[ns]").view(np.int64),
+        )
+
+    @staticmethod
+    def _merge(base, terminal_ids, counts, frauds, last_tx) -> tuple:
+        """New table arrays with per-terminal aggregates added to `base`."""
+        old_ids, old_counts, old_frauds, old_last_tx = base
+        ids, inverse = np.unique(np.concatenate([old_ids, terminal_ids]), return_inverse=True)
+        merged_counts = np.bincount(inverse, weights=np.concatenate([old_counts, counts]), minlength=len(ids))
+        merged_frauds = np.bincount(inverse, weights=np.concatenate([old_frauds, frauds]), minlength=len(ids))
+        # NaT is the smallest int64, so a plain maximum keeps the latest real timestamp
+        merged_last_tx = np.full(len(ids), np.iinfo(np.int64).min, dtype=np.int64)
+        np.maximum.at(merged_last_tx, inverse, np.concatenate([old_last_tx, last_tx]))
+        return ids, merged_counts.astype(np.int64), merged_frauds.astype(np.int64), merged_last_tx
+
+    def lookup(self, terminal_ids, times=None) -> np.ndarray:
+        """
+        Fraud rate of each terminal id as of the int64 ns `times` of the transactions being
+        scored (at or after the newest one loaded): over its labels at least the label
+        delay older. Without `times`, over the labels in the arrays alone. 0 for terminals
+        without such labels, like `create_terminal_risk`.
+        """
+        (ids, counts, frauds, _), pending = self._state
+        terminal_ids = np.asarray(terminal_ids, dtype=np.int64)
+        totals = np.zeros(len(terminal_ids), dtype=np.int64)
+        fraud_totals = np.zeros(len(terminal_ids), dtype=np.int64)
+        if len(ids):
+            positions = np.minimum(np.searchsorted(ids, terminal_ids), len(ids) - 1)
+            found = ids[positions] == terminal_ids
+            totals[found] = counts[positions[found]]
+            fraud_totals[found] = frauds[positions[found]]
+
+        if times is not None and len(pending):
+            pending_sums, pending_counts = prior_totals(
+                pending["TERMINAL_ID"].to_numpy(dtype=np.int64),
+                pending["TX_DATETIME"].to_numpy(dtype="datetime64[ns]").view(np.int64),
+                pending["TX_FRAUD"].to_numpy(dtype=np.float64),
+                terminal_ids,
+                np.asarray(times, dtype=np.int64) - self.label_delay,
+            )
+            totals += pending_counts
+            fraud_totals += pending_sums.astype(np.int64)
+
+        risk = np.zeros(len(terminal_ids), dtype=np.float64)
+        labeled = totals > 0
+        risk[labeled] = fraud_totals[labeled] / totals[labeled]
+        return risk
+
+    def get(self, terminal_id: int) -> Optional[dict]:
+        """
+        Table row of one terminal: fraud rate, transaction count and last transaction time
+        of its labels past the delay of the newest transaction loaded.
+        """
+        ids, counts, frauds, last_tx = self._state[0]
+        position = int(np.searchsorted(ids, terminal_id))
+        if position == len(ids) or ids[position] != terminal_id:
+            return None
+        return {
+            "TERMINAL_ID": int(terminal_id),
+            "fraud_rate": frauds[position] / counts[position],
+            "count": int(counts[position]),
+            "last_tx": pd.Timestamp(last_tx[position]),
+        }
+
+    def _run(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                self.refresh()
+            except Exception as e:
+                logging.error(f"Terminal risk table refresh failed: {e}")
+
+    def start_refresher(self, interval: float = 300.0) -> None:
+        """Refresh the table every `interval` seconds in a daemon thread."""
+        if interval <= 0 or (self._thread is not None and self._thread.is_alive()):
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, args=(interval,), name="terminal-risk", daemon=True)
+        self._thread.start()
+
+    def stop_refresher(self) -> None:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
@@ -2,20 +2,43 @@ import pandas as pd
 import numpy as np
 import os  , sys
 import pickle
+import itertools
 from src.exception import SrcException
 from src.logger import logging
-from src.config import mongo_client
+from src.config import mongo_client, TX_DATETIME_FORMAT, INGESTION_BATCH_SIZE, DATASET_CACHE_DIR
+from src.daily_dataset import read_daily_pickles
+from src.schema import RAW_COLUMNS, apply_schema
+from pymongo import ASCENDING
+from concurrent.futures import ThreadPoolExecutor
+import threading
+import time
 import yaml
 import dill
 
-def get_collection_as_dataframe(database_name, collection_name):
+def iter_collection_batches(collection, query: dict = None, columns: list = RAW_COLUMNS,
+                            batch_size: int = INGESTION_BATCH_SIZE, sort: list = None):
+    """
+    Yield the documents of `collection` matching `query` (in `sort` order, if given) as
+    DataFrames of up to `batch_size` rows, with only `columns` fetched and cast to the
+    schema's dtypes.
+    """
+    projection = {"_id": 0, **{column: 1 for column in columns}}
+    cursor = collection.find(query or {}, projection, batch_size=batch_size, sort=sort)
+    while True:
+        documents = list(itertools.islice(cursor, batch_size))
+        if not documents:
+            return
+        yield apply_schema(pd.DataFrame.from_records(documents, columns=columns))
+
+
+def get_collection_as_dataframe(database_name, collection_name, columns=RAW_COLUMNS):
     """
     This function extracts data from a MongoDB collection and returns it as a pandas DataFrame.
 
     Parameters:
-    - mongo_client (MongoClient): Instance of a MongoDB client connected to MongoDB Atlas.
     - database_name (str): The name of the MongoDB database.
     - collection_name (str): The name of the MongoDB collection.
+    - columns (list): Fields to fetch; the documents are read in batches and typed per batch.
 
     Returns:
     - pd.DataFrame: DataFrame containing the data from the collection.
@@ -23,16 +46,11 @@ def get_collection_as_dataframe(database_name, collection_name):
     try:
         # Extract data from the specified collection
         collection = mongo_client[database_name][collection_name]
-        
-        # Find all documents in the collection and convert to DataFrame
-        cursor = collection.find()  # using find() instead of find_all()
-        df = pd.DataFrame(list(cursor))  # Convert the cursor to a list and then to a DataFrame
-        
-        # Removing irrelevant features (e.g., MongoDB's _id)
-        if "_id" in df.columns:
-            df.drop("_id", axis=1, inplace=True)
-        
-        return df  
+
+        batches = list(iter_collection_batches(collection, columns=columns))
+        if not batches:
+            return pd.DataFrame(columns=columns)
+        return pd.concat(batches, ignore_index=True)
 
     except Exception as e:
         print(f"Error: {e}")  
@@ -40,30 +58,46 @@ def get_collection_as_dataframe(database_name, collection_name):
 
 # Load a set of pickle files, put them together in a single DataFrame, and order them by time
 # It takes as input the folder DIR_INPUT where the files are stored, and the BEGIN_DATE and END_DATE
-def read_from_files(DIR_INPUT, BEGIN_DATE, END_DATE):
-    
-    files = [os.path.join(DIR_INPUT, f) for f in os.listdir(DIR_INPUT) if f>=BEGIN_DATE+'.pkl' and f<=END_DATE+'.pkl']
-
-    frames = []
-    for f in files:
-        df = pd.read_pickle(f)
-        frames.append(df)
-        del df
-    df_final = pd.concat(frames)
-    
-    df_final=df_final.sort_values('TRANSACTION_ID')
-    df_final.reset_index(drop=True,inplace=True)
-    #  Note: -1 are missing values for real world data 
-    df_final=df_final.replace([-1],0)
-    
-    return df_final
+def read_from_files(DIR_INPUT, BEGIN_DATE, END_DATE, cache_dir=DATASET_CACHE_DIR):
+    """
+    Transactions of the daily pickles from BEGIN_DATE to END_DATE (inclusive), sorted by
+    TRANSACTION_ID with -1 replaced by 0 (see `src.daily_dataset.read_daily_pickles`).
+    """
+    return read_daily_pickles(DIR_INPUT, BEGIN_DATE, END_DATE, cache_dir=cache_dir)
 
 
 #############################
 # Data Extractor
 ##############################
 
-def get_relevant_past_df(query, database_name, collection_name):
+def build_history_query(query, cutoff=None, lookback_start=None, columns=None):
+    """
+    Add the TX_DATETIME window to a history query and build its projection.
+
+    The time bounds are pushed into every `$or` clause, so each clause is answered
+    by a range read on its (ID, TX_DATETIME) index (see `create_history_indexes`).
+
+    Returns:
+        tuple: (query, projection) ready for `collection.find`.
+    """
+    time_filter = {}
+    if lookback_start is not None:
+        time_filter["$gte"] = pd.Timestamp(lookback_start).strftime(TX_DATETIME_FORMAT)
+    if cutoff is not None:
+        time_filter["$lt"] = pd.Timestamp(cutoff).strftime(TX_DATETIME_FORMAT)
+    if time_filter:
+        if set(query) == {"$or"}:
+            query = {"$or": [{**clause, "TX_DATETIME": time_filter} for clause in query["$or"]]}
+        else:
+            query = {**query, "TX_DATETIME": time_filter}
+
+    # Exclude MongoDB's default _id field and keep only the requested columns
+    projection = {"_id": 0}
+    if columns:
+        projection.update({column: 1 for column in columns})
+    return query, projection
+
+def get_relevant_past_df(query, database_name, collection_name, cutoff=None, lookback_start=None, columns=None):
     """
     Fetch historical transactions from MongoDB based on a given query.
 
@@ -71,7 +105,11 @@ def get_relevant_past_df(query, database_name, collection_name):
         query (dict): MongoDB query to filter documents (e.g., by CUSTOMER_ID or TERMINAL_ID).
         database_name (str): Name of the MongoDB database.
         collection_name (str): Name of the collection within the database.
-        limit (int, optional): Maximum number of documents to fetch. Defaults to 1000.
+        cutoff (datetime-like, optional): Only fetch transactions strictly before this time.
+        lookback_start (datetime-like, optional): Only fetch transactions at or after this time.
+        columns (list, optional): Fields to project. Defaults to every field.
+
+    The time window is pushed down to the database (see `build_history_query`).
 
     Returns:
         pd.DataFrame: A DataFrame containing the retrieved documents (excluding MongoDB _id field).
@@ -87,9 +125,7 @@ def get_relevant_past_df(query, database_name, collection_name):
     try:
         # Access the specified MongoDB collection
         collection = mongo_client[database_name][collection_name]
-
-        # Exclude MongoDB's default _id field
-        projection = {"_id": 0}
+        query, projection = build_history_query(query, cutoff, lookback_start, columns)
 
         # Fetch documents using the query and projection
         cursor = collection.find(query, projection)
@@ -101,13 +137,103 @@ def get_relevant_past_df(query, database_name, collection_name):
     except Exception as e:
         raise SrcException(e,sys)
 
-def store_prediction_records_to_database(mongo_client, database_name, collection_name, data):
+_history_executor = None
+_history_executor_lock = threading.Lock()
+
+def _get_history_executor():
+    """Lazily create the shared thread pool used for concurrent history lookups."""
+    global _history_executor
+    with _history_executor_lock:
+        if _history_executor is None:
+            _history_executor = ThreadPoolExecutor(max_workers=8, thread_name_prefix="history")
+        return _history_executor
+
+def get_customer_terminal_history(customer_ids, terminal_ids, database_name, collection_name,
+                                  cutoff=None, customer_lookback_start=None, terminal_lookback_start=None,
+                                  columns=None):
+    """
+    Fetch customer and terminal histories as two concurrent index-range queries
+    instead of a single `$or`, then merge them.
+
+    Args:
+        customer_ids (int or list): Customer(s) whose history is needed.
+        terminal_ids (int or list): Terminal(s) whose history is needed.
+        database_name (str): Name of the MongoDB database.
+        collection_name (str): Name of the collection within the database.
+        cutoff, columns: Forwarded to `get_relevant_past_df`.
+        customer_lookback_start, terminal_lookback_start: `lookback_start` of each query
+            (see `get_history_lookback`); None fetches the whole history before `cutoff`.
+
+    Returns:
+        tuple: (pd.DataFrame, dict) - the merged history deduplicated on TRANSACTION_ID,
+        and per-query timings/row counts ("customer_seconds", "customer_rows",
+        "terminal_seconds", "terminal_rows").
+    """
     try:
-        mongo_client[database_name][collection_name].insert_one(data)
-        print("Prediction data successfully dumped into database")
+        def id_filter(ids):
+            return {"$in": list(ids)} if isinstance(ids, (list, tuple, set, np.ndarray)) else ids
+
+        def timed_query(field, ids, lookback_start):
+            start = time.perf_counter()
+            df = get_relevant_past_df(
+                query={field: id_filter(ids)},
+                database_name=database_name,
+                collection_name=collection_name,
+                cutoff=cutoff,
+                lookback_start=lookback_start,
+                columns=columns
+            )
+            return df, time.perf_counter() - start
+
+        executor = _get_history_executor()
+        customer_future = executor.submit(timed_query, "CUSTOMER_ID", customer_ids, customer_lookback_start)
+        terminal_future = executor.submit(timed_query, "TERMINAL_ID", terminal_ids, terminal_lookback_start)
+        customer_df, customer_seconds = customer_future.result()
+        terminal_df, terminal_seconds = terminal_future.result()
+
+        timings = {
+            "customer_seconds": customer_seconds,
+            "customer_rows": len(customer_df),
+            "terminal_seconds": terminal_seconds,
+            "terminal_rows": len(terminal_df),
+        }
+
+        # A customer's transaction at the requested terminal is returned by both queries
+        past_df = pd.concat([customer_df, terminal_df], ignore_index=True)
+        if "TRANSACTION_ID" in past_df.columns:
+            past_df = past_df.drop_duplicates("TRANSACTION_ID", ignore_index=True)
+
+        return past_df, timings
+
+    except Exception as e:
+        raise SrcException(e, sys)
+
+# Compound indexes serving the per-customer and per-terminal history range reads
+HISTORY_INDEXES = [
+    [("CUSTOMER_ID", ASCENDING), ("TX_DATETIME", ASCENDING)],
+    [("TERMINAL_ID", ASCENDING), ("TX_DATETIME", ASCENDING)],
+]
+
+
+def create_history_indexes(database_name, collection_name):
+    """
+    Create the compound indexes backing `get_relevant_past_df` history lookups.
+
+    Args:
+        database_name (str): Name of the MongoDB database.
+        collection_name (str): Name of the collection within the database.
+
+    Returns:
+        list: Names of the indexes (creating an index that already exists is a no-op).
+    """
+    try:
+        collection = mongo_client[database_name][collection_name]
+        index_names = [collection.create_index(keys) for keys in HISTORY_INDEXES]
+        logging.info(f"History indexes ready on {database_name}.{collection_name}: {index_names}")
+        return index_names
+
     except Exception as e:
         raise SrcException(e, sys)
-    
 
 def write_yaml_file(file_path,data:dict):
     try:
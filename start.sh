@@ -45,9 +45,23 @@ if [ "$1" = "airflow" ]; then
 elif [ "$1" = "app" ]; then
   start_s3_sync  # Perform the S3 sync
 
+  # Fresh directory for the per-worker metric files aggregated by /metrics
+  export METRICS_DIR="${METRICS_DIR:-/tmp/fraud_metrics}"
+  rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
+
   echo "Starting Flask app with Gunicorn..."
   exec gunicorn app:app --bind 0.0.0.0:8501 --workers 4
 
+# FastAPI + Uvicorn section (async scoring service)
+elif [ "$1" = "asgi" ]; then
+  start_s3_sync  # Perform the S3 sync
+
+  export METRICS_DIR="${METRICS_DIR:-/tmp/fraud_asgi_metrics}"
+  rm -rf "$METRICS_DIR" && mkdir -p "$METRICS_DIR"
+
+  echo "Starting async scoring service with Uvicorn..."
+  exec uvicorn asgi_app:app --host 0.0.0.0 --port 8502
+
 else
   echo "Unknown service: $1"
   exec "$@"
@@ -0,0 +1,118 @@
+"""
+Shared fixtures: a small synthetic transactions frame shaped like the daily files of
+`dataset/data`, and the output comparison used by the parity tests.
+"""
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.schema import apply_schema
+
+START = pd.Timestamp("2018-04-20")
+
+# Serving tests score the transactions from this time on, with the earlier ones as history
+CUTOFF = pd.Timestamp("2018-05-20")
+
+
+def make_transactions(days: int = 40, customers: int = 80, terminals: int = 30,
+                      per_day: int = 120, seed: int = 0) -> pd.DataFrame:
+    """
+    Raw transactions over `days` days from START (so they cross a month boundary), in
+    TRANSACTION_ID and time order. Times are whole seconds and about one row in ten repeats
+    the previous row's time, so the window tie handling is exercised; a tenth of the
+    customers stop transacting for most of the period.
+    """
+    rng = np.random.default_rng(seed)
+    rows = days * per_day
+    seconds = np.sort(rng.integers(0, days * 86_400, rows))
+    ties = np.flatnonzero(rng.random(rows) < 0.1)
+    ties = ties[ties > 0]
+    seconds[ties] = seconds[ties - 1]
+
+    customer_ids = rng.integers(0, customers, rows)
+    quiet = (customer_ids < customers // 10) & (seconds > 3 * 86_400) & (seconds < (days - 3) * 86_400)
+    customer_ids[quiet] += customers // 10
+    fraud = (rng.random(rows) < 0.08).astype(np.int64)
+
+    df = pd.DataFrame({
+        "TRANSACTION_ID": np.arange(rows),
+        "TX_DATETIME": START + pd.to_timedelta(seconds, unit="s"),
+        "CUSTOMER_ID": customer_ids,
+        "TERMINAL_ID": rng.integers(0, terminals, rows),
+        "TX_AMOUNT": np.round(rng.gamma(2.0, 40.0, rows), 2),
+        "TX_TIME_SECONDS": seconds,
+        "TX_TIME_DAYS": seconds // 86_400,
+        "TX_FRAUD": fraud,
+        "TX_FRAUD_SCENARIO": fraud,
+    })
+    return apply_schema(df)
+
+
+@pytest.fixture(scope="session")
+def transactions() -> pd.DataFrame:
+    return make_transactions()
+
+
+def with_a_year_earlier(transactions: pd.DataFrame) -> pd.DataFrame:
+    """The transactions preceded by the same rows a year earlier, under other TRANSACTION_IDs."""
+    earlier = transactions.assign(TX_DATETIME=transactions["TX_DATETIME"] - pd.DateOffset(years=1),
+                                  TRANSACTION_ID=transactions["TRANSACTION_ID"] - len(transactions))
+    return pd.concat([earlier, transactions], ignore_index=True)
+
+
+def split(transactions: pd.DataFrame, rows: int = 60) -> tuple:
+    """History before CUTOFF and the first `rows` transactions from it, unlabeled."""
+    past = transactions[transactions["TX_DATETIME"] < CUTOFF]
+    current = transactions[transactions["TX_DATETIME"] >= CUTOFF].head(rows).drop(columns="TX_FRAUD")
+    return past, current
+
+
+@pytest.fixture(scope="session")
+def scoring_app(transactions, tmp_path_factory):
+    """
+    The `app` module over an in-memory MongoDB holding the transactions before CUTOFF, on
+    the history-query path, with an XGBoost model trained on their features as the only
+    saved model.
+    """
+    from xgboost import XGBClassifier
+
+    import src.config
+    import src.feature_extractor
+    import src.online_feature_store
+    import src.utils
+    from benchmarks.in_memory_mongo import InMemoryMongoClient
+    from src.bulk_loader import to_documents
+    from src.feature_extractor import feature_columns, generate_features
+
+    past, _ = split(transactions)
+    client = InMemoryMongoClient()
+    client["test"]["transactions"].insert_many(to_documents(past))
+
+    workdir = tmp_path_factory.mktemp("app")
+    training = generate_features(past.copy())
+    model = XGBClassifier(n_estimators=20, max_depth=3).fit(training[feature_columns], training["TX_FRAUD"])
+    src.utils.save_object(str(workdir / "saved_models" / "0" / "model" / "model.pkl"), model)
+
+    with pytest.MonkeyPatch.context() as patch:
+        patch.chdir(workdir)
+        # Modules bind `mongo_client` at import, so every one that queries it is pointed at the stand-in
+        for module in (src.config, src.utils, src.feature_extractor, src.online_feature_store):
+            patch.setattr(module, "mongo_client", client)
+        patch.setattr(src.config, "database_name", "test")
+        patch.setattr(src.config, "ONLINE_FEATURE_STORE_ENABLED", False)
+        patch.setattr(src.config, "METRICS_DIR", None)
+        import app
+        yield app
+
+
+def assert_same_features(left: pd.DataFrame, right: pd.DataFrame, rtol: float = 1e-6) -> None:
+    """Same columns, dtypes and index; exact integers, float32 floats to `rtol`."""
+    assert list(left.columns) == list(right.columns)
+    assert left.dtypes.equals(right.dtypes)
+    assert left.index.equals(right.index)
+    for column in left.columns:
+        left_values, right_values = left[column].to_numpy(), right[column].to_numpy()
+        if left_values.dtype.kind == "f":
+            np.testing.assert_allclose(left_values, right_values, rtol=rtol, atol=0, err_msg=column)
+        else:
+            assert (left_values == right_values).all(), f"{column} differs"
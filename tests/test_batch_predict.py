@@ -0,0 +1,92 @@
+import pytest
+
+from conftest import split
+from src.online_feature_store import OnlineFeatureStore
+from src.scoring_cache import transaction_fingerprint
+
+# Every test scores its transactions under its own ids, so none is answered from the scoring cache
+ID_OFFSETS = iter(range(1_000_000, 100_000_000, 1_000_000))
+
+
+def payload(rows):
+    return {"transactions": [
+        {"TRANSACTION_ID": int(row.TRANSACTION_ID), "CUSTOMER_ID": int(row.CUSTOMER_ID),
+         "TERMINAL_ID": int(row.TERMINAL_ID), "TX_AMOUNT": float(row.TX_AMOUNT),
+         "TX_DATETIME": row.TX_DATETIME.strftime("%Y-%m-%d %H:%M:%S")}
+        for row in rows.itertuples(index=False)
+    ]}
+
+
+@pytest.fixture
+def batch(transactions):
+    """Current transactions of distinct customers and terminals, under fresh TRANSACTION_IDs."""
+    _, current = split(transactions, rows=200)
+    current = current.drop_duplicates("CUSTOMER_ID").drop_duplicates("TERMINAL_ID").head(8)
+    return current.assign(TRANSACTION_ID=current["TRANSACTION_ID"] + next(ID_OFFSETS))
+
+
+def test_batch_rejects_duplicate_transaction_ids(scoring_app, batch):
+    body = payload(batch)
+    body["transactions"].append(dict(body["transactions"][0], TX_AMOUNT=1.0))
+    response = scoring_app.app.test_client().post("/predict/batch", json=body)
+    assert response.status_code == 400
+    assert "Duplicate TRANSACTION_ID" in response.get_json()["error"]
+
+
+@pytest.mark.parametrize("body", [{}, {"transactions": []}, {"transactions": [{"TRANSACTION_ID": 1}]}])
+def test_batch_rejects_malformed_bodies(scoring_app, body):
+    assert scoring_app.app.test_client().post("/predict/batch", json=body).status_code == 400
+
+
+def test_batch_keeps_the_request_order(scoring_app, batch):
+    shuffled = batch.sample(frac=1, random_state=1)
+    response = scoring_app.app.test_client().post("/predict/batch", json=payload(shuffled))
+    assert response.status_code == 200
+    predictions = response.get_json()["predictions"]
+    assert [prediction["TRANSACTION_ID"] for prediction in predictions] == shuffled["TRANSACTION_ID"].tolist()
+    assert response.headers["X-Model-Version"] == "0"
+
+
+def test_batch_scores_match_single_predict(scoring_app, batch):
+    client = scoring_app.app.test_client()
+    batch_scores = {
+        prediction["TRANSACTION_ID"]: prediction["fraud_probability"]
+        for prediction in client.post("/predict/batch", json=payload(batch)).get_json()["predictions"]
+    }
+
+    # /predict renders a page, so its score is read back from the scoring cache it fills
+    single = batch.assign(TRANSACTION_ID=batch["TRANSACTION_ID"] + 500_000)
+    for row, batch_id in zip(single.itertuples(index=False), batch["TRANSACTION_ID"]):
+        response = client.post("/predict", data={
+            "transaction_id": row.TRANSACTION_ID, "customer_id": row.CUSTOMER_ID, "terminal_id": row.TERMINAL_ID,
+            "amount": row.TX_AMOUNT, "timestamp": row.TX_DATETIME.strftime("%Y-%m-%d %H:%M:%S"),
+        })
+        assert response.status_code == 200 and b"Error" not in response.data
+        fingerprint = transaction_fingerprint(row.CUSTOMER_ID, row.TERMINAL_ID, float(row.TX_AMOUNT),
+                                              row.TX_DATETIME)
+        scored = scoring_app.scoring_cache.get(int(row.TRANSACTION_ID), 0, fingerprint)
+        assert scored["fraud_probability"] == pytest.approx(batch_scores[int(batch_id)], abs=1e-6)
+
+
+def test_store_path_matches_history_path_on_repeated_customers(scoring_app, transactions, monkeypatch):
+    past, current = split(transactions, rows=400)
+    repeated = current[current["CUSTOMER_ID"].isin(current["CUSTOMER_ID"].value_counts().index[:4])]
+    assert repeated["CUSTOMER_ID"].duplicated().sum() >= 4
+    client = scoring_app.app.test_client()
+
+    def scores(rows):
+        rows = rows.assign(TRANSACTION_ID=rows["TRANSACTION_ID"] + next(ID_OFFSETS))
+        predictions = client.post("/predict/batch", json=payload(rows)).get_json()["predictions"]
+        return [prediction["fraud_probability"] for prediction in predictions]
+
+    from_history = scores(repeated)
+    store = OnlineFeatureStore()
+    store.warm_from_dataframe(past)
+    monkeypatch.setattr(scoring_app, "feature_store", store)
+    assert scores(repeated) == pytest.approx(from_history, abs=1e-6)
+
+
+def test_metrics_export_the_prediction_writer_counters(scoring_app, batch):
+    client = scoring_app.app.test_client()
+    assert client.post("/predict/batch", json=payload(batch)).status_code == 200
+    assert 'fraud_prediction_records_total{outcome="enqueued"}' in client.get("/metrics").get_data(as_text=True)
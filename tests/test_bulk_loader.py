@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+import pytest
+
+from benchmarks.in_memory_mongo import InMemoryMongoClient
+from src.bulk_loader import BulkLoader, to_documents
+
+
+def day_rows(transactions, day):
+    return transactions[transactions["TX_DATETIME"].dt.strftime("%Y-%m-%d") == day]
+
+
+def write_days(transactions, directory, days):
+    for day in days:
+        day_rows(transactions, day).to_pickle(directory / f"{day}.pkl")
+
+
+def test_resume_reloads_a_changed_file(transactions, tmp_path):
+    write_days(transactions, tmp_path, ["2018-05-01", "2018-05-02"])
+    collection = InMemoryMongoClient()["test"]["transactions"]
+    first = BulkLoader(collection, str(tmp_path), workers=2, chunk_rows=50).run()
+    assert (first["files_loaded"], first["inserted"]) == (2, collection.count_documents({}))
+
+    # A day that gained rows after it was loaded
+    path = tmp_path / "2018-05-02.pkl"
+    day, extra = day_rows(transactions, "2018-05-02"), day_rows(transactions, "2018-05-03")
+    pd.concat([day, extra]).to_pickle(path)
+    os.utime(path, ns=(os.stat(path).st_atime_ns, os.stat(path).st_mtime_ns + 1_000_000_000))
+
+    second = BulkLoader(collection, str(tmp_path), workers=2, chunk_rows=50).run()
+    assert (second["files_skipped"], second["files_changed"], second["files_loaded"]) == (1, 1, 1)
+    assert (second["inserted"], second["duplicates"]) == (len(extra), len(day))
+
+    third = BulkLoader(collection, str(tmp_path), workers=2, chunk_rows=50).run()
+    assert (third["files_skipped"], third["files_loaded"]) == (2, 0)
+
+
+def test_existing_duplicate_ids_are_reported(transactions, tmp_path):
+    write_days(transactions, tmp_path, ["2018-05-01"])
+    collection = InMemoryMongoClient()["test"]["transactions"]
+    documents = to_documents(transactions.head(3))
+    collection.insert_many(documents + to_documents(transactions.head(1)))
+
+    with pytest.raises(Exception, match=f"duplicate TRANSACTION_IDs .*{documents[0]['TRANSACTION_ID']}, 2"):
+        BulkLoader(collection, str(tmp_path)).run()
+
+    report = BulkLoader(collection, str(tmp_path), unique_index=False).run()
+    assert report["files_loaded"] == 1
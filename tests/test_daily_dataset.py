@@ -0,0 +1,29 @@
+import pandas as pd
+
+from src.daily_dataset import read_daily_pickles
+from src.schema import apply_schema
+
+
+def write_days(transactions: pd.DataFrame, directory) -> None:
+    """The fixture as daily `YYYY-MM-DD.pkl` files, raw ids as object columns like the dataset's."""
+    for day, rows in transactions.groupby(transactions["TX_DATETIME"].dt.strftime("%Y-%m-%d")):
+        rows.astype({"CUSTOMER_ID": object, "TERMINAL_ID": object}).to_pickle(directory / f"{day}.pkl")
+
+
+def test_reads_the_requested_days_in_process(transactions, tmp_path):
+    write_days(transactions, tmp_path)
+    df = read_daily_pickles(str(tmp_path), "2018-05-01", "2018-05-07", cache_dir=None)
+
+    days = transactions["TX_DATETIME"].dt.strftime("%Y-%m-%d")
+    expected = apply_schema(transactions[(days >= "2018-05-01") & (days <= "2018-05-07")].reset_index(drop=True))
+    pd.testing.assert_frame_equal(df, expected)
+
+
+def test_cached_range_is_read_back(transactions, tmp_path):
+    data_dir, cache_dir = tmp_path / "data", tmp_path / "cache"
+    data_dir.mkdir()
+    write_days(transactions, data_dir)
+    first = read_daily_pickles(str(data_dir), "2018-05-01", "2018-05-07", cache_dir=str(cache_dir))
+    assert len(list(cache_dir.iterdir())) == 1
+    pd.testing.assert_frame_equal(read_daily_pickles(str(data_dir), "2018-05-01", "2018-05-07",
+                                                     cache_dir=str(cache_dir)), first)
@@ -0,0 +1,77 @@
+import pandas as pd
+import pytest
+
+from conftest import assert_same_features, split, with_a_year_earlier
+from src.feature_engine import plan_features, trim_history
+from src.feature_extractor import generate_features
+
+# Features of a transaction that only read the rows up to it, in training as in prediction
+POINT_IN_TIME = ["CUSTOMER_AVG_AMOUNT_7D", "CUSTOMER_MAX_AMOUNT_7D", "CUSTOMER_TX_COUNT_7D",
+                 "ROLLING_TX_COUNT_1D", "TIME_SINCE_LAST_TX", "TERMINAL_TX_COUNT_7D", "TX_OVER_MAX_LAST_7D"]
+
+
+@pytest.mark.parametrize("label_delay_days", [0, 1])
+def test_fused_matches_chained_in_training(transactions, label_delay_days):
+    fused = generate_features(transactions.copy(), label_delay_days=label_delay_days)
+    chained = generate_features(transactions.copy(), engine="chained", label_delay_days=label_delay_days)
+    assert_same_features(fused, chained)
+
+
+@pytest.mark.parametrize("label_delay_days", [0, 1])
+def test_fused_matches_chained_in_prediction(transactions, label_delay_days):
+    past, current = split(transactions)
+    fused = generate_features(current.copy(), past, mode="prediction", label_delay_days=label_delay_days)
+    chained = generate_features(current.copy(), past, mode="prediction", engine="chained",
+                                label_delay_days=label_delay_days)
+    # The fused engine indexes the rows among the trimmed history it computed them with
+    assert_same_features(fused.reset_index(drop=True), chained.reset_index(drop=True))
+
+
+def test_unknown_engine_is_rejected(transactions):
+    with pytest.raises(ValueError, match="engine"):
+        generate_features(transactions.copy(), engine="vectorized")
+
+
+@pytest.mark.parametrize("mode", ["training", "prediction"])
+def test_feature_subset_matches_full_output(transactions, mode):
+    past, current = split(transactions) if mode == "prediction" else (None, transactions)
+    subset = ["TX_OVER_MAX_LAST_7D", "TERMINAL_RISK", "WEEKEND_NIGHT"]
+    full = generate_features(current.copy(), past, mode=mode)
+    # A model's feature list can hold raw columns too; they are not features to compute
+    limited = generate_features(current.copy(), past, mode=mode, features=["TX_AMOUNT", *subset])
+    # Features the subset does not depend on are not computed
+    assert not {"AVG_AMOUNT_CUSTOMER", "TERMINAL_TX_COUNT_MONTH", "TIME_SINCE_LAST_TX"} & set(limited.columns)
+    assert_same_features(limited[subset].reset_index(drop=True), full[subset].reset_index(drop=True))
+
+
+@pytest.mark.parametrize("engine", ["fused", "chained"])
+def test_monthly_counts_leave_out_earlier_years(transactions, engine):
+    monthly = ["CUSTOMER_TX_COUNT_MONTH", "TERMINAL_TX_COUNT_MONTH"]
+    alone = generate_features(transactions.copy(), engine=engine)
+    both = generate_features(with_a_year_earlier(transactions), engine=engine)
+    both = both.set_index("TRANSACTION_ID").loc[alone["TRANSACTION_ID"]]
+    assert_same_features(both[monthly].reset_index(drop=True), alone[monthly].reset_index(drop=True))
+
+
+def test_window_features_keep_their_values_on_the_trimmed_history(transactions):
+    past, current = split(transactions)
+    window_features = ["CUSTOMER_TX_COUNT_7D", "TX_OVER_MAX_LAST_7D", "ROLLING_TX_COUNT_1D"]
+    history = trim_history(past, current, plan_features(window_features))
+    assert len(history) < len(past) / 2
+
+    trimmed = generate_features(current.copy(), history, mode="prediction", engine="chained")
+    untrimmed = generate_features(current.copy(), past, mode="prediction", engine="chained")
+    assert_same_features(trimmed[window_features].reset_index(drop=True),
+                         untrimmed[window_features].reset_index(drop=True))
+
+
+@pytest.mark.parametrize("label_delay_days", [0, 1])
+def test_prediction_matches_training_on_the_same_history(transactions, label_delay_days):
+    # The whole-dataset aggregates (AVG_AMOUNT_CUSTOMER, monthly counts) read later rows in training.
+    # With a delay of a day no label of the scored day counts, so TERMINAL_RISK agrees too.
+    past, current = split(transactions)
+    predicted = generate_features(current.copy(), past, mode="prediction", label_delay_days=label_delay_days)
+    trained = generate_features(pd.concat([past, current.assign(TX_FRAUD=0)]), label_delay_days=label_delay_days)
+    trained = trained.set_index("TRANSACTION_ID").loc[predicted["TRANSACTION_ID"]]
+    compared = POINT_IN_TIME + ["TERMINAL_RISK"] if label_delay_days >= 1 else POINT_IN_TIME
+    assert_same_features(predicted[compared].reset_index(drop=True), trained[compared].reset_index(drop=True))
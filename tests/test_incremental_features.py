@@ -0,0 +1,46 @@
+import pandas as pd
+import pytest
+
+from src.incremental_features import DailyFeaturePartitions
+from src.parallel_features import generate_features_parallel
+
+
+@pytest.mark.parametrize("label_delay_days", [0, 1])
+def test_cached_build_matches_uncached(transactions, tmp_path, label_delay_days):
+    partitions = DailyFeaturePartitions(str(tmp_path), label_delay_days=label_delay_days)
+    expected = generate_features_parallel(transactions.copy(), workers=1, label_delay_days=label_delay_days)
+    pd.testing.assert_frame_equal(partitions.build(transactions), expected)
+    # A second build reads every day from the cache and returns the same matrix
+    pd.testing.assert_frame_equal(partitions.build(transactions), expected)
+    assert not partitions.computed_days
+
+
+def test_appended_days_reuse_earlier_partitions(transactions, tmp_path):
+    partitions = DailyFeaturePartitions(str(tmp_path))
+    first_weeks = transactions[transactions["TX_DATETIME"] < pd.Timestamp("2018-05-23")]
+    partitions.build(first_weeks)
+    first_days = list(partitions.computed_days)
+
+    result = partitions.build(transactions)
+    assert partitions.reused_days == first_days
+    assert partitions.computed_days and min(partitions.computed_days) > max(first_days)
+    pd.testing.assert_frame_equal(result, generate_features_parallel(transactions.copy(), workers=1))
+
+
+def test_changed_day_recomputes_it_and_later_days(transactions, tmp_path):
+    partitions = DailyFeaturePartitions(str(tmp_path))
+    partitions.build(transactions)
+
+    changed = transactions.copy()
+    changed.loc[changed["TX_DATETIME"].dt.strftime("%Y-%m-%d") == "2018-05-10", "TX_AMOUNT"] += 1.0
+    result = partitions.build(changed)
+    assert min(partitions.computed_days) == "2018-05-10"
+    assert max(partitions.reused_days) < "2018-05-10"
+    pd.testing.assert_frame_equal(result, generate_features_parallel(changed.copy(), workers=1))
+
+
+def test_label_delay_change_recomputes_every_day(transactions, tmp_path):
+    DailyFeaturePartitions(str(tmp_path), label_delay_days=0).build(transactions)
+    partitions = DailyFeaturePartitions(str(tmp_path), label_delay_days=1)
+    partitions.build(transactions)
+    assert not partitions.reused_days
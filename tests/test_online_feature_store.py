@@ -0,0 +1,68 @@
+import pandas as pd
+import pytest
+
+import src.online_feature_store
+from benchmarks.in_memory_mongo import InMemoryMongoClient
+from conftest import CUTOFF, assert_same_features, split, with_a_year_earlier
+from src.bulk_loader import to_documents
+from src.feature_extractor import generate_features
+from src.online_feature_store import OnlineFeatureStore
+
+
+def expected_features(current: pd.DataFrame, past: pd.DataFrame, **kwargs) -> pd.DataFrame:
+    """Prediction-mode features of each current row on `past` alone, as the store scores them."""
+    return pd.concat([
+        generate_features(current.iloc[[row]].copy(), past, mode="prediction", **kwargs)
+        for row in range(len(current))
+    ])
+
+
+@pytest.mark.parametrize("label_delay_days", [0, 1, 2.5])
+@pytest.mark.parametrize("warm", ["dataframe", "update"])
+def test_store_matches_prediction(transactions, warm, label_delay_days):
+    past, current = split(transactions, rows=20)
+    store = OnlineFeatureStore(label_delay_days=label_delay_days)
+    if warm == "dataframe":
+        store.warm_from_dataframe(past)
+    else:
+        # Out of time order, as documents arrive from concurrent writers
+        for transaction in past.sample(frac=1, random_state=0).to_dict(orient="records"):
+            store.update(transaction)
+
+    served = store.get_features(current)
+    expected = expected_features(current, past, label_delay_days=label_delay_days)[served.columns]
+    assert_same_features(served.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_refresh_folds_the_documents_added_to_the_collection(transactions, monkeypatch):
+    past, current = split(transactions, rows=20)
+    client = InMemoryMongoClient()
+    monkeypatch.setattr(src.online_feature_store, "mongo_client", client)
+    collection = client["test"]["transactions"]
+    early = past["TX_DATETIME"] < CUTOFF - pd.Timedelta(days=5)
+    collection.insert_many(to_documents(past[early]))
+
+    store = OnlineFeatureStore()
+    store.warm_from_collection("test")
+    assert len(store) == early.sum()
+    collection.insert_many(to_documents(past[~early]))
+    assert store.refresh() == (~early).sum()
+    assert store.refresh() == 0
+
+    served = store.get_features(current)
+    expected = expected_features(current, past)[served.columns]
+    assert_same_features(served.reset_index(drop=True), expected.reset_index(drop=True))
+
+
+def test_store_monthly_counts_leave_out_earlier_years(transactions):
+    past, current = split(with_a_year_earlier(transactions), rows=20)
+    store = OnlineFeatureStore()
+    store.warm_from_dataframe(past)
+    # One more through `update`, which keys the counts on its own
+    store.update(past.iloc[-1].to_dict() | {"TRANSACTION_ID": -1})
+
+    served = store.get_features(current)
+    recent, _ = split(transactions, rows=20)
+    expected = expected_features(current, pd.concat([recent, past.iloc[[-1]]]))[served.columns]
+    monthly = ["CUSTOMER_TX_COUNT_MONTH", "TERMINAL_TX_COUNT_MONTH"]
+    assert_same_features(served[monthly].reset_index(drop=True), expected[monthly].reset_index(drop=True))
@@ -0,0 +1,12 @@
+import pandas as pd
+import pytest
+
+from src.feature_extractor import generate_features
+from src.parallel_features import generate_features_parallel
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_parallel_matches_generate_features(transactions, workers):
+    expected = generate_features(transactions.copy())
+    result = generate_features_parallel(transactions.copy(), workers=workers, shards=3)
+    pd.testing.assert_frame_equal(result, expected)
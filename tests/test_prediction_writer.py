@@ -0,0 +1,50 @@
+from pymongo.errors import PyMongoError
+
+from benchmarks.in_memory_mongo import InMemoryMongoClient
+from src.metrics import MetricsRegistry
+from src.prediction_writer import PredictionRecordWriter
+
+
+class FailingCollection:
+    def insert_many(self, documents, ordered=True):
+        raise PyMongoError("primary unavailable")
+
+
+def exported(metrics: MetricsRegistry) -> dict:
+    """Value of each `prediction_records_total` series by outcome."""
+    values = {}
+    for line in metrics.render().splitlines():
+        if line.startswith("fraud_prediction_records_total{"):
+            labels, value = line.split(" ")
+            values[labels.split('outcome="')[1].split('"')[0]] = float(value)
+    return values
+
+
+def test_counters_are_exported_as_they_change():
+    metrics = MetricsRegistry()
+    client = InMemoryMongoClient()
+    writer = PredictionRecordWriter(client, "test", flush_interval=0.05, metrics=metrics)
+    assert writer.write_many([{"TRANSACTION_ID": i} for i in range(5)]) == 5
+    assert exported(metrics) == {"enqueued": 5}
+    writer.close()
+    assert exported(metrics) == {"enqueued": 5, "written": 5}
+    assert client["test"]["latest_transactions"].count_documents({}) == 5
+
+
+def test_records_given_up_after_the_retries_count_as_failed():
+    metrics = MetricsRegistry()
+    writer = PredictionRecordWriter({"test": {"latest_transactions": FailingCollection()}}, "test",
+                                    flush_interval=0.05, max_retries=2, retry_backoff=0, metrics=metrics)
+    writer.write_many([{"TRANSACTION_ID": i} for i in range(3)])
+    writer.close()
+    assert exported(metrics) == {"enqueued": 3, "retried": 6, "failed": 3}
+    assert writer.stats()["failed"] == 3
+
+
+def test_full_queue_drops_are_exported():
+    metrics = MetricsRegistry()
+    writer = PredictionRecordWriter(None, "test", max_queue_size=1, enqueue_timeout=0, metrics=metrics)
+    # Not started, so nothing drains the queue
+    writer._thread = object()
+    assert writer.write_many([{"TRANSACTION_ID": i} for i in range(3)]) == 1
+    assert exported(metrics) == {"enqueued": 1, "dropped": 2}
@@ -0,0 +1,57 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.rolling_kernels import last_n_max, last_n_mean, prior_mean, prior_totals, window_count, window_max, window_mean
+
+NS_PER_DAY = 86_400 * 10**9
+
+
+@pytest.fixture
+def rows():
+    rng = np.random.default_rng(1)
+    size = 2_000
+    times = np.sort(rng.integers(0, 20 * 86_400, size)) * 10**9
+    times[1::7] = times[:-1:7]  # ties
+    return pd.DataFrame({
+        "group": rng.integers(0, 25, size),
+        "time": times,
+        "value": rng.gamma(2.0, 10.0, size),
+        "label": (rng.random(size) < 0.2).astype(np.float64),
+    })
+
+
+def test_window_kernels_match_pandas_rolling(rows):
+    groups, times, values = rows["group"].to_numpy(), rows["time"].to_numpy(), rows["value"].to_numpy()
+    window = 7 * NS_PER_DAY
+    counts, means, maxes = (window_count(groups, times, window), window_mean(groups, times, values, window),
+                            window_max(groups, times, values, window))
+    # The rows are in time order, so each group's rows are a time-indexed series for pandas
+    for positions in rows.groupby("group").indices.values():
+        rolling = pd.Series(values[positions], index=pd.to_datetime(times[positions])).rolling("7D")
+        np.testing.assert_array_equal(counts[positions], rolling.count().to_numpy())
+        np.testing.assert_allclose(means[positions], rolling.mean().to_numpy())
+        np.testing.assert_array_equal(maxes[positions], rolling.max().to_numpy())
+
+
+@pytest.mark.parametrize("n", [1, 3, 7])
+def test_last_n_kernels_match_pandas_rolling(rows, n):
+    groups, values = rows["group"].to_numpy(), rows["value"].to_numpy()
+    rolling = rows.groupby("group")["value"].rolling(n, min_periods=1)
+    np.testing.assert_allclose(last_n_mean(groups, values, n), rolling.mean().reset_index(level=0, drop=True).sort_index())
+    np.testing.assert_array_equal(last_n_max(groups, values, n), rolling.max().reset_index(level=0, drop=True).sort_index())
+
+
+def test_prior_totals_and_mean_match_a_scan(rows):
+    rng = np.random.default_rng(2)
+    query_groups = rng.integers(0, 30, 300)
+    query_times = rng.integers(0, 21 * 86_400, 300) * 10**9
+    groups, times, labels = rows["group"].to_numpy(), rows["time"].to_numpy(), rows["label"].to_numpy()
+
+    sums, counts = prior_totals(groups, times, labels, query_groups, query_times)
+    means = prior_mean(groups, times, labels, query_groups, query_times)
+    for index, (group, time) in enumerate(zip(query_groups, query_times)):
+        before = (groups == group) & (times < time)
+        assert counts[index] == before.sum()
+        assert sums[index] == labels[before].sum()
+        assert means[index] == (labels[before].mean() if before.any() else 0.0)
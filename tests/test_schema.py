@@ -0,0 +1,23 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.schema import apply_schema
+
+
+def test_ids_with_missing_values_stay_exact():
+    ids = [2**24 + 1, 2**24 + 2, 2**40 + 3]
+    df = apply_schema(pd.DataFrame({"TRANSACTION_ID": ids + [None], "CUSTOMER_ID": ids + [None],
+                                    "TX_FRAUD": [1, 0, 1, None]}))
+    assert df["TRANSACTION_ID"].dtype == np.float64
+    assert df["TRANSACTION_ID"].dropna().astype("int64").tolist() == ids
+    assert df["CUSTOMER_ID"].nunique() == len(ids)
+    assert df["TX_FRAUD"].dtype == np.float32
+
+    # Once the missing rows are dropped the ids go back to int64
+    assert apply_schema(df.dropna().copy())["TRANSACTION_ID"].tolist() == ids
+
+
+def test_integers_outside_the_column_range_raise():
+    with pytest.raises(Exception, match="TX_TIME_DAYS"):
+        apply_schema(pd.DataFrame({"TX_TIME_DAYS": [0, 2**15]}))
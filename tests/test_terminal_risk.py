@@ -0,0 +1,63 @@
+import pandas as pd
+import pytest
+
+from benchmarks.in_memory_mongo import InMemoryMongoClient
+from conftest import CUTOFF, assert_same_features, split
+from src.bulk_loader import to_documents
+from src.feature_extractor import generate_features
+from src.terminal_risk import TerminalRiskTable
+
+
+def assert_table_matches_past(table: TerminalRiskTable, past: pd.DataFrame, current: pd.DataFrame, **kwargs):
+    from_table = generate_features(current.copy(), past, mode="prediction", terminal_risk_table=table, **kwargs)
+    from_past = generate_features(current.copy(), past, mode="prediction", **kwargs)
+    assert_same_features(from_table, from_past)
+
+
+def test_table_matches_past_labels(transactions):
+    past, current = split(transactions)
+    table = TerminalRiskTable(None, "test")
+    table.update_from_dataframe(past)
+    assert_table_matches_past(table, past, current)
+
+    terminal = past.loc[past["TERMINAL_ID"] == current["TERMINAL_ID"].iloc[0]]
+    row = table.get(current["TERMINAL_ID"].iloc[0])
+    assert row["count"] == len(terminal)
+    assert row["fraud_rate"] == terminal["TX_FRAUD"].mean()
+    assert table.get(-1) is None
+
+
+def test_refresh_adds_the_documents_added_to_the_collection(transactions):
+    past, current = split(transactions)
+    client = InMemoryMongoClient()
+    collection = client["test"]["transactions"]
+    early = past["TX_DATETIME"] < CUTOFF - pd.Timedelta(days=5)
+    collection.insert_many(to_documents(past[early]))
+
+    table = TerminalRiskTable(client, "test")
+    assert table.refresh() == early.sum()
+    collection.insert_many(to_documents(past[~early]))
+    assert table.refresh() == (~early).sum()
+    assert table.refresh() == 0
+    assert_table_matches_past(table, past, current)
+
+    assert table.refresh(full=True) == len(past)
+    assert_table_matches_past(table, past, current)
+
+
+@pytest.mark.parametrize("label_delay_days", [1, 2.5])
+def test_table_applies_the_label_delay(transactions, label_delay_days):
+    past, current = split(transactions)
+    table = TerminalRiskTable(None, "test", label_delay_days=label_delay_days)
+    # In two parts, so labels turn from pending to counted between the updates
+    table.update_from_dataframe(past.iloc[:len(past) // 2])
+    table.update_from_dataframe(past.iloc[len(past) // 2:])
+    assert_table_matches_past(table, past, current, label_delay_days=label_delay_days)
+
+
+def test_table_with_another_label_delay_is_rejected(transactions):
+    past, current = split(transactions)
+    table = TerminalRiskTable(None, "test", label_delay_days=1)
+    table.update_from_dataframe(past)
+    with pytest.raises(Exception, match="risk_table counts labels"):
+        generate_features(current.copy(), past, mode="prediction", terminal_risk_table=table, label_delay_days=0)